@@ -0,0 +1,25 @@
+"""
+Microbenchmark of elliptec.tools.parse against the original string based parser (kept as reference in tests/legacy_parse.py).
+Run from the repository root with: python -m benchmarks.elliptec_parse
+"""
+import timeit
+
+from src.elliptec.tools import parse
+from tests.legacy_parse import parse_legacy, MESSAGES
+
+
+def main():
+    for message in MESSAGES:
+        assert parse(message) == parse_legacy(message), message
+
+    # every response is different, nothing can be reused between calls
+    positions = [b"1PO%08X\r\n" % k for k in range(0, 2**32, 2**32 // 10000)]
+    statuses = [b"0GS%02X\r\n" % (k % 13) for k in range(3000)]
+    for label, batch in [("positions", positions), ("statuses", statuses)]:
+        for name, function in [("parse_legacy", parse_legacy), ("parse", parse)]:
+            seconds = min(timeit.repeat(lambda: [function(message) for message in batch], number=1, repeat=7))
+            print(f"{label:>9} {name:>12}: {seconds / len(batch) * 1e9:5.0f} ns/response")
+
+
+if __name__ == "__main__":
+    main()
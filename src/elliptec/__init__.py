@@ -2,10 +2,11 @@
 from .cmd import commands
 from .devices import devices
 from .errors import ExternalDeviceNotFound
-from .scan import find_ports, scan_for_devices
+from .scan import find_ports, scan_for_devices, probe_addresses, discover_devices
 from .tools import is_null_or_empty, parse, s32, error_check, move_check
 
 # Classes for controllers
+from .transport import SerialTransport
 from .controller import Controller
 
 # General class for all motors
@@ -17,18 +18,29 @@ from .slider import Slider
 from .rotator import Rotator
 from .linear import Linear
 
+# asyncio interface
+from .controller_async import AsyncController
+from .motor_async import AsyncMotor
+from .rotator_async import AsyncRotator
+
 __all__ = [
     "commands",
     "devices",
     "ExternalDeviceNotFound",
+    "SerialTransport",
     "Controller",
     "Motor",
     "Shutter",
     "Slider",
     "Rotator",
     "Linear",
+    "AsyncController",
+    "AsyncMotor",
+    "AsyncRotator",
     "find_ports",
     "scan_for_devices",
+    "probe_addresses",
+    "discover_devices",
     "is_null_or_empty",
     "parse",
     "s32",
@@ -3,7 +3,13 @@
 import sys
 import serial
 from .tools import parse
-import threading
+from .transport import SerialTransport
+from .cmd import mov_
+
+# responses that report the position of a device
+POSITION_CODES = ("PO", "BO")
+# instructions that move a device
+MOVE_INSTRUCTIONS = set(mov_.values()) | {b"ho"}
 
 class Controller:
     """Class for controlling the Elliptec devices via serial port. This is a general class,
@@ -34,7 +40,6 @@ class Controller:
                 timeout=timeout,
                 write_timeout=write_timeout,
             )
-            self.lock = threading.Lock()
 
         except serial.SerialException:
             print("Could not open port {port}.")
@@ -43,6 +48,15 @@ class Controller:
 
         self.debug = debug
         self.port = port
+        # response timeout, the serial port itself is read with a short timeout by the transport's reader thread
+        self.timeout = timeout
+
+        # last known position (in pulses) of every address, from the position responses (see Motor.last_position)
+        self.positions = {}
+
+        self.transport = SerialTransport(self.s, debug=debug)
+        # kept for code that serializes whole exchanges itself, the transport only locks writes
+        self.lock = self.transport.write_lock
 
         if self.s.is_open:
             if self.debug:
@@ -52,12 +66,14 @@ class Controller:
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
+        self.close_connection()
 
-    def read_response(self):
-        """Reads the response from the controller."""
-        response = self.s.read_until(b"\r\n")  # Waiting until response read
+    def read_response(self, future):
+        """Waits for the response of a submitted instruction (see submit_instruction) and parses it."""
+        return self.handle_response(self.transport.result(future, self.timeout))
 
+    def handle_response(self, response):
+        """Parses a raw response and records it as the last response/status/position."""
         if self.debug:
             print("RX:", response)
 
@@ -69,13 +85,16 @@ class Controller:
         # print('STATUS:', status)
         if status is not None:
             if not isinstance(status, dict):
-                if status[1] == "PO":
-                    self.last_position = status[1]
+                if status[1] in POSITION_CODES:
+                    self.last_position = status[2]
+                    self.positions[status[0].upper()] = status[2]
 
         return status
 
-    def send_instruction(self, instruction, address="0", message=None):
-        """Sends an instruction to the controller. Expects a response which is returned."""
+    def submit_instruction(self, instruction, address="0", message=None):
+        """Sends an instruction to the controller without waiting for the response.
+        Returns a future of the raw response, pass it to read_response() to get the parsed response.
+        Instructions to different addresses can be outstanding at the same time."""
         # Encode inputs
         addr = address.encode("utf-8")
         inst = instruction  # .encode('utf-8') # Already encoded
@@ -91,18 +110,25 @@ class Controller:
 
             command += mesg.encode("utf-8")
 
+        # the position of a moving device is unknown until its position response arrives
+        if inst in MOVE_INSTRUCTIONS:
+            self.positions.pop(address.upper(), None)
+
+        # a device replies to a change of address from its new address
+        reply_address = message if inst == b"ca" and message else None
+
         if self.debug:
             print("TX:", command)
-        # Execute the command and wait for a response (while locking the thread)
-        # NOTE this is causing what limits our simultanous turn speed
-        with self.lock:
-            self.s.write(command)  # This actually executes the command
-            response = self.read_response()
+        # Only the write is locked, the reader thread hands the response to the future
+        return self.transport.submit(command, address, reply_address=reply_address)
 
-        return response
+    def send_instruction(self, instruction, address="0", message=None):
+        """Sends an instruction to the controller. Expects a response which is returned."""
+        return self.read_response(self.submit_instruction(instruction, address=address, message=message))
 
     def close_connection(self):
         """Closes the serial connection."""
+        self.transport.close()
         if self.s.is_open:
             self.s.close()
             print("Connection is closed!")
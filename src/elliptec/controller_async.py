@@ -0,0 +1,54 @@
+"""This module contains the AsyncController class, the asyncio interface of a Controller."""
+
+import asyncio
+from .controller import Controller
+
+
+class AsyncController:
+    """Asyncio interface of a Controller. Instructions are awaited instead of blocking a thread, so moves of
+    several devices (and anything else running in the event loop) can be combined with asyncio.gather.
+    It shares the serial transport with the wrapped Controller, so both can be used side by side."""
+
+    def __init__(self, controller, **kwargs):
+        """
+        controller: Controller, or the port to open one on (kwargs are passed to Controller)
+        """
+        if not isinstance(controller, Controller):
+            controller = Controller(controller, **kwargs)
+        self.controller = controller
+
+    @property
+    def port(self):
+        return self.controller.port
+
+    @property
+    def positions(self):
+        return self.controller.positions
+
+    @property
+    def debug(self):
+        return self.controller.debug
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close_connection()
+
+    async def read_response(self, future):
+        """Awaits the response of a submitted instruction and parses it."""
+        try:
+            response = await asyncio.wait_for(asyncio.wrap_future(future), self.controller.timeout)
+        except asyncio.TimeoutError:
+            self.controller.transport.cancel(future)
+            response = b""
+
+        return self.controller.handle_response(response)
+
+    async def send_instruction(self, instruction, address="0", message=None):
+        """Sends an instruction to the controller and awaits the response, which is returned."""
+        return await self.read_response(self.controller.submit_instruction(instruction, address=address, message=message))
+
+    def close_connection(self):
+        """Closes the serial connection."""
+        self.controller.close_connection()
@@ -13,8 +13,6 @@ class Motor:
         self.address = address
         self.debug = debug
 
-        self.last_position = None
-
         # Load motor info on creation
         self.load_motor_info()
 
@@ -32,6 +30,18 @@ class Motor:
             self.serial_no = self.info["Serial No."]
             self.motor_type = self.info["Motor Type"]
 
+    @property
+    def last_position(self):
+        """Last known position in pulses (None if unknown, e.g. while moving). Kept by the controller from every
+        position response of this address, so all Motor objects of a device agree."""
+        return self.controller.positions.get(self.address.upper())
+
+    def resync_position(self):
+        """Asks the motor for its position (e.g. after it was moved by hand) and returns it."""
+        self.controller.positions.pop(self.address.upper(), None)
+        self.get("position")
+        return self.last_position
+
     def send_instruction(self, instruction, message=None):
         """Sends an instruction to the motor. Returns the response from the motor."""
         response = self.controller.send_instruction(instruction, address=self.address, message=message)
@@ -0,0 +1,122 @@
+"""A module that contains the AsyncMotor class, the asyncio version of elliptec.Motor."""
+from .cmd import get_, set_, mov_
+from .tools import error_check, move_check
+from .errors import ExternalDeviceNotFound
+from .controller_async import AsyncController
+from .motor import Motor
+
+
+class AsyncMotor:
+    """Asyncio version of elliptec.Motor. Loading the motor info needs a response, so instances are created with
+    `await AsyncMotor.create(controller, address)` (or from an already initialised Motor with from_motor)."""
+
+    def __init__(self, controller, address="0", debug=True):
+        # the AsyncController (a Controller is wrapped) which services the COM port
+        if not isinstance(controller, AsyncController):
+            controller = AsyncController(controller)
+        self.controller = controller
+        # self.address is kept as a 0-F string and encoded in send_instruction()
+        self.address = address
+        self.debug = debug
+
+    @classmethod
+    async def create(cls, controller, address="0", debug=True):
+        """Creates the motor and loads its info."""
+        motor = cls(controller, address=address, debug=debug)
+        await motor.load_motor_info()
+        return motor
+
+    @classmethod
+    def from_motor(cls, motor):
+        """Async interface of an already initialised (synchronous) Motor, both share the controller."""
+        async_motor = cls(motor.controller, address=motor.address, debug=motor.debug)
+        async_motor._set_info(motor.info)
+        return async_motor
+
+    async def load_motor_info(self):
+        """Asks motor for info and load response into properties other methods can check later."""
+        info = await self.get("info")
+        if info is None:
+            raise ExternalDeviceNotFound
+        self._set_info(info)
+
+    def _set_info(self, info):
+        self.info = info
+        self.range = self.info["Range"]
+        self.pulse_per_rev = self.info["Pulse/Rev"]
+        self.serial_no = self.info["Serial No."]
+        self.motor_type = self.info["Motor Type"]
+
+    # the position cache is shared with the synchronous Motor objects of the controller
+    last_position = Motor.last_position
+
+    async def resync_position(self):
+        """Asks the motor for its position and returns it (see Motor.resync_position)."""
+        self.controller.positions.pop(self.address.upper(), None)
+        await self.get("position")
+        return self.last_position
+
+    async def send_instruction(self, instruction, message=None):
+        """Sends an instruction to the motor. Returns the response from the motor."""
+        return await self.controller.send_instruction(instruction, address=self.address, message=message)
+
+    # Action functions
+    async def move(self, req="home", data=""):
+        """Same as Motor.move, awaits the response."""
+        if req in mov_:
+            instruction = mov_[req]
+        else:
+            print(f"Invalid Command: {req}")
+            return False
+
+        if instruction == b"ho":
+            instruction = b"ho0"
+
+        status = await self.send_instruction(instruction, message=data)
+        if self.debug:
+            move_check(status)
+        return status
+
+    async def get(self, req="status", data=""):
+        """Same as Motor.get, awaits the response."""
+        if req in get_:
+            instruction = get_[req]
+        else:
+            print(f"Invalid Command: {req}")
+            return None
+
+        status = await self.send_instruction(instruction, message=data)
+        if self.debug:
+            error_check(status)
+        return status
+
+    async def set(self, req="", data=""):
+        """Same as Motor.set, awaits the response."""
+        if req in set_:
+            instruction = set_[req]
+        else:
+            print(f"Invalid Command: {req}")
+            return None
+
+        status = await self.send_instruction(instruction, message=data)
+        if self.debug:
+            error_check(status)
+        return status
+
+    # Wrapper functions
+    async def home(self, clockwise=True):
+        """Wrapper function to easily enable access to homing."""
+        if clockwise:
+            return await self.move("home_clockwise")
+        return await self.move("home_anticlockwise")
+
+    def __str__(self):
+        """Returns a string representation of the motor."""
+        string = ""
+        for key in self.info:
+            string += key + " - " + str(self.info[key]) + "\n"
+        return string
+
+    def close_connection(self):
+        """Closes the serial port."""
+        self.controller.close_connection()
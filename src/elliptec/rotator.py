@@ -20,9 +20,13 @@ class Rotator(Motor):
         return angle
 
     def set_angle(self, angle, delay=0):
-        """Moves the rotator to a particular angle (in degrees)."""
-        time.sleep(delay)
+        """Moves the rotator to a particular angle (in degrees).
+        Returns immediately if the rotator is already there (within one pulse of the last known position)."""
         position = self.angle_to_pos(angle)
+        if self.is_at(position):
+            return self.pos_to_angle(self.last_position)
+
+        time.sleep(delay)
         status = self.move("absolute", position)
         angle = self.extract_angle_from_status(status)
         return angle
@@ -73,6 +77,10 @@ class Rotator(Motor):
     # TODO: clean_and_optimize(self)
 
     # Helper functions
+    def is_at(self, position):
+        """Checks if the last known position is within one pulse of position."""
+        return self.last_position is not None and abs(position - self.last_position) <= 1
+
     def extract_angle_from_status(self, status):
         """Extracts angle from status."""
         # If status is telling us current position
@@ -0,0 +1,44 @@
+"""Module for the asyncio version of elliptec.Rotator (ELL14, ELL18). Inherits from elliptec.AsyncMotor."""
+import asyncio
+from .motor_async import AsyncMotor
+from .rotator import Rotator
+
+
+class AsyncRotator(AsyncMotor):
+    """Asyncio version of elliptec.Rotator, e.g. `await asyncio.gather(alice.set_angle(45), bob.set_angle(22.5))`."""
+
+    ## Position control
+    async def get_angle(self):
+        """Finds at which angle (in degrees) the rotator is at the moment."""
+        status = await self.get("position")
+        return self.extract_angle_from_status(status)
+
+    async def set_angle(self, angle, delay=0):
+        """Moves the rotator to a particular angle (in degrees), returns immediately if it is already there."""
+        position = self.angle_to_pos(angle)
+        if self.is_at(position):
+            return self.pos_to_angle(self.last_position)
+
+        if delay:
+            await asyncio.sleep(delay)
+        status = await self.move("absolute", position)
+        return self.extract_angle_from_status(status)
+
+    async def shift_angle(self, angle):
+        """Shifts by a particular angle (in degrees)."""
+        position = self.angle_to_pos(angle)
+        status = await self.move("relative", position)
+        return self.extract_angle_from_status(status)
+
+    async def jog(self, direction="forward"):
+        """Jogs by the jog distance in a particular direction."""
+        if direction in ["backward", "forward"]:
+            status = await self.move(direction)
+            return self.extract_angle_from_status(status)
+        return None
+
+    # the conversions are the same as for the synchronous rotator
+    is_at = Rotator.is_at
+    extract_angle_from_status = Rotator.extract_angle_from_status
+    pos_to_angle = Rotator.pos_to_angle
+    angle_to_pos = Rotator.angle_to_pos
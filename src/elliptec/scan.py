@@ -1,26 +1,34 @@
 """Module for scanning for Elliptec devices."""
 
 
+from concurrent.futures import ThreadPoolExecutor
 import serial as s
 import serial.tools.list_ports as listports
 from .errors import ExternalDeviceNotFound
 from .motor import Motor
+from .controller import Controller
 
 # Scanning functions
 
 
+def _can_open(port):
+    try:
+        connection = s.Serial(port.device)
+        connection.close()
+        return True
+    except (OSError, s.SerialException):
+        print(f"{port.device} unavailable.\n")
+        return False
+
+
 def find_ports():
-    """Find all available ports with an Elliptec device connected."""
-    avail_ports = []
-    for port in listports.comports():
-        if port.serial_number:
-            try:
-                connection = s.Serial(port.device)
-                connection.close()
-                avail_ports.append(port)
-            except (OSError, s.SerialException):
-                print(f"{port.device} unavailable.\n")
-    port_names = [port.device for port in avail_ports]
+    """Find all available ports with an Elliptec device connected. The ports are opened in parallel."""
+    candidates = [port for port in listports.comports() if port.serial_number]
+    if not candidates:
+        return []
+    with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+        available = list(executor.map(_can_open, candidates))
+    port_names = [port.device for port, ok in zip(candidates, available) if ok]
     return port_names
 
 
@@ -41,3 +49,55 @@ def scan_for_devices(controller, start_address=0, stop_address=0, debug=True):
         except ExternalDeviceNotFound:
             pass
     return devices
+
+
+def probe_addresses(controller, start_address=0, stop_address=0, probe_timeout=0.1, first_only=True, retries=1):
+    """Asks the addresses of a controller for their info one after the other, waiting only probe_timeout instead
+    of the controller timeout for an empty address. All devices of a controller share one bus, so only one probe
+    is on the bus at a time; an address whose reply was garbled (e.g. two devices answering at once) is asked
+    again up to retries times.
+    Returns a list of info dicts of the responding addresses in address order (only the lowest one if first_only)."""
+    transport = controller.transport
+    infos = []
+    for address in range(start_address, stop_address + 1):
+        for _ in range(retries + 1):
+            n_unsolicited = transport.n_unsolicited
+            response = transport.result(controller.submit_instruction(b"in", address=format(address, "X")), probe_timeout)
+            info = controller.handle_response(response)
+            if isinstance(info, dict):
+                infos.append(info)
+                break
+            # nothing at all arrived: the address is empty, no need to ask again
+            if not response and transport.n_unsolicited == n_unsolicited:
+                break
+
+        if first_only and infos:
+            break
+    return infos
+
+
+def _discover_port(port, start_address, stop_address, probe_timeout, first_only, debug):
+    controller = Controller(port, debug=False)
+    infos = probe_addresses(controller, start_address, stop_address, probe_timeout, first_only)
+    if not infos:
+        controller.close_connection()
+    if debug:
+        for info in infos:
+            print(f"{port}, address {info['Address']}: ELL{info['Motor Type']} \t(S/N: {info['Serial No.']})")
+    return [{"port": port, "info": info, "controller": controller} for info in infos]
+
+
+def discover_devices(ports=None, start_address=0, stop_address=3, probe_timeout=0.1, first_only=True, debug=True):
+    """Finds the devices on all ports in parallel, probing each port with a short timeout (see probe_addresses).
+    ports: ports to search (find_ports() if None)
+    first_only: stop at the lowest responding address of each port (one device per controller)
+    Returns the inventory, a list of dictionaries with the port, the device info and the (open) controller object
+    like scan_for_devices. Controllers of ports without a device are closed again."""
+    if ports is None:
+        ports = find_ports()
+    if not ports:
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(ports)) as executor:
+        found = executor.map(lambda port: _discover_port(port, start_address, stop_address, probe_timeout, first_only, debug), ports)
+        return [device for devices in found for device in devices]
@@ -9,65 +9,79 @@ def is_null_or_empty(msg):
         return False
 
 
+def _info(addr, data):
+    return {
+        "Address": addr,
+        "Motor Type": int(data[0:2], 16),
+        "Serial No.": data[2:10],
+        "Year": data[10:14],
+        "Firmware": data[14:16],
+        "Thread": is_metric(data[16]),
+        "Hardware": data[17],
+        "Range": (int(data[18:22], 16)),
+        "Pulse/Rev": (int(data[22:], 16)),
+    }
+
+
+def _motor_info(addr, data):
+    # Period=14740000/frequency for backward and forward motor movements
+    # And 1 Amp of current is equal to 1866 points (1 point is 0.54 mA circa)
+    return {
+        "Address": addr,
+        "Loop": data[0],  # The state of the loop setting (1 = ON, 0 = OFF)
+        "Motor": data[1],  # The state of the motor (1 = ON, 0 = OFF)
+        "Current": int(data[2:6], 16) / 1866,  # 1866 points is 1 amp
+        "Ramp up": int(data[6:10], 16),  # PWM increase every ms
+        "Ramp down": int(data[10:14], 16),  # PWM decrease every ms
+        "Forward period": int(data[14:18], 16),  # Forward period value
+        "Backward period": int(data[18:22], 16),  # Backward period value
+        "Forward frequency": 14740000 / int(data[14:18], 16),  # Calculated forward frequency
+        "Backward frequency": 14740000 / int(data[18:22], 16),  # Calculated forward frequency
+    }
+
+
+# address byte -> address string
+_ADDRESSES = {ord(c): c for c in "0123456789ABCDEFabcdef"}
+
+# the two code bytes (as one int, in any case combination) -> (kind, code string).
+# Positions and statuses are by far the most frequent responses and are converted in parse() itself,
+# the kind of the rare info responses is the function that builds their dict
+_POSITION = 0
+_STATUS = 1
+_CODES = {}
+for _code, _kind in [("PO", _POSITION), ("BO", _POSITION), ("HO", _POSITION), ("GJ", _POSITION),
+                     ("GS", _STATUS), ("IN", _info), ("I1", _motor_info), ("I2", _motor_info)]:
+    for _variant in {_code, _code.lower(), _code[0] + _code[1].lower(), _code[0].lower() + _code[1]}:
+        _CODES[ord(_variant[0]) << 8 | ord(_variant[1])] = (_kind, _variant)
+
+
 def parse(msg, debug=True):
-    """Parses the message from the controller."""
-    if is_null_or_empty(msg):
+    """Parses the message from the controller.
+    Works on the raw bytes, only the value is converted. Returns (address, code, value) or a dict for info responses."""
+    msg = msg.lstrip()  # stray bytes of an earlier reply (e.g. "\n") may precede the address
+    if len(msg) < 5 or msg[-2:] != b"\r\n":
         if debug:
             print("Parse: Status/Response may be incomplete!")
             print("Parse: Message:", msg)
         return None
-    msg = msg.decode().strip()
-    code = msg[1:3]
-    try:
-        _ = int(msg[0], 16)
-    except ValueError as exc:
-        raise ValueError(f"Invalid Address: {msg[0]}.") from exc
-    addr = msg[0]
-
-    if code.upper() == "IN":
-        info = {
-            "Address": addr,
-            "Motor Type": int(msg[3:5], 16),
-            "Serial No.": msg[5:13],
-            "Year": msg[13:17],
-            "Firmware": msg[17:19],
-            "Thread": is_metric(msg[19]),
-            "Hardware": msg[20],
-            "Range": (int(msg[21:25], 16)),
-            "Pulse/Rev": (int(msg[25:], 16)),
-        }
-        return info
-
-    elif code.upper() in ["PO", "BO", "HO", "GJ"]:
-        pos = msg[3:]
-        return (addr, code, (s32(int(pos, 16))))
-
-    elif code.upper() == "GS":
-        errcode = msg[3:]
-        return (addr, code, str(int(errcode, 16)))
-
-    elif code.upper() in ["I1", "I2"]:
-        # Info about motor
-
-        # Period=14740000/frequency for backward and forward motor movements
-        # And 1 Amp of current is equal to 1866 points (1 point is 0.54 mA circa)
-
-        info = {
-            "Address": addr,
-            "Loop": msg[3],  # The state of the loop setting (1 = ON, 0 = OFF)
-            "Motor": msg[4],  # The state of the motor (1 = ON, 0 = OFF)
-            "Current": int(msg[5:9], 16) / 1866,  # 1866 points is 1 amp
-            "Ramp up": int(msg[9:13], 16),  # PWM increase every ms
-            "Ramp down": int(msg[13:17], 16),  # PWM decrease every ms
-            "Forward period": int(msg[17:21], 16),  # Forward period value
-            "Backward period": int(msg[21:25], 16),  # Backward period value
-            "Forward frequency": 14740000 / int(msg[17:21], 16),  # Calculated forward frequency
-            "Backward frequency": 14740000 / int(msg[21:25], 16),  # Calculated forward frequency
-        }
-        return info
 
-    else:
-        return (addr, code, msg[3:])
+    addr = _ADDRESSES.get(msg[0])
+    if addr is None:
+        raise ValueError(f"Invalid Address: {chr(msg[0])}.")
+
+    entry = _CODES.get(msg[1] << 8 | msg[2])
+    if entry is None:
+        return (addr, msg[1:3].decode(), msg[3:-2].decode().rstrip())
+
+    kind, code = entry
+    if kind == _POSITION:
+        value = int(msg[3:-2], 16)
+        if value > 0x7FFFFFFF:  # s32
+            value -= 0x100000000
+        return (addr, code, value)
+    if kind == _STATUS:
+        return (addr, code, str(int(msg[3:-2], 16)))
+    return kind(addr, msg[3:-2].decode().rstrip())
 
 
 def is_metric(num):
@@ -115,3 +129,4 @@ def move_check(status):
         print("Move Successful.")
     else:
         print(f"Unknown response code {status[1]}")
+
@@ -0,0 +1,127 @@
+"""This module contains the SerialTransport class, which shares one serial port between all devices on it.
+
+A reader thread reads the port continuously, splits it into responses (terminated by CR LF) and hands every
+response to the oldest waiting request of the address in its first byte. Writing is the only step that needs
+the lock, so several instructions to different devices can be outstanding at the same time."""
+
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import Future, TimeoutError
+
+import serial
+
+
+class SerialTransport:
+    """Sends instructions over an open serial port and routes the responses to per-address futures."""
+
+    def __init__(self, port, read_timeout=0.05, debug=True):
+        """
+        port: open serial.Serial
+        read_timeout: timeout of a single read of the reader thread (also the time close() may take)
+        """
+        self.s = port
+        self.s.timeout = read_timeout
+        self.debug = debug
+
+        self.write_lock = threading.Lock()
+        # protects self.pending, which is shared with the reader thread
+        self._pending_lock = threading.Lock()
+        self.pending = defaultdict(deque)
+
+        # responses nobody was waiting for (e.g. replies that arrived after their request timed out)
+        self.unsolicited = deque(maxlen=100)
+        self.n_unsolicited = 0
+
+        self._running = True
+        self._reader = threading.Thread(target=self._read_loop, name=f"elliptec reader {port.port}", daemon=True)
+        self._reader.start()
+
+    def submit(self, command, address, reply_address=None):
+        """
+        Writes the command and returns a concurrent.futures.Future of the raw response (bytes including CR LF)
+        address: address (0-F string) of the device the command is sent to
+        reply_address: address the device replies from if it is not address (e.g. after changing its address)
+        """
+        future = Future()
+        future.reply_address = (reply_address or address).upper()
+        with self.write_lock:
+            # register before writing, so a fast response always finds its request
+            with self._pending_lock:
+                self.pending[future.reply_address].append(future)
+            try:
+                self.s.write(command)
+            except (serial.SerialException, OSError) as exc:
+                self._discard(future)
+                future.set_exception(exc)
+        return future
+
+    def result(self, future, timeout=2):
+        """
+        Waits for the response of a submitted command. Returns b"" if there was no response within timeout
+        (which parse() reports as an incomplete message, like a serial read that timed out)
+        """
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            self.cancel(future)
+            return b""
+
+    def request(self, command, address, reply_address=None, timeout=2):
+        """Writes the command and waits for its response (see submit and result)."""
+        return self.result(self.submit(command, address, reply_address), timeout)
+
+    def cancel(self, future):
+        """Stops waiting for the response of a submitted command (a late response is then unsolicited)."""
+        self._discard(future)
+        future.cancel()
+
+    def _discard(self, future):
+        with self._pending_lock:
+            try:
+                self.pending[future.reply_address].remove(future)
+            except ValueError:
+                pass
+
+    def _route(self, response):
+        address = response[:1].decode(errors="replace").upper()
+        with self._pending_lock:
+            waiting = self.pending.get(address)
+            future = waiting.popleft() if waiting else None
+
+        if future is None:
+            if self.debug:
+                print("RX (unsolicited):", response)
+            self.unsolicited.append(response)
+            self.n_unsolicited += 1
+        elif future.set_running_or_notify_cancel():
+            future.set_result(response)
+
+    def _read_loop(self):
+        buffer = b""
+        while self._running:
+            try:
+                data = self.s.read(max(1, self.s.in_waiting))
+            except (serial.SerialException, OSError, TypeError):
+                # port was closed
+                break
+            if not data:
+                continue
+
+            buffer += data
+            while b"\r\n" in buffer:
+                response, buffer = buffer.split(b"\r\n", 1)
+                self._route(response + b"\r\n")
+
+        # nobody will answer the remaining requests anymore
+        with self._pending_lock:
+            waiting = [future for futures in self.pending.values() for future in futures]
+            self.pending.clear()
+        for future in waiting:
+            if future.set_running_or_notify_cancel():
+                future.set_result(b"")
+
+    def close(self):
+        """Stops the reader thread (the port itself is closed by the controller)."""
+        self._running = False
+        if self._reader.is_alive() and self._reader is not threading.current_thread():
+            self._reader.join()
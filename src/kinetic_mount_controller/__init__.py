@@ -1,7 +1,13 @@
 """My library to control the kinetic mounts"""
 from .kinetic_mount_controller import KineticMountControl
+from .setting_planner import SettingPlanner, plan_setting_order
+from .beat_clock import BeatClock, sleep_until
 
 
 __all__ = [
-    "KineticMountControl"
-]
\ No newline at end of file
+    "KineticMountControl",
+    "SettingPlanner",
+    "plan_setting_order",
+    "BeatClock",
+    "sleep_until"
+]
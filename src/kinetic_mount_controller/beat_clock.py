@@ -0,0 +1,100 @@
+"""
+Beat scheduling on an absolute timeline: beat k starts at t0 + k * interval.
+All waits are for absolute deadlines on that timeline, so the error of one wait does not carry over
+into the next one and the beats do not drift.
+"""
+import time
+import numpy as np
+
+
+def sleep_until(deadline, spin_tail=0.002):
+    """
+    waits until time.perf_counter() reaches deadline.
+    Sleeps until spin_tail seconds before the deadline (time.sleep uses clock_nanosleep on linux)
+    and busy-waits only for the rest. Returns the lateness in s (>= 0)
+    """
+    remaining = deadline - time.perf_counter()
+    if remaining > spin_tail:
+        time.sleep(remaining - spin_tail)
+
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            return now - deadline
+
+
+class BeatClock:
+
+    def __init__(self, interval, spin_tail=0.002, capacity=10000):
+        """
+        interval: time between two beats in s
+        spin_tail: time in s before each deadline that is busy-waited instead of slept (trade cpu for accuracy)
+        capacity: number of beats whose lateness fits into the preallocated array (doubles if exceeded)
+        """
+        self.interval = interval
+        self.spin_tail = spin_tail
+
+        self.t0 = None
+        self.beat = 0
+        self.missed_beats = 0
+
+        # lateness of the start of every beat in s
+        self.lateness = np.full(int(capacity), np.nan)
+
+    def start(self, t0=None):
+        """
+        beat 0 starts at t0 (now if None)
+        """
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.beat = 0
+        self.missed_beats = 0
+        self.lateness[:] = np.nan
+        self.lateness[0] = 0
+
+    def is_running(self):
+        return self.t0 is not None
+
+    def beat_time(self, beat=None):
+        """
+        start time (time.perf_counter) of the given beat (the current one if None)
+        """
+        return self.t0 + (self.beat if beat is None else beat) * self.interval
+
+    def at(self, offset):
+        """
+        absolute time offset seconds after the start of the current beat
+        """
+        return self.beat_time() + offset
+
+    def wait_until(self, deadline):
+        """
+        waits until the absolute deadline, returns the lateness in s
+        """
+        return sleep_until(deadline, self.spin_tail)
+
+    def next_beat(self):
+        """
+        waits for the start of the next beat and returns its start time. If that beat has already passed by
+        more than a whole interval, the missed beats are skipped so the timeline stays aligned
+        """
+        beat = self.beat + 1
+        behind = int((time.perf_counter() - self.beat_time(beat)) // self.interval)
+        if behind > 0:
+            self.missed_beats += behind
+            beat += behind
+
+        lateness = self.wait_until(self.beat_time(beat))
+        self.beat = beat
+
+        if self.beat >= len(self.lateness):
+            self.lateness = np.concatenate((self.lateness, np.full(max(len(self.lateness), self.beat + 1), np.nan)))
+        self.lateness[self.beat] = lateness
+        return self.beat_time()
+
+    def print_summary(self):
+        lateness = self.lateness[:self.beat + 1]
+        lateness = lateness[~np.isnan(lateness)]
+        print(f"{self.beat + 1} beats, {self.missed_beats} missed")
+        if lateness.size > 0:
+            p50, p99, p_max = np.percentile(lateness, [50, 99, 100]) * 1e3
+            print(f"lateness: p50 {p50:.3f} ms, p99 {p99:.3f} ms, max {p_max:.3f} ms")
@@ -1,7 +1,9 @@
 import sys
 import time
+import asyncio
 import threading
 import src.elliptec as elliptec
+from .beat_clock import sleep_until
 
 class DeviceError(Exception):
     """raised when there is an error regarding the setup of the kinetic devices"""
@@ -15,21 +17,12 @@ class KineticMountControl:
         if title is not None: print(title)
         print('---------------------------------------------------------------') 
 
-    def _get_connected_device(self, controller, stop_address=3):
-        """
-        Scan for device with address 0 and return info dictionary or None
-        """
-        try:
-            return elliptec.scan_for_devices(controller, start_address=0, stop_address=stop_address, debug=False)[0]
-        except:
-            return None
-
     def _print_successfull_connection(self, device_info):
         motor_type = device_info['info']['Motor Type']
         description = elliptec.devices[motor_type]['description']
         print(f"Device succesfully connected ({description}) (Address: {device_info['info']['Address']})")
 
-    def __init__(self, number_of_devices, address_search_depth=3) -> None:
+    def __init__(self, number_of_devices, address_search_depth=3, probe_timeout=0.1) -> None:
         
         # initialise list of elliptec controllers
         self.controllers = []
@@ -40,7 +33,12 @@ class KineticMountControl:
         self.bob = None
         self.shutter = None
 
-        # Search for controller and assign
+        # asyncio interfaces of the rotators, created when first needed
+        self._async_rotators = {}
+        # event loop (running in one background thread) that carries out the moves of the synchronous rotate functions
+        self._loop = None
+
+        # Search for controllers and their devices, all ports are probed in parallel with a short timeout
         self._print_div('\nASSIGNING CONTROLLERS')
         ports_found = elliptec.find_ports()
         print(f"Ports Found: {ports_found}")
@@ -48,15 +46,17 @@ class KineticMountControl:
         if len(ports_found) != number_of_devices:
             raise Exception("\n\nNo ports found does not match specified number of devices\n")
 
-        self.controllers = []
-        for port in ports_found:
-            self.controllers.append(elliptec.Controller(port, debug=False))
+        inventory = elliptec.discover_devices(ports_found, start_address=0, stop_address=address_search_depth, probe_timeout=probe_timeout, debug=False)
+        if len(inventory) != number_of_devices:
+            found = [device['port'] for device in inventory]
+            raise DeviceError(f"\n\nNo device found on port(s) {[port for port in ports_found if port not in found]}\n")
+
+        self.controllers = [device['controller'] for device in inventory]
         self._print_div()
 
         # get devices from controllers and assign
-        for controller in self.controllers:
-            
-            device = self._get_connected_device(controller, stop_address=address_search_depth)
+        for device in inventory:
+            controller = device['controller']
 
             motor_type = device['info']['Motor Type']
             address = device['info']['Address']
@@ -91,16 +91,12 @@ class KineticMountControl:
         pass
     
     def rotate_alice(self, angle):
-        """Multithreaded rotate of Alice filter"""
-        thread = threading.Thread(target=self.alice.set_angle, args=(angle,))
-        thread.start()
-        thread.join()
+        """Rotate of Alice filter (carried out in the event loop of the KMC)"""
+        self._submit(self._async_rotator(self.alice).set_angle(angle)).result()
 
     def rotate_bob(self, angle):
-        """Multithreaded rotate of Bob filter"""
-        thread = threading.Thread(target=self.bob.set_angle, args=(angle,))
-        thread.start()
-        thread.join()
+        """Rotate of Bob filter (carried out in the event loop of the KMC)"""
+        self._submit(self._async_rotator(self.bob).set_angle(angle)).result()
 
     @staticmethod
     def hybrid_wait(target_duration, start_time):
@@ -122,7 +118,7 @@ class KineticMountControl:
 
     def rotate_simulataneously(self, alice_angle, bob_angle, wait_for_completion=True, wait_for_elapsed_time=0):
         """
-        Uses multithreading to rotate bob and alice simultaneously.
+        Rotates bob and alice simultaneously (in the event loop of the KMC).
         
         Parameters:
             alice_angle: Target angle for Alice.
@@ -132,18 +128,12 @@ class KineticMountControl:
         """
         start_time = time.time()
 
-        thread_a = threading.Thread(target=self.alice.set_angle, args=(alice_angle,))
-        thread_b = threading.Thread(target=self.bob.set_angle, args=(bob_angle,))
-
-        # Start both threads
-        thread_a.start()
-        time.sleep(0.004)
-        thread_b.start()
+        # both moves run concurrently in the event loop of the KMC (see rotate_simultaneously_async), no threads are started
+        rotation = self._submit(self.rotate_simultaneously_async(alice_angle, bob_angle))
 
-        # Wait for both threads to complete
+        # Wait for both rotations to complete
         if wait_for_completion:
-            thread_a.join()
-            thread_b.join()
+            rotation.result()
 
         # Calculate elapsed time
         elapsed_time = time.time() - start_time
@@ -153,22 +143,25 @@ class KineticMountControl:
             time.sleep(wait_for_elapsed_time - elapsed_time)
         
 
-    def rotate_simulataneously_metronome(self, alice_angle, bob_angle, alice_prev_angle, bob_prev_angle, wait_for_completion=True, target_duration=None):
+    def rotate_simulataneously_metronome(self, alice_angle, bob_angle, alice_prev_angle, bob_prev_angle, wait_for_completion=True, target_duration=None, deadline=None, spin_tail=0.002):
         """
-        Uses multithreading to rotate bob and alice simultaneously. 
+        Rotates bob and alice simultaneously (in the event loop of the KMC, the moves are started from this thread
+        at the exact offsets and then run without blocking it).
         Allows for user set time offsets in order to synchronize clicking sounds between rotators
         
         Parameters:
             alice_angle: Target angle for Alice.
             bob_angle: Target angle for Bob.
             wait_for_completion: If True, waits for rotation to complete before returning.
-                                If False, returns as soon as possible while rotators still turning in different threads
+                                If False, returns as soon as possible while rotators still turning in the event loop
             target_duration: Code returns once this time is reached (assuming computation is done by then)
+            deadline: absolute time (time.perf_counter) to return at, used instead of target_duration (e.g. from a BeatClock)
+            spin_tail: time before the deadline that is busy-waited instead of slept
         """
         start_time = time.perf_counter()
 
-        thread_a = threading.Thread(target=self.alice.set_angle, args=(alice_angle,))
-        thread_b = threading.Thread(target=self.bob.set_angle, args=(bob_angle,))
+        move_a = lambda: self._submit(self._async_rotator(self.alice).set_angle(alice_angle))
+        move_b = lambda: self._submit(self._async_rotator(self.bob).set_angle(bob_angle))
 
         bob_delay = 0.008
         alice_delay = 0
@@ -191,29 +184,57 @@ class KineticMountControl:
         if alice_total_delay > bob_total_delay:
             thread_start_time = time.perf_counter()
             self.hybrid_wait(target_duration=bob_total_delay, start_time=thread_start_time)
-            thread_b.start()
+            rotation_b = move_b()
             self.hybrid_wait(target_duration=alice_total_delay, start_time=thread_start_time)
-            thread_a.start()
+            rotation_a = move_a()
         
         # start alice first and delay bob
         else:
             thread_start_time = time.perf_counter()
             self.hybrid_wait(target_duration=alice_total_delay, start_time=thread_start_time)
-            thread_a.start()
+            rotation_a = move_a()
             self.hybrid_wait(target_duration=bob_total_delay, start_time=thread_start_time)
-            thread_b.start()
+            rotation_b = move_b()
 
-        # Wait for both threads to complete
+        # Wait for both rotations to complete
         if wait_for_completion:
-            thread_a.join()
-            thread_b.join()
+            rotation_a.result()
+            rotation_b.result()
 
-        # wait until target duration is reached regardless of wait_for_completion parameter
-        if time.perf_counter() - start_time <=  target_duration:
+        # wait until target duration (or the deadline) is reached regardless of wait_for_completion parameter
+        if deadline is not None:
+            sleep_until(deadline, spin_tail)
+        elif time.perf_counter() - start_time <=  target_duration:
             self.hybrid_wait(target_duration, start_time=start_time)
 
 
 
+    def _submit(self, coroutine):
+        """
+        runs the coroutine in the event loop of the KMC (started on first use) and returns a concurrent.futures.Future of its result
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name="KMC event loop", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def _async_rotator(self, rotator):
+        """asyncio interface of a rotator (shares its controller, so sync and async calls can be mixed)"""
+        if rotator not in self._async_rotators:
+            self._async_rotators[rotator] = elliptec.AsyncRotator.from_motor(rotator)
+        return self._async_rotators[rotator]
+
+    async def rotate_simultaneously_async(self, alice_angle, bob_angle):
+        """
+        Rotates alice and bob at the same time within the running event loop (no threads are started)
+        and returns once both are in place. Returns the new angles of alice and bob
+        """
+        return await asyncio.gather(self._async_rotator(self.alice).set_angle(alice_angle),
+                                    self._async_rotator(self.bob).set_angle(bob_angle))
+
+    async def home_async(self):
+        return await self.rotate_simultaneously_async(alice_angle=0, bob_angle=0)
+
     # TEST FUNCTIONS
     def wiggle_test(self, rotator):
         """
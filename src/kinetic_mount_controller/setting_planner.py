@@ -0,0 +1,125 @@
+"""
+Orders the (alice_angle, bob_angle) basis settings of a measurement so that the total rotation time is minimal.
+Alice and Bob rotate simultaneously, so a move takes as long as the larger of the two angular distances.
+The runs start and end with both mounts at home (0, 0)
+"""
+import itertools
+import numpy as np
+
+
+def rotation_cost(start, end):
+    """
+    cost of moving both mounts from start=(alice_angle, bob_angle) to end (in degrees)
+    both mounts move in parallel, so the slower (further) one determines the cost
+    """
+    return max(abs(end[0] - start[0]), abs(end[1] - start[1]))
+
+
+def path_cost(settings, order, start=(0, 0), end=(0, 0)):
+    """
+    total cost of visiting settings in the given order, going from start and back to end
+    """
+    points = [start] + [settings[i] for i in order] + [end]
+    return sum(rotation_cost(a, b) for a, b in zip(points[:-1], points[1:]))
+
+
+def _cost_matrix(points):
+    points = np.asarray(points, dtype=float)
+    return np.abs(points[:, None, :] - points[None, :, :]).max(axis=-1)
+
+
+def _held_karp(D, n):
+    """
+    exact shortest path through nodes 1..n from node 0 to node n+1 (dynamic programming over subsets)
+    """
+    # best[(subset, last)] = (cost, previous node)
+    best = {(1 << k, k): (D[0, k + 1], None) for k in range(n)}
+    for size in range(2, n + 1):
+        for subset in itertools.combinations(range(n), size):
+            bits = sum(1 << k for k in subset)
+            for last in subset:
+                prev_bits = bits & ~(1 << last)
+                best[(bits, last)] = min((best[(prev_bits, k)][0] + D[k + 1, last + 1], k) for k in subset if k != last)
+
+    full = (1 << n) - 1
+    cost, last = min((best[(full, k)][0] + D[k + 1, n + 1], k) for k in range(n))
+
+    # walk back through the table
+    order = []
+    bits = full
+    while last is not None:
+        order.append(last)
+        bits, last = bits & ~(1 << last), best[(bits, last)][1]
+    return order[::-1]
+
+
+def _nearest_neighbour(D, n):
+    order = []
+    remaining = set(range(n))
+    current = 0
+    while remaining:
+        current_next = min(remaining, key=lambda k: D[current, k + 1])
+        order.append(current_next)
+        remaining.remove(current_next)
+        current = current_next + 1
+    return order
+
+
+def _two_opt(D, order):
+    """
+    reverses segments of the path as long as this makes it shorter
+    """
+    path = [0] + [k + 1 for k in order] + [len(order) + 1]
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(path) - 2):
+            for j in range(i + 1, len(path) - 1):
+                change = D[path[i - 1], path[j]] + D[path[i], path[j + 1]] - D[path[i - 1], path[i]] - D[path[j], path[j + 1]]
+                if change < -1e-9:
+                    path[i:j + 1] = path[i:j + 1][::-1]
+                    improved = True
+    return [k - 1 for k in path[1:-1]]
+
+
+def plan_setting_order(settings, start=(0, 0), end=(0, 0), exact_limit=10):
+    """
+    returns the indices of settings in the order that minimizes the total rotation cost
+    settings: list of (alice_angle, bob_angle)
+    start, end: position of the mounts before and after the run (home by default)
+    exact_limit: up to this many settings the optimal order is found exactly, above a nearest neighbour path improved by 2-opt is used
+    """
+    settings = [tuple(setting) for setting in settings]
+    n = len(settings)
+    if n <= 1:
+        return list(range(n))
+
+    # node 0 is start, nodes 1..n are the settings and node n+1 is end
+    D = _cost_matrix([start] + settings + [end])
+
+    if n <= exact_limit:
+        return _held_karp(D, n)
+    return _two_opt(D, _nearest_neighbour(D, n))
+
+
+class SettingPlanner:
+    """
+    caches the planned order, so repeated runs over the same settings do not have to plan again
+    """
+    def __init__(self, start=(0, 0), end=(0, 0), exact_limit=10):
+        self.start = tuple(start)
+        self.end = tuple(end)
+        self.exact_limit = exact_limit
+        self._orders = {}
+
+    def order(self, settings):
+        """
+        returns the indices of settings in the order they should be measured
+        """
+        key = tuple(tuple(float(angle) for angle in setting) for setting in settings)
+        if key not in self._orders:
+            self._orders[key] = plan_setting_order(key, self.start, self.end, self.exact_limit)
+        return list(self._orders[key])
+
+    def clear(self):
+        self._orders.clear()
@@ -1,10 +1,20 @@
 from .experiment_simulator import TT_Simulator
-from .states import two_particle_states, H, V
+from .states import two_particle_states, H, V, bell_state, werner_state, density_matrix, from_tomography
 from .time_tagger_controller import TimeTaggerController
+from .virtual_tagger import VirtualTimeTagger
+from .tag_recording import TagRecorder, TagRecording, ReplayTimeTagger
 
 __all__ = ["TT_Simulator", 
            "two_particle_states", 
            "H", 
            "V",
+           "bell_state",
+           "werner_state",
+           "density_matrix",
+           "from_tomography",
            "TimeTaggerController",
+           "VirtualTimeTagger",
+           "TagRecorder",
+           "TagRecording",
+           "ReplayTimeTagger",
            ]
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+Timing instrumentation of the metronome loop (TimeTaggerController.get_single_measurement_metronome).
+The phase durations of every beat are written into a preallocated array, so recording a beat
+does not allocate. Percentiles, missed beats and the CSV export are computed from that array afterwards
+"""
+import numpy as np
+
+PHASES = ['pre_rotation', 'rotation', 'post_rotation', 'end_buffer', 'total', 'overrun']
+
+
+class BeatTimingRecorder:
+
+    def __init__(self, capacity=10000, tolerance=0.002):
+        """
+        capacity: number of beats that fit into the preallocated arrays (doubles if exceeded)
+        tolerance: a beat counts as missed if it took more than this (in s) longer than the metronome interval
+        """
+        self.tolerance = tolerance
+        self.timings = np.full((int(capacity), len(PHASES)), np.nan)
+        self.intervals = np.full(int(capacity), np.nan)
+        self.n_beats = 0
+
+    def reset(self):
+        self.timings[:] = np.nan
+        self.intervals[:] = np.nan
+        self.n_beats = 0
+
+    def record(self, pre_rotation, rotation, post_rotation, end_buffer, total, interval):
+        """
+        stores the phase durations of one beat (in s), interval is the metronome interval the beat should have taken
+        """
+        if self.n_beats == len(self.timings):
+            self.timings = np.concatenate((self.timings, np.full_like(self.timings, np.nan)))
+            self.intervals = np.concatenate((self.intervals, np.full_like(self.intervals, np.nan)))
+
+        row = self.timings[self.n_beats]
+        row[0] = pre_rotation
+        row[1] = rotation
+        row[2] = post_rotation
+        row[3] = end_buffer
+        row[4] = total
+        row[5] = total - interval
+        self.intervals[self.n_beats] = interval
+        self.n_beats += 1
+
+    def _recent(self, window):
+        start = 0 if window is None else max(self.n_beats - window, 0)
+        return self.timings[start:self.n_beats]
+
+    def percentiles(self, window=100, q=(50, 95, 99)):
+        """
+        returns {phase: [p50, p95, p99]} (in s) over the last window beats (all beats if window is None)
+        """
+        recent = self._recent(window)
+        if len(recent) == 0:
+            return {phase: [np.nan] * len(q) for phase in PHASES}
+        values = np.percentile(recent, q, axis=0)
+        return {phase: list(values[:, i]) for i, phase in enumerate(PHASES)}
+
+    @property
+    def missed_beats(self):
+        """
+        number of beats that overran their interval by more than the tolerance
+        """
+        return int(np.count_nonzero(self.timings[:self.n_beats, 5] > self.tolerance))
+
+    def print_summary(self, window=100):
+        print(f"{self.n_beats} beats, {self.missed_beats} missed (> {self.tolerance * 1e3:.1f} ms overrun)")
+        print(f"{'':<14} {'p50':>8} {'p95':>8} {'p99':>8}")
+        for phase, values in self.percentiles(window).items():
+            print(f"{phase:<14} " + " ".join(f"{v * 1e3:>6.1f}ms" for v in values))
+
+    def to_csv(self, path):
+        """
+        writes one line per beat with the interval and all phase durations in s
+        """
+        data = np.column_stack((np.arange(self.n_beats), self.intervals[:self.n_beats], self.timings[:self.n_beats]))
+        np.savetxt(path, data, delimiter=',', header=','.join(['beat', 'interval'] + PHASES), comments='', fmt=['%d'] + ['%.6f'] * (len(PHASES) + 1))
@@ -0,0 +1,183 @@
+"""
+Pipelined measurement of a list of basis settings (used by the CHSH measurements of the TimeTaggerController)
+and the result objects the CHSH entry points return.
+
+For every setting the mounts are rotated, then the counters integrate. The scheduler overlaps these steps:
+the rotation to the next setting starts the moment the integration window of the current one closes, and the
+counters of the current setting are read out and analysed while the mounts move.
+"""
+import time
+import asyncio
+import threading
+import numpy as np
+
+
+class SettingResult:
+    """
+    counts and timing of a single basis setting
+    counts: [NTT, NTR, NRT, NRR]
+    all times in s, start times relative to the start of the run
+    """
+    def __init__(self, alice_angle, bob_angle, counts, rotation_start, rotation_time, integration_start, integration_time, readout_time):
+        self.alice_angle = alice_angle
+        self.bob_angle = bob_angle
+        self.counts = np.asarray(counts)
+        self.rotation_start = rotation_start
+        self.rotation_time = rotation_time
+        self.integration_start = integration_start
+        self.integration_time = integration_time
+        self.readout_time = readout_time
+
+    @property
+    def correlation(self):
+        N = self.counts
+        return (N[0] - N[1] - N[2] + N[3]) / N.sum()
+
+    @property
+    def uncertainty(self):
+        return correlation_uncertainty(self.counts)
+
+    def __repr__(self):
+        return (f"SettingResult(alice={self.alice_angle}, bob={self.bob_angle}, counts={self.counts.tolist()}, "
+                f"rotation={self.rotation_time*1e3:.0f}ms, integration={self.integration_time*1e3:.0f}ms, readout={self.readout_time*1e3:.1f}ms)")
+
+
+class CHSHResult:
+    """
+    S: CHSH value (array with one value per coincidence channel for measure_S_with_two_ports)
+    correlations: correlations of the (a, A) x (b, B) settings
+    settings: list of SettingResult in the order the settings were requested (rotation_start gives the order they were measured in)
+    total_time: wall clock time of the whole run in s
+    S_uncertainty: standard error of S (from the poisson errors of the counts)
+    """
+    def __init__(self, S, correlations, settings, total_time, S_uncertainty=None):
+        self.S = S
+        self.correlations = correlations
+        self.settings = settings
+        self.total_time = total_time
+        self.S_uncertainty = S_uncertainty
+
+    def print_timing(self):
+        print(f"{'alice':>8} {'bob':>8} {'rotation':>10} {'integration':>12} {'readout':>9} {'N':>8} {'corr':>16}")
+        for r in sorted(self.settings, key=lambda r: r.rotation_start):
+            print(f"{r.alice_angle:>8.2f} {r.bob_angle:>8.2f} {r.rotation_time*1e3:>8.0f}ms {r.integration_time*1e3:>10.0f}ms {r.readout_time*1e3:>7.1f}ms "
+                  f"{r.counts.sum():>8} {r.correlation:>7.4f} +- {r.uncertainty:.4f}")
+        print(f"total: {self.total_time:.2f} s")
+
+    def __repr__(self):
+        if self.S_uncertainty is not None:
+            return f"CHSHResult(S={self.S} +- {self.S_uncertainty}, total_time={self.total_time:.2f}s, settings={len(self.settings)})"
+        return f"CHSHResult(S={self.S}, total_time={self.total_time:.2f}s, settings={len(self.settings)})"
+
+
+class SettingScheduler:
+    """
+    rotate(alice_angle, bob_angle): rotates the mounts and blocks until they are in place
+                                    (can also be a coroutine function, e.g. KineticMountControl.rotate_simultaneously_async)
+    integrate(alice_angle, bob_angle): starts the counters and blocks until the integration window is over
+    read_out(alice_angle, bob_angle): returns the counts [NTT, NTR, NRT, NRR] of the last integration
+    """
+    def __init__(self, rotate, integrate, read_out):
+        self.rotate = rotate
+        self.integrate = integrate
+        self.read_out = read_out
+
+    async def _timed(self, function, *args):
+        start = time.perf_counter()
+        if asyncio.iscoroutinefunction(function):
+            result = await function(*args)
+        else:
+            result = await asyncio.to_thread(function, *args)
+        return result, start, time.perf_counter() - start
+
+    async def run_async(self, settings):
+        """
+        measures all (alice_angle, bob_angle) settings, returns list of SettingResult in the same order
+        """
+        settings = list(settings)
+        if not settings:
+            return []
+
+        t0 = time.perf_counter()
+        results = [None] * len(settings)
+
+        rotation = asyncio.create_task(self._timed(self.rotate, *settings[0]))
+        readout = None
+        for k, (alice_angle, bob_angle) in enumerate(settings):
+            _, rotation_start, rotation_time = await rotation
+
+            # the counters are reused, so the previous setting has to be read out before integrating again
+            if readout is not None:
+                await readout
+
+            _, integration_start, integration_time = await self._timed(self.integrate, alice_angle, bob_angle)
+
+            # integration window is closed: start moving to the next setting right away and read out in the meantime
+            if k + 1 < len(settings):
+                rotation = asyncio.create_task(self._timed(self.rotate, *settings[k + 1]))
+
+            async def read_out(k=k, timing=(rotation_start, rotation_time, integration_start, integration_time)):
+                counts, _, readout_time = await self._timed(self.read_out, *settings[k])
+                rotation_start, rotation_time, integration_start, integration_time = timing
+                results[k] = SettingResult(settings[k][0], settings[k][1], counts,
+                                           rotation_start - t0, rotation_time, integration_start - t0, integration_time, readout_time)
+            readout = asyncio.create_task(read_out())
+
+        await readout
+        return results
+
+    def run(self, settings):
+        """
+        blocking version of run_async(), also works when an event loop is already running (e.g. in jupyter)
+        """
+        return run_blocking(self.run_async(settings))
+
+
+def correlation_uncertainty(counts):
+    """
+    standard error of the correlation (NTT - NTR - NRT + NRR) / N for poisson distributed counts: sqrt((1 - E^2) / N)
+    """
+    N = np.asarray(counts)
+    total = N.sum()
+    if total == 0:
+        return np.inf
+    E = (N[0] - N[1] - N[2] + N[3]) / total
+    return np.sqrt(max(1 - E**2, 0) / total)
+
+
+def integrate_adaptively(measure_slice, target_uncertainty, max_slices):
+    """
+    sums the counts of consecutive slices until the standard error of the correlation is at most
+    target_uncertainty, or max_slices have been measured
+    measure_slice(): returns the counts [NTT, NTR, NRT, NRR] of one slice
+    """
+    N = np.zeros(4, dtype=int)
+    for _ in range(max(int(max_slices), 1)):
+        N += np.asarray(measure_slice(), dtype=int)
+        if correlation_uncertainty(N) <= target_uncertainty:
+            break
+    return N
+
+
+def run_blocking(coroutine):
+    """
+    runs a coroutine to completion. Inside a running event loop (jupyter) it is run in its own thread and event loop
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    result = {}
+    def target():
+        try:
+            result['value'] = asyncio.run(coroutine)
+        except BaseException as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result['value']
@@ -0,0 +1,101 @@
+"""
+Finds the (polarization) angles that maximise |S| for a density matrix (used by TT_Simulator.find_CHSH_angles).
+
+|S| is first evaluated on a dense grid: the correlations of all grid angles are calculated once as a matrix and
+S for all (a1, b0, b1) combinations (a0 = 0) follows by broadcasting. The best distinct grid points are then
+polished with scipy.optimize.minimize (in worker processes if n_workers > 1).
+Results are cached by a hash of the density matrix, so the same state is only optimized once
+(persisted in the per-user cache directory, see disk_cache for the location and how to opt out)
+"""
+import sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy.optimize import minimize
+from . import numeric_backend
+from .disk_cache import DiskCache, hash_key, source_version
+
+# increase when the optimization changes, so old cache entries are not used anymore
+CACHE_VERSION = 'chsh-1'
+
+_cache = DiskCache('chsh_angles')
+# the key also contains the source code the angles are calculated with, so editing it invalidates the cache (like parameter_sweep)
+_source_version = source_version(sys.modules[__name__], numeric_backend)
+
+
+def correlation_matrix(rho, angles_a, angles_b):
+    """
+    correlations for all combinations of the (polarization) angles, shape (len(angles_a), len(angles_b))
+    """
+    return numeric_backend.correlation(rho, np.asarray(angles_a)[:, None], np.asarray(angles_b)[None, :])
+
+
+def S_grid(rho, grid_size):
+    """
+    |S| on a grid of grid_size angles in [0, pi) (the correlations have period pi) for a0 = 0
+    Returns (grid angles, |S| with shape (a1, b0, b1))
+    """
+    angles = np.arange(grid_size) * np.pi / grid_size
+    C = correlation_matrix(rho, angles, angles)
+    C0 = C[0]  # a0 = 0
+
+    S = C0[None, :, None] + C[:, :, None] + C0[None, None, :] - C[:, None, :]
+    return angles, np.abs(S)
+
+
+def _S(x, rho):
+    a1, b0, b1 = x
+    C = numeric_backend.correlation(rho, np.array([0, a1, 0, a1]), np.array([b0, b0, b1, b1]))
+    return -abs(C[0] + C[1] + C[2] - C[3])
+
+
+def _polish(args):
+    rho, x0 = args
+    result = minimize(_S, x0=x0, args=(rho,), method='L-BFGS-B')
+    return -result.fun, result.x
+
+
+def _wrap(angles):
+    """
+    maps angles onto [-pi/2, pi/2)
+    """
+    return (np.asarray(angles) + np.pi / 2) % np.pi - np.pi / 2
+
+
+def find_CHSH_angles(rho, grid_size=48, n_candidates=8, n_workers=None, use_cache=True):
+    """
+    Returns the maximal |S| and the angles [a0, a1, b0, b1] (polarization angles in radians, a0 = 0)
+    grid_size: number of grid angles per angle
+    n_candidates: number of best grid points that are polished
+    n_workers: polish in this many processes (in this process if None or 1, starting processes takes longer than a few polishes)
+    """
+    rho = np.asarray(rho, dtype=complex)
+    key = hash_key(CACHE_VERSION, _source_version, rho, np.array([grid_size, n_candidates]))
+    if use_cache:
+        cached = _cache.get(key)
+        if cached is not None:
+            return cached['S'], np.array(cached['angles'])
+
+    angles, S = S_grid(rho, grid_size)
+
+    # best grid points, a neighbouring point of an already chosen one is not a new candidate
+    candidates = []
+    for flat_index in np.argsort(S, axis=None)[::-1]:
+        index = np.array(np.unravel_index(flat_index, S.shape))
+        if all(np.abs((index - other + grid_size // 2) % grid_size - grid_size // 2).max() > 1 for other in candidates):
+            candidates.append(index)
+        if len(candidates) == n_candidates:
+            break
+
+    jobs = [(rho, angles[index]) for index in candidates]
+    if n_workers is not None and n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(_polish, jobs))
+    else:
+        results = [_polish(job) for job in jobs]
+
+    maximum, x = max(results, key=lambda result: result[0])
+    best_angles = np.concatenate(([0], _wrap(x)))
+
+    if use_cache:
+        _cache.set(key, {'S': float(maximum), 'angles': best_angles.tolist()})
+    return float(maximum), best_angles
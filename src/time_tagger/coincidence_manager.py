@@ -0,0 +1,102 @@
+"""
+Cache of the Coincidences virtual channels of a tagger.
+Creating virtual channels takes time on the device and every Coincidences object keeps running in the background
+until it is stopped and deleted, so instead of creating a new one on every call the groups are kept per
+(channel groups, coincidence window) and the least recently used ones are freed once there are too many.
+
+Whoever uses the channels (counters, streams, live traces) holds them: get() and hold() add a user, release()
+removes it. Channels that still have users are never freed, if all of them are in use the eviction is deferred
+until enough of them are released
+"""
+from collections import OrderedDict
+
+
+class CoincidenceChannelManager:
+
+    def __init__(self, api, tagger, max_active=4):
+        """
+        api: module with the measurement classes of the tagger (TimeTagger or the virtual tagger)
+        tagger: the (real or virtual) time tagger
+        max_active: number of Coincidences objects kept alive at the same time (exceeded only while all of them are in use)
+        """
+        self.api = api
+        self.tagger = tagger
+        self.max_active = max(int(max_active), 1)
+
+        # (groups, window in ps) -> Coincidences, the most recently used one is last
+        self._active = OrderedDict()
+        # (groups, window in ps) -> number of users
+        self._users = {}
+
+    @staticmethod
+    def _key(groups, coincidence_window_SI):
+        return tuple(tuple(group) for group in groups), int(round(coincidence_window_SI * 1e12))
+
+    def _key_of(self, vchannels):
+        for key, active in self._active.items():
+            if active is vchannels:
+                return key
+        raise RuntimeError("Error: These coincidence channels are not managed (or have already been freed)")
+
+    def get(self, groups, coincidence_window_SI):
+        """
+        returns the Coincidences virtual channels for the given channel groups and coincidence window (in s)
+        and adds a user to them (call release() when done). They are only created if they are not active already
+        """
+        key = self._key(groups, coincidence_window_SI)
+        if key not in self._active:
+            groups, window_ps = key
+            self._active[key] = self.api.Coincidences(self.tagger, list(groups), coincidenceWindow=window_ps)
+            self._users[key] = 0
+
+        self._active.move_to_end(key)
+        self._users[key] += 1
+        self._evict()
+        return self._active[key]
+
+    def hold(self, vchannels):
+        """
+        adds a user to already active channels (e.g. a live trace that keeps showing them)
+        """
+        self._users[self._key_of(vchannels)] += 1
+
+    def release(self, vchannels):
+        """
+        removes a user, the channels are freed once they have no users and are among the least recently used
+        """
+        key = self._key_of(vchannels)
+        if self._users[key] == 0:
+            raise RuntimeError("Error: These coincidence channels have no users to release")
+        self._users[key] -= 1
+        self._evict()
+
+    def users(self, vchannels):
+        return self._users[self._key_of(vchannels)]
+
+    def clear(self):
+        """
+        frees all channels, raises a RuntimeError if some of them are still in use
+        """
+        in_use = [key for key, users in self._users.items() if users > 0]
+        if in_use:
+            raise RuntimeError(f"Error: {len(in_use)} coincidence channel group(s) are still in use")
+        while self._active:
+            self._free(next(iter(self._active)))
+
+    def _evict(self):
+        # least recently used first, skipping everything that is still in use
+        unused = [key for key in self._active if self._users[key] == 0]
+        for key in unused[:max(len(self._active) - self.max_active, 0)]:
+            self._free(key)
+
+    def _free(self, key):
+        vchannels = self._active.pop(key)
+        del self._users[key]
+        # stop the channels on the device, dropping the reference alone only frees them once every
+        # other reference (e.g. in a measurement that was not released) is gone as well
+        stop = getattr(vchannels, 'stop', None)
+        if stop is not None:
+            stop()
+
+    def __len__(self):
+        return len(self._active)
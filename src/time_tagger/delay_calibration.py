@@ -0,0 +1,92 @@
+"""
+Analysis functions for the delay calibration (TimeTaggerController.calibrateDelays).
+Locates the coincidence peak of correlation histograms with a gaussian + constant background fit
+and combines the peak positions of all Alice/Bob channel pairs into one delay per channel
+"""
+import numpy as np
+from scipy.optimize import curve_fit
+
+CHANNEL_NAMES = ['Alice_T', 'Alice_R', 'Bob_T', 'Bob_R']
+
+# every pair has coincidences when the filters are at (22.5, 0)
+CHANNEL_PAIRS = [('Alice_T', 'Bob_T'), ('Alice_T', 'Bob_R'), ('Alice_R', 'Bob_T'), ('Alice_R', 'Bob_R')]
+
+
+def rebin(index, counts, factor):
+    """
+    combines factor neighbouring bins into one, returns (bin positions, counts)
+    """
+    factor = max(int(factor), 1)
+    n = len(counts) // factor * factor
+    return index[:n].reshape(-1, factor).mean(axis=1), counts[:n].reshape(-1, factor).sum(axis=1)
+
+
+def gaussian_with_background(t, amplitude, position, width, background):
+    return background + amplitude * np.exp(-0.5 * ((t - position) / width) ** 2)
+
+
+def locate_peak(index, counts, coarse_factor):
+    """
+    coarse peak position: maximum of the rebinned histogram after subtracting the (median) background
+    """
+    t, c = rebin(index, counts, coarse_factor)
+    return t[np.argmax(c - np.median(c))]
+
+
+def fit_correlation_peak(index, counts, center, half_width):
+    """
+    Fits a gaussian on a constant background to the histogram within center +- half_width
+    Returns a dict with the peak 'position', its 'uncertainty' and 'width' (all in ps, None if the fit failed)
+    and the number of 'coincidences' in the peak above the background
+    """
+    mask = np.abs(index - center) <= half_width
+    t = index[mask].astype(float)
+    c = counts[mask].astype(float)
+
+    result = {'position': None, 'uncertainty': None, 'width': None, 'coincidences': 0}
+    if c.size < 5:
+        return result
+
+    # background from the outer fifths of the window, so the peak itself does not bias it
+    edge = max(c.size // 5, 1)
+    background = np.median(np.concatenate((c[:edge], c[-edge:])))
+    result['coincidences'] = max(c.sum() - background * c.size, 0)
+
+    p0 = [max(c.max() - background, 1), t[np.argmax(c)], half_width / 5, background]
+    try:
+        popt, pcov = curve_fit(gaussian_with_background, t, c, p0=p0, sigma=np.sqrt(np.maximum(c, 1)), absolute_sigma=True)
+    except (RuntimeError, ValueError):
+        return result
+
+    uncertainty = np.sqrt(pcov[1, 1])
+    if not np.isfinite(uncertainty) or popt[0] <= 0:
+        return result
+
+    result['position'] = popt[1]
+    result['uncertainty'] = uncertainty
+    result['width'] = abs(popt[2])
+    return result
+
+
+def solve_delays(peaks):
+    """
+    Combines the peak positions of the channel pairs into delays relative to Alice_T (weighted least squares)
+    peaks: {(channel_a, channel_b): fit result}, where the histogram of (a, b) peaks at delay_a - delay_b
+    Returns (delays, uncertainties), both in ps and in the order of CHANNEL_NAMES
+    """
+    unknowns = CHANNEL_NAMES[1:]
+    A = np.zeros((len(peaks), len(unknowns)))
+    y = np.zeros(len(peaks))
+    w = np.zeros(len(peaks))
+    for row, ((a, b), peak) in enumerate(peaks.items()):
+        if a in unknowns:
+            A[row, unknowns.index(a)] += 1
+        if b in unknowns:
+            A[row, unknowns.index(b)] -= 1
+        y[row] = peak['position']
+        w[row] = 1 / peak['uncertainty']**2
+
+    covariance = np.linalg.inv(A.T @ (w[:, None] * A))
+    delays = covariance @ A.T @ (w * y)
+
+    return np.concatenate(([0], delays)), np.concatenate(([0], np.sqrt(np.diag(covariance))))
@@ -0,0 +1,135 @@
+"""
+Small on-disk cache for results of expensive simulator calculations (CHSH angle optimization, parameter sweeps).
+Entries are json files named by a hash of everything the result depends on, in <directory>/<name>.
+
+The cache is persisted by default in the per-user cache directory DEFAULT_DIRECTORY ($XDG_CACHE_HOME/bruqner,
+~/.cache/bruqner if XDG_CACHE_HOME is not set), so repeated startups reuse the results of earlier sessions.
+The environment variable BRUQNER_CACHE_DIR (or set_default_directory()) moves it somewhere else, setting it to
+'none' (MEMORY_ONLY) opts out: the caches then only live in memory for the running python process
+"""
+import os
+import json
+import hashlib
+import numpy as np
+
+DEFAULT_DIRECTORY = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'bruqner')
+ENVIRONMENT_VARIABLE = 'BRUQNER_CACHE_DIR'
+
+# directory value that keeps the caches in memory only
+MEMORY_ONLY = 'none'
+
+# directory set with set_default_directory, takes precedence over the environment variable
+_default_directory = None
+
+
+def set_default_directory(directory):
+    """
+    persists all caches without an explicit directory in directory, MEMORY_ONLY keeps them in memory only
+    (None: back to the environment variable / DEFAULT_DIRECTORY)
+    """
+    global _default_directory
+    _default_directory = directory
+
+
+def default_directory():
+    """
+    directory the caches without an explicit directory are persisted in, None if they only live in memory
+    """
+    directory = _default_directory or os.environ.get(ENVIRONMENT_VARIABLE) or DEFAULT_DIRECTORY
+    return None if directory.lower() == MEMORY_ONLY else directory
+
+
+def hash_key(*parts, decimals=12):
+    """
+    hash of numbers, arrays and strings. Arrays are rounded to decimals first, so results of the same
+    calculation done in a slightly different order (rounding errors) get the same key
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            h.update(part.encode())
+        else:
+            array = np.round(np.asarray(part, dtype=complex), decimals) + 0  # + 0 turns -0 into 0
+            h.update(str(array.shape).encode())
+            h.update(array.tobytes())
+        h.update(b'|')
+    return h.hexdigest()
+
+
+def source_version(*modules):
+    """
+    hash of the source code of the modules, as part of a cache key it invalidates the entries
+    as soon as the code that calculated them changes (also when nobody remembered to increase a version)
+    """
+    h = hashlib.sha256()
+    for module in modules:
+        with open(module.__file__, 'rb') as file:
+            h.update(file.read())
+    return h.hexdigest()[:16]
+
+
+class DiskCache:
+
+    def __init__(self, name, directory=None):
+        """
+        name: sub directory for this kind of result
+        directory: cache directory (default_directory() if None, which is checked on every access), MEMORY_ONLY to not persist it
+        """
+        self.name = name
+        self._directory = directory
+        # key -> json string, used while the cache is not persisted (opted out)
+        self._memory = {}
+
+    @property
+    def directory(self):
+        """
+        directory of the entries, None if the cache only lives in memory
+        """
+        base = self._directory or default_directory()
+        if base is None or base.lower() == MEMORY_ONLY:
+            return None
+        return os.path.join(base, self.name)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key, default=None):
+        if self.directory is None:
+            value = self._memory.get(key)
+            return default if value is None else json.loads(value)
+        try:
+            with open(self._path(key)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return default
+
+    def set(self, key, value):
+        """
+        stores a json serializable value. Failing to write (read only file system, ...) is not an error, the value is just not cached
+        """
+        if self.directory is None:
+            # stored as json, so the values returned are the same as those read from disk (and not shared)
+            self._memory[key] = json.dumps(value)
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # write to a temporary file first, so parallel processes never read half written entries
+            tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as file:
+                json.dump(value, file)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            pass
+
+    def __contains__(self, key):
+        if self.directory is None:
+            return key in self._memory
+        return os.path.exists(self._path(key))
+
+    def clear(self):
+        self._memory.clear()
+        if self.directory is None or not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.json'):
+                os.remove(os.path.join(self.directory, filename))
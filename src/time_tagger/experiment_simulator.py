@@ -4,11 +4,15 @@ Simulates the ouput of the time tagger
 """
 import numpy as np
 import sympy as sp
+from collections import OrderedDict
 from sympy.physics.quantum import TensorProduct, Dagger
 from sympy.physics.quantum.trace import Tr
-from scipy.optimize import minimize
 from sys import stdout
 from . import states
+from . import numeric_backend
+from . import chsh_optimizer
+from . import monte_carlo
+from . import parameter_sweep
 
 # Define |H>, |V> in 
 H = states.H 
@@ -32,10 +36,83 @@ def half_wave_plate_sympy(theta):
     return sp.Matrix([[c, s], [s, -c]])
 
 
+class OutcomeProbabilityCache:
+    """
+    LRU cache of the normalised outcome probabilities [HH, HV, VH, VV] and the correlation for (polarization) angle settings.
+    A performance only uses a handful of settings, so they are evaluated once instead of for every measurement
+    """
+    def __init__(self, compute, max_size=256, decimals=9):
+        """
+        compute(theta_a, theta_b): returns (probabilities, correlation) for one setting
+        decimals: angles are rounded to this many decimals for the lookup
+        """
+        self.compute = compute
+        self.max_size = max_size
+        self.decimals = decimals
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, theta_a, theta_b):
+        """
+        returns (probabilities, correlation) for one setting, the probabilities are read-only
+        """
+        key = (round(float(theta_a), self.decimals), round(float(theta_b), self.decimals))
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        probabilities, correlation = self.compute(*key)
+        probabilities = np.array(probabilities, dtype=float)
+        probabilities.setflags(write=False)
+        entry = (probabilities, float(correlation))
+
+        self._entries[key] = entry
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entry
+
+    def warm(self, settings):
+        for theta_a, theta_b in settings:
+            self.get(theta_a, theta_b)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
 class TT_Simulator:
-    def __init__(self, initial_state, initial_state_noise_q=0, initial_state_noise_vis=1, detector_efficiencies=[1,1,1,1], debug=True) -> None:
-        
+
+    # angle batches up to this size are looked up in the probability cache, larger ones (sweeps) are evaluated directly
+    CACHED_BATCH_SIZE = 16
+
+    def __init__(self, initial_state, initial_state_noise_q=0, initial_state_noise_vis=1, detector_efficiencies=[1,1,1,1], backend='numeric', debug=True, cache_CHSH_angles=True, seed=None) -> None:
+        """
+        backend='numeric': ['numeric', 'sympy'] - 'numeric' does all calculations with NumPy arrays, the symbolic
+        correlation function is then only calculated when it is actually asked for (print_summary(show_formula=True)
+        or the correlation_function attribute)
+
+        initial_state: state vector (e.g. from states.two_particle_states) or 4 x 4 density matrix (e.g. from tomography)
+        cache_CHSH_angles=True: reuse the CHSH angles found for the same density matrix before (cached on disk, see disk_cache)
+
+        seed: seed (or numpy.random.Generator) of the generator all simulated measurements draw from (self.rng).
+              If None it is seeded from the global numpy random state, so np.random.seed() before creating the
+              simulator also makes the runs reproducible
+
+        Outcome probabilities of single settings are cached (self.probability_cache), call self.probability_cache.clear()
+        after changing the state or the detector efficiencies
+        """
+        assert backend in ['numeric', 'sympy']
+
         self.debug = debug
+        self.backend = backend
+        self.cache_CHSH_angles = cache_CHSH_angles
+        self.rng = np.random.default_rng(seed if seed is not None else np.random.randint(2**31))
         self.initial_state = initial_state
         self.initial_state_noise_q = initial_state_noise_q
         self.initial_state_noise_vis = initial_state_noise_vis
@@ -53,22 +130,28 @@ class TT_Simulator:
             self._print_div("\nTIME-TAGGER SIMULATOR")
             print("Initialising . . .")
 
-        #self.initial_state[-1] = self.initial_state_noise_vis
-        self.initial_state_density = self._density_operator_from_vector(self.initial_state)
-        
-        # apply depolarizing noise (1-noise)*rho + noise * I, where noise from 0 to 1
-        # then renormalise for trace to be 1
-        self.initial_state_density = (1-self.initial_state_noise_q) * self.initial_state_density + self.initial_state_noise_q/4 * sp.eye(4)
-        print(self.initial_state_density)
-        print(Tr(self.initial_state_density))
-        self.initial_state_density *= 1/Tr(self.initial_state_density)
+        # numeric density matrix with depolarizing noise and reduced visibility, used by the numeric backend
+        self.rho = numeric_backend.reduce_visibility(numeric_backend.depolarize(numeric_backend.density_from_state(self.initial_state), self.initial_state_noise_q), self.initial_state_noise_vis)
 
-        self.correlation_function, self.correlation_function_lambdified = self.find_correlation_function(self.initial_state_density, lambdify='both')
-        self.S, self.CHSH_angles = self.find_CHSH_angles(self.initial_state_density)
+        self._initial_state_density = None
+        self._correlation_function = None
+        if self.backend == 'sympy':
+            self._correlation_function, self.correlation_function_lambdified = self.find_correlation_function(self.initial_state_density, lambdify='both')
+            self.S, self.CHSH_angles = self.find_CHSH_angles(self.initial_state_density)
+        else:
+            self.correlation_function_lambdified = self._numeric_correlation_function
+            self.outcome_probabilities = self._numeric_outcome_probabilities
+            self.S, self.CHSH_angles = self.find_CHSH_angles(self.rho)
 
         # give the angles in terms of the filter angle (not light polarisation angle), and in degrees
         self.CHSH_angles_for_filters = self.CHSH_angles * 90 / np.pi
 
+        # warm the cache with the CHSH settings and their perpendicular ones (filter + 45deg, used for two port measurements)
+        self.probability_cache = OutcomeProbabilityCache(self._compute_outcome_probabilities_and_correlation)
+        alice_angles, bob_angles = self.CHSH_angles[0:2], self.CHSH_angles[2:4]
+        self.probability_cache.warm([(a + a_perp, b + b_perp) for a in alice_angles for b in bob_angles
+                                                             for a_perp in [0, np.pi/2] for b_perp in [0, np.pi/2]])
+
         if self.debug:
             stdout.write("\033[F")  # Move the cursor to the previous line
             stdout.write("\033[K")  # clear the line
@@ -76,9 +159,52 @@ class TT_Simulator:
             self.print_summary()
             self._print_div()
 
+    @property
+    def initial_state_density(self):
+        """
+        symbolic density matrix of the initial state (with depolarizing noise), only built when needed
+        """
+        if self._initial_state_density is None:
+            # the initial state can also be given as a density matrix (e.g. from tomography)
+            if numeric_backend.is_density_matrix(self.initial_state):
+                initial_state_density = sp.Matrix(self.initial_state)
+            else:
+                initial_state_density = self._density_operator_from_vector(self.initial_state)
+
+            # apply depolarizing noise (1-noise)*rho + noise * I, where noise from 0 to 1
+            # then renormalise for trace to be 1
+            initial_state_density = (1-self.initial_state_noise_q) * initial_state_density + self.initial_state_noise_q/4 * sp.eye(4)
+
+            # reduced visibility scales the off-diagonal entries (coherences)
+            initial_state_density = sp.Matrix(4, 4, lambda i, j: initial_state_density[i, j] * (1 if i == j else self.initial_state_noise_vis))
+            if self.debug:
+                print(initial_state_density)
+                print(Tr(initial_state_density))
+            self._initial_state_density = initial_state_density * 1/Tr(initial_state_density)
+
+        return self._initial_state_density
+
+    @property
+    def correlation_function(self):
+        """
+        symbolic correlation function, only calculated (with sympy) the first time it is asked for
+        """
+        if self._correlation_function is None:
+            self._correlation_function = self.find_correlation_function(self.initial_state_density, lambdify=False)
+            # find_correlation_function overwrites the outcome probabilities with the sympy version
+            if self.backend == 'numeric':
+                self.outcome_probabilities = self._numeric_outcome_probabilities
+        return self._correlation_function
+
+    def _numeric_correlation_function(self, theta_a, theta_b):
+        return numeric_backend.correlation(self.rho, theta_a, theta_b)
 
+    def _numeric_outcome_probabilities(self, theta_a, theta_b):
+        """
+        same output format as the lambdified sympy version, a column vector (4 x 1) for HH, HV, VH, VV
+        """
+        return numeric_backend.outcome_probabilities(self.rho, theta_a, theta_b, self.detector_efficiencies)[..., None]
 
-    
     def _print_div(self, title=None):
         if title is not None: print(title)
         print('---------------------------------------------------------------') 
@@ -107,7 +233,8 @@ class TT_Simulator:
         # calculate correlation function
         C = Tr(state_density * self.HH_operator) - Tr(state_density * self.HV_operator) - Tr(state_density * self.VH_operator) + Tr(state_density * self.VV_operator)
         C = C.simplify()
-        print(C)
+        if self.debug:
+            print(C)
 
         if lambdify == True:
             return sp.lambdify([theta_a, theta_b], C)
@@ -120,30 +247,13 @@ class TT_Simulator:
         """
         Finds light polarisation angles that maximise S. Returns max S value reachable and list of angles in the ff. form:
         [angleA1, angleA2, angleB1, angleB2]
+        Grid search followed by polishing the best candidates (see chsh_optimizer), results are cached on disk per density matrix
         """
-        theta_a_0, theta_a_1, theta_b_0, theta_b_1 = sp.symbols('theta_a_0 theta_a_1 theta_b_0 theta_b_1', real=True)
-
-        # get the lambdified correlation function (for faster computation)
-        C = self.find_correlation_function(initial_state_density, lambdify=True)
-
-        # build S function from correlation functions (make in terms of multiples of pi)
-        def S(x):
-            a0 = x[0] * np.pi 
-            a1 = x[1] * np.pi 
-            b0 = x[2] * np.pi 
-            b1 = x[3] * np.pi 
-            return -np.abs(C(a0, b0) + C(a1, b0) + C(a0, b1) - C(a1, b1))
-
-        # initial guess for angles
-        x0 = [0, -1/8, 1/16, -1/16]
-        bounds = [(-1,1),(-1,1),(-1,1),(-1,1)]
-        constraint = {'type': 'eq', 'fun': lambda x: x[0]} # force first angle to be 0
+        # the optimization is always numeric
+        if not isinstance(initial_state_density, np.ndarray):
+            initial_state_density = np.array(sp.N(initial_state_density), dtype=complex)
 
-        result = minimize(fun=S, x0=x0, bounds=bounds, constraints=constraint)
-        maximum = -result["fun"] # negative because we acutally want to maximize
-        angles = np.array([x * np.pi for x in result['x']]) # give actual angle in radians again (not in multiples of pi)
-
-        return maximum, angles 
+        return chsh_optimizer.find_CHSH_angles(initial_state_density, use_cache=self.cache_CHSH_angles)
 
     def S_for_fixed_angles(self, theta_a0, theta_a1, theta_b0, theta_b1, angle_mode='degrees', angle_reference='filter', return_absolute=True):
         '''
@@ -165,13 +275,49 @@ class TT_Simulator:
             theta_b0 *= conversion
             theta_b1 *= conversion
 
-        C = self.correlation_function_lambdified
+        C = lambda theta_a, theta_b: self.probability_cache.get(theta_a, theta_b)[1]
         S = C(theta_a0, theta_b0) + C(theta_a1, theta_b0)+C(theta_a0, theta_b1) - C(theta_a1, theta_b1)
 
         if return_absolute: 
             S = np.abs(S)
         return float(S)
 
+    def _CHSH_probability_matrix(self, angles=None):
+        """
+        outcome probabilities of the settings (a0, b0), (a0, b1), (a1, b0), (a1, b1)
+        angles: filter angles [a0, a1, b0, b1] in degrees (self.CHSH_angles_for_filters if None)
+        """
+        a0, a1, b0, b1 = np.asarray(self.CHSH_angles_for_filters if angles is None else angles, dtype=float) * np.pi / 90
+        return self._outcome_probability_matrix([a0, a0, a1, a1], [b0, b1, b0, b1])
+
+    def S_distribution(self, pairs_per_setting, n_runs=10000, angles=None, n_workers=None, seed=None):
+        """
+        distribution of the S values of n_runs simulated CHSH runs with pairs_per_setting detected pairs per setting
+        angles: filter angles [a0, a1, b0, b1] in degrees (self.CHSH_angles_for_filters if None)
+        n_workers: spread the runs over this many processes (see monte_carlo.S_distribution)
+        Returns a monte_carlo.SDistribution (samples, mean, std, confidence_interval(), fraction_above())
+        """
+        return monte_carlo.S_distribution(self._CHSH_probability_matrix(angles), pairs_per_setting, n_runs, n_workers=n_workers, seed=seed)
+
+    def required_pairs_per_setting(self, threshold=2, confidence=0.99, n_runs=10000, angles=None, n_workers=None, seed=None):
+        """
+        number of detected pairs per setting that are needed so a CHSH run gives S > threshold (e.g. the classical
+        bound 2) with probability confidence
+        Returns (pairs per setting, monte_carlo.SDistribution at that number of pairs)
+        """
+        return monte_carlo.required_pairs_per_setting(self._CHSH_probability_matrix(angles), threshold, confidence, n_runs, seed=seed, n_workers=n_workers)
+
+    @staticmethod
+    def sweep_parameters(initial_state, noise_q=(0,), noise_vis=(1,), detector_efficiencies=([1, 1, 1, 1],), curve_angles=parameter_sweep.DEFAULT_CURVE_ANGLES, n_workers=None, use_cache=True, cache_dir=None, debug=False):
+        """
+        optimal S, CHSH angles, correlation curves and outcome probabilities for all combinations of the noise_q,
+        noise_vis and detector_efficiencies grids, without building a simulator for every point.
+        Points are evaluated in n_workers processes and cached on disk, in the per-user cache directory or cache_dir
+        (use_cache=False or parameter_sweep.clear_cache() to bypass or reset the cache, see parameter_sweep.sweep)
+        Returns a parameter_sweep.SweepResult
+        """
+        return parameter_sweep.sweep(initial_state, noise_q, noise_vis, detector_efficiencies, curve_angles, n_workers=n_workers, use_cache=use_cache, cache_dir=cache_dir, debug=debug)
+
     def render_bar(self, val, width=45, show_mid=False, ascii=False):
         """
         Return a single horizontal bar (string) for val in [0,1].
@@ -201,13 +347,20 @@ class TT_Simulator:
 
         return bar 
 
-    def print_summary(self):
+    def print_summary(self, show_formula=None):
+        """
+        show_formula=None: if True prints the symbolic correlation function (calculated with sympy if not yet done)
+        by default it is only shown for the sympy backend
+        """
+        if show_formula is None:
+            show_formula = self.backend == 'sympy'
 
         print("\nFor the initial state:")
         print(self.initial_state)
 
-        print("\nThe correlation function has the form:")
-        print(self.correlation_function)
+        if show_formula:
+            print("\nThe correlation function has the form:")
+            print(self.correlation_function)
 
         print("\nWe find the following optimal CHSH angles (in multiples of pi):")
         print(f"a0:\t{self.CHSH_angles[0]/np.pi:.4f}, a1:\t{self.CHSH_angles[1]/np.pi:.4f}\nb0:\t{self.CHSH_angles[2]/np.pi:.4f}, b1:\t{self.CHSH_angles[3]/np.pi:.4f}")
@@ -228,7 +381,8 @@ class TT_Simulator:
             self.detector_efficiencies[2] * Tr(rho * self.VH_operator),
             self.detector_efficiencies[3] * Tr(rho * self.VV_operator)
         ])
-        print(probability_vector)
+        if self.debug:
+            print(probability_vector)
         # normalise out the detector efficiencies and lambdify to make actual values
         self.outcome_probabilities = sp.lambdify([theta_1, theta_2], probability_vector / sum(probability_vector))
 
@@ -238,26 +392,70 @@ class TT_Simulator:
         Returns 0, 1, 2, 3 depending on which coincidence was triggered
         0:HH, 1:HV, 2:VH, 3:VV 
         """
-        return np.random.choice(a=[0, 1, 2, 3], p=self.outcome_probabilities(theta_a, theta_b)[:,0] / sum(self.outcome_probabilities(theta_a, theta_b)))
+        return self.rng.choice(a=[0, 1, 2, 3], p=self._outcome_probability_matrix(theta_a, theta_b)[0])
         
 
-    def measure_n_entangled_pairs(self, n, theta_a, theta_b):
+    def _outcome_probability_matrix(self, theta_a, theta_b):
+        """
+        Evaluates the normalised outcome probabilities for arrays of (polarization) angles
+        Returns a (settings x 4) array, columns are 0:HH, 1:HV, 2:VH, 3:VV
+        """
+        theta_a, theta_b = np.broadcast_arrays(np.atleast_1d(np.asarray(theta_a, dtype=float)), np.atleast_1d(np.asarray(theta_b, dtype=float)))
+
+        if theta_a.size <= self.CACHED_BATCH_SIZE:
+            return np.array([self.probability_cache.get(a, b)[0] for a, b in zip(theta_a.ravel(), theta_b.ravel())])
+        return self._compute_outcome_probability_matrix(theta_a, theta_b)
+
+    def _compute_outcome_probabilities_and_correlation(self, theta_a, theta_b):
+        """
+        uncached outcome probabilities and correlation of a single setting (fills the probability cache)
+        """
+        P = self._compute_outcome_probability_matrix(np.array([theta_a]), np.array([theta_b]))[0]
+        return P, self.correlation_function_lambdified(theta_a, theta_b)
+
+    def _compute_outcome_probability_matrix(self, theta_a, theta_b):
+        if self.backend == 'numeric':
+            return numeric_backend.outcome_probabilities(self.rho, theta_a.ravel(), theta_b.ravel(), self.detector_efficiencies)
+
+        # one evaluation per setting (not per photon)
+        P = np.empty((theta_a.size, 4))
+        for k, (a, b) in enumerate(zip(theta_a.ravel(), theta_b.ravel())):
+            P[k] = np.asarray(self.outcome_probabilities(a, b), dtype=float)[:, 0]
+
+        # remove tiny negative values from numerical noise and renormalise
+        P = np.clip(P, 0, None)
+        return P / P.sum(axis=1, keepdims=True)
+
+    def measure_n_entangled_pairs_batch(self, n, theta_a, theta_b, rng=None):
+        """
+        Vectorized version of measure_n_entangled_pairs(). Takes arrays of (polarization) angles, for instance
+        a whole CHSH grid or an angle sweep, and draws all n outcomes of each setting in a single multinomial draw.
+        n can be a single number or one number per setting
+        rng: numpy.random.Generator (or a seed) to draw from instead of self.rng
+
+        Returns a (settings x 4) count matrix, columns are 0:HH, 1:HV, 2:VH, 3:VV
+        """
+        rng = self.rng if rng is None else np.random.default_rng(rng)
+        P = self._outcome_probability_matrix(theta_a, theta_b)
+        return rng.multinomial(n, P)
+
+    def measure_n_entangled_pairs(self, n, theta_a, theta_b, rng=None):
         """
         Perform n random entangled pair measurements for one angle setting and then return list showing how often each pair came up
         List index corresponds to pair numbers. 
         0:HH, 1:HV, 2:VH, 3:VV
         """
-
-        N = np.array([0, 0, 0, 0], dtype=int)
-        for _ in range(n):
-            activated_output = self._measure_entangled_pair(theta_a, theta_b)
-            N[activated_output] += 1
-        
-        return N
+        return self.measure_n_entangled_pairs_batch(n, theta_a, theta_b, rng=rng)[0]
 
 
-    def measure_n_entangled_pairs_filter_angles(self, n, theta_a, theta_b):
+    def measure_n_entangled_pairs_filter_angles(self, n, theta_a, theta_b, rng=None):
         """
         Same as measure_n_entangled_pairs() but with angles in degrees and for filters, so can be used directly in conjunction with real setup code
         """
-        return self.measure_n_entangled_pairs(n, theta_a * np.pi/90, theta_b * np.pi / 90)
\ No newline at end of file
+        return self.measure_n_entangled_pairs(n, theta_a * np.pi/90, theta_b * np.pi / 90, rng=rng)
+
+    def measure_n_entangled_pairs_filter_angles_batch(self, n, theta_a, theta_b, rng=None):
+        """
+        Same as measure_n_entangled_pairs_batch() but with angles in degrees and for filters
+        """
+        return self.measure_n_entangled_pairs_batch(n, np.asarray(theta_a) * np.pi/90, np.asarray(theta_b) * np.pi/90, rng=rng)
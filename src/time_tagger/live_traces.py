@@ -0,0 +1,153 @@
+"""
+Live count traces for Jupyter (used by TimeTaggerController.displayCountTraces).
+
+Every trace is reduced to at most two points (min and max) per horizontal pixel before it is sent to the
+browser, so the amount of data per refresh does not depend on n_values. The traces are drawn with WebGL
+(Scattergl), only traces whose counts changed are sent again, and the y axis is only rescaled when the data
+leaves the current range (with some headroom). All figures are refreshed by one shared asyncio task.
+"""
+import asyncio
+import numpy as np
+import plotly.graph_objs as go
+
+
+def minmax_decimate(y, n_pixels):
+    """
+    reduces y to the minimum and maximum of n_pixels buckets (in the order they occur), so peaks stay visible
+    returns (indices into y, decimated values)
+    """
+    y = np.asarray(y)
+    n = len(y)
+    if n <= 2 * n_pixels:
+        return np.arange(n), y
+
+    bucket_size = int(np.ceil(n / n_pixels))
+    n_buckets = n // bucket_size
+    n_full = n_buckets * bucket_size
+
+    buckets = y[:n_full].reshape(n_buckets, bucket_size)
+    offsets = np.arange(n_buckets) * bucket_size
+    i_min = offsets + buckets.argmin(axis=1)
+    i_max = offsets + buckets.argmax(axis=1)
+
+    # keep the points of every bucket in time order, plus the last (incomplete) bucket as is
+    indices = np.sort(np.stack((i_min, i_max), axis=1), axis=1).ravel()
+    indices = np.concatenate((indices, np.arange(n_full, n)))
+    return indices, y[indices]
+
+
+class CountTraceFigure:
+    """
+    FigureWidget showing the rates of a list of Counters (one trace each)
+    """
+    def __init__(self, counters, labels, binwidth_SI, n_pixels=800, trace_width=2, headroom=1.2, refresh_period=0.05, **layout):
+        self.counters = counters
+        self.binwidth_SI = binwidth_SI
+        self.n_pixels = n_pixels
+        self.headroom = headroom
+        self.refresh_period = refresh_period
+
+        self._last_data = [None] * len(counters)
+        self._y_range = 0
+
+        self.fig = go.FigureWidget()
+        for counter, label in zip(counters, labels):
+            index, y = minmax_decimate(counter.getData()[0] / binwidth_SI, n_pixels)
+            self.fig.add_trace(go.Scattergl(x=counter.getIndex()[index], y=y, name=f"{label}", mode='lines', line=dict(width=trace_width)))
+        self.fig.update_layout(**layout)
+
+    def refresh(self):
+        """
+        sends the traces that changed since the last refresh
+        """
+        updates = []
+        y_max = 0
+        for i, counter in enumerate(self.counters):
+            data = counter.getData()[0]
+            y_max = max(y_max, data.max(initial=0) / self.binwidth_SI)
+
+            if self._last_data[i] is not None and np.array_equal(data, self._last_data[i]):
+                continue
+            self._last_data[i] = data
+            updates.append((i, minmax_decimate(data / self.binwidth_SI, self.n_pixels)))
+
+        # rescale only if the data leaves the range or uses less than half of it
+        rescale = y_max > self._y_range or y_max * self.headroom < self._y_range / 2
+        if not updates and not rescale:
+            return
+
+        index = None
+        with self.fig.batch_update():
+            for i, (decimated_index, y) in updates:
+                if index is None:
+                    index = self.counters[i].getIndex()
+                self.fig.data[i].x = index[decimated_index]
+                self.fig.data[i].y = y
+            if rescale:
+                self._y_range = max(y_max * self.headroom, 1)
+                self.fig.update_layout(yaxis=dict(range=[0, self._y_range]))
+
+    def close(self):
+        self.fig.close()
+
+
+class TraceRefreshLoop:
+    """
+    one asyncio task that refreshes all registered figures. It runs at the shortest refresh period of
+    its figures, each figure is only refreshed once its own period has passed.
+    Inside a running event loop (Jupyter) the task is started by add(), outside of one (scripts) run() refreshes
+    the figures until all of them are removed
+    """
+    def __init__(self):
+        self.figures = {}
+        self._task = None
+
+    def add(self, figure: CountTraceFigure):
+        self.figures[figure] = 0
+        if self._task is None or self._task.done():
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # no event loop, the figures are refreshed once run() is called
+                return
+            self._task = loop.create_task(self._run())
+
+    def run(self):
+        """
+        refreshes the figures until all of them are removed (blocking, for use outside of an event loop)
+        """
+        async def main():
+            # figures added meanwhile are refreshed by this task instead of starting another one
+            self._task = asyncio.current_task()
+            await self._run()
+
+        asyncio.run(main())
+
+    def remove(self, figure: CountTraceFigure):
+        self.figures.pop(figure, None)
+        if not self.figures and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self.figures:
+            try:
+                now = loop.time()
+                for figure, last_refresh in list(self.figures.items()):
+                    if now - last_refresh >= figure.refresh_period:
+                        self.figures[figure] = now
+                        try:
+                            figure.refresh()
+                        except Exception as e:
+                            print(f"Error while refreshing traces: {e}")
+                            self.figures.pop(figure, None)
+
+                await asyncio.sleep(min(figure.refresh_period for figure in self.figures) if self.figures else 0)
+
+            except asyncio.CancelledError: # gracefully handle cancellation
+                break
+
+
+# shared by all figures of the session
+refresh_loop = TraceRefreshLoop()
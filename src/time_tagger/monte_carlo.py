@@ -0,0 +1,121 @@
+"""
+Monte-Carlo simulation of complete CHSH runs with a finite number of pairs per setting
+(used by TT_Simulator.S_distribution and TT_Simulator.required_pairs_per_setting).
+
+The counts of all four settings of many runs are drawn in one batched multinomial draw. Larger numbers of runs
+are split into chunks, each with its own independent random stream (SeedSequence.spawn), which can be
+spread over worker processes
+"""
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy.stats import norm
+from .numeric_backend import CORRELATION_SIGNS
+
+
+def simulate_S(P, n_pairs, n_runs, rng=None):
+    """
+    S of n_runs simulated CHSH runs
+    P: outcome probabilities (4 settings x 4 outcomes), settings in the order (a0, b0), (a0, b1), (a1, b0), (a1, b1)
+    n_pairs: number of pairs per setting
+    """
+    rng = np.random.default_rng(rng)
+    N = rng.multinomial(n_pairs, P, size=(n_runs, 4))
+    E = N @ CORRELATION_SIGNS / n_pairs
+    return np.abs(E[:, 0] + E[:, 1] + E[:, 2] - E[:, 3])
+
+
+def _simulate_chunk(args):
+    P, n_pairs, n_runs, seed_sequence = args
+    return simulate_S(P, n_pairs, n_runs, np.random.default_rng(seed_sequence))
+
+
+class SDistribution:
+    """
+    empirical distribution of S over many simulated runs
+    """
+    def __init__(self, samples, n_pairs):
+        self.samples = samples
+        self.n_pairs = n_pairs
+
+    @property
+    def mean(self):
+        return float(np.mean(self.samples))
+
+    @property
+    def std(self):
+        return float(np.std(self.samples, ddof=1))
+
+    def confidence_interval(self, level=0.95):
+        """
+        central interval that contains a fraction level of the runs
+        """
+        return tuple(np.quantile(self.samples, [(1 - level) / 2, (1 + level) / 2]))
+
+    def fraction_above(self, threshold=2):
+        """
+        fraction of runs whose S is above threshold (e.g. the classical bound 2)
+        """
+        return float(np.mean(self.samples > threshold))
+
+    def __repr__(self):
+        low, high = self.confidence_interval()
+        return f"SDistribution(n_pairs={self.n_pairs}, S={self.mean:.4f} +- {self.std:.4f}, 95% CI=[{low:.4f}, {high:.4f}], runs={len(self.samples)})"
+
+
+def S_distribution(P, n_pairs, n_runs=10000, chunk_size=5000, n_workers=None, seed=None):
+    """
+    simulates n_runs CHSH runs, returns a SDistribution
+    n_workers: spread the chunks over this many processes (in this process if None or 1)
+    """
+    seed_sequences = np.random.SeedSequence(seed).spawn(int(np.ceil(n_runs / chunk_size)))
+    sizes = [min(chunk_size, n_runs - k * chunk_size) for k in range(len(seed_sequences))]
+    jobs = [(P, n_pairs, size, seed_sequence) for size, seed_sequence in zip(sizes, seed_sequences)]
+
+    if n_workers is not None and n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            samples = list(executor.map(_simulate_chunk, jobs))
+    else:
+        samples = [_simulate_chunk(job) for job in jobs]
+
+    return SDistribution(np.concatenate(samples), n_pairs)
+
+
+def S_uncertainty_per_pair(P):
+    """
+    standard error of S for a single pair per setting, the error for n pairs is this / sqrt(n)
+    """
+    E = P @ CORRELATION_SIGNS
+    return float(np.sqrt(np.sum(1 - E**2)))
+
+
+def required_pairs_per_setting(P, threshold=2, confidence=0.99, n_runs=10000, seed=None, n_workers=None):
+    """
+    smallest number of pairs per setting for which a run gives S > threshold with probability confidence
+    Starts from the gaussian estimate and checks (and corrects) it with Monte-Carlo runs
+    Returns (pairs per setting, SDistribution at that number of pairs)
+    """
+    E = P @ CORRELATION_SIGNS
+    S = abs(E[0] + E[1] + E[2] - E[3])
+    if S <= threshold:
+        raise ValueError(f"Error: The expected S ({S:.4f}) is not above the threshold ({threshold})")
+
+    # gaussian estimate: S - z * sigma / sqrt(n) = threshold
+    z = norm.ppf(confidence)
+    estimate = max(int(np.ceil((z * S_uncertainty_per_pair(P) / (S - threshold))**2)), 1)
+
+    passes = lambda n: S_distribution(P, n, n_runs, n_workers=n_workers, seed=seed).fraction_above(threshold) >= confidence
+
+    # bracket the answer around the estimate, then bisect
+    low, high = max(estimate // 2, 1), estimate
+    while not passes(high):
+        low, high = high, high * 2
+    while low > 1 and passes(low):
+        low, high = max(low // 2, 1), low
+    while high - low > max(1, high // 100):
+        middle = (low + high) // 2
+        if passes(middle):
+            high = middle
+        else:
+            low = middle
+
+    return high, S_distribution(P, high, n_runs, n_workers=n_workers, seed=seed)
@@ -0,0 +1,138 @@
+"""
+Pure NumPy engine for the calculations done symbolically in experiment_simulator.
+States and half wave plate operators are complex arrays, correlations and outcome probabilities
+are evaluated with einsum over whole batches of angles at once
+"""
+import numpy as np
+
+# the two particle basis is ordered |HH>, |HV>, |VH>, |VV>, so the projectors onto the
+# four coincidence outcomes are simply the diagonal entries of the density matrix
+CORRELATION_SIGNS = np.array([1, -1, -1, 1])
+
+
+def state_to_numpy(state):
+    """
+    converts a (sympy) state vector such as the ones in states.two_particle_states to a flat complex array
+    """
+    return np.array(state, dtype=complex).reshape(-1)
+
+
+def density_from_vector(state_vector):
+    """
+    returns the density matrix corresponding to a specified state vector
+    """
+    state_vector = state_to_numpy(state_vector)
+    return np.outer(state_vector, state_vector.conj())
+
+
+def density_from_state(state):
+    """
+    returns the density matrix of a state that is given either as a state vector or already as a (4 x 4) density matrix
+    """
+    state = np.array(state, dtype=complex)
+    if is_density_matrix(state):
+        return state / np.trace(state)
+    return density_from_vector(state)
+
+
+def is_density_matrix(state):
+    state = np.shape(state)
+    return len(state) == 2 and state[0] == state[1] and state[0] > 1
+
+
+def depolarize(rho, noise_q):
+    """
+    applies depolarizing noise (1-noise)*rho + noise * I/4, where noise from 0 to 1 and renormalises
+    """
+    rho = (1 - noise_q) * rho + noise_q / 4 * np.eye(4)
+    return rho / np.trace(rho)
+
+
+def reduce_visibility(rho, visibility):
+    """
+    scales the off-diagonal entries (coherences) of rho by the visibility (1: unchanged, 0: classical mixture of HH, HV, VH, VV)
+    """
+    rho = np.array(rho, dtype=complex)
+    return visibility * rho + (1 - visibility) * np.diag(np.diag(rho))
+
+
+def half_wave_plate(theta):
+    """
+    returns the HWP operator(s) for (an array of) polarization angles theta, shape (..., 2, 2)
+    same convention as half_wave_plate_sympy
+    """
+    theta = np.asarray(theta, dtype=float)
+    c = np.cos(theta)
+    s = np.sin(theta)
+    return np.stack([np.stack([c, s], axis=-1), np.stack([s, -c], axis=-1)], axis=-2)
+
+
+def two_hwp_operator(theta_a, theta_b):
+    """
+    returns the operator of the two HWPs (Alice x Bob) for batches of angles, shape (..., 4, 4)
+    """
+    Ua = half_wave_plate(theta_a)
+    Ub = half_wave_plate(theta_b)
+    U = np.einsum('...ij,...kl->...ikjl', Ua, Ub)
+    return U.reshape(U.shape[:-4] + (4, 4))
+
+
+def outcome_distribution(rho, theta_a, theta_b):
+    """
+    returns the (unweighted) probabilities of the four coincidences HH, HV, VH, VV for batches of angles,
+    shape (..., 4). These are the diagonal entries of U rho U^dagger
+    """
+    theta_a, theta_b = np.broadcast_arrays(np.asarray(theta_a, dtype=float), np.asarray(theta_b, dtype=float))
+    U = two_hwp_operator(theta_a, theta_b)
+    return np.einsum('...km,mn,...kn->...k', U, rho, U.conj()).real
+
+
+def outcome_probabilities(rho, theta_a, theta_b, detector_efficiencies=None):
+    """
+    returns the probability of measuring each coincidence pair (HH, HV, VH, VV) for batches of angles, shape (..., 4)
+    the detector efficiencies are applied the same (crude) way as in TT_Simulator.calc_outcome_probabilities
+    """
+    P = outcome_distribution(rho, theta_a, theta_b)
+    if detector_efficiencies is not None:
+        P = P * np.asarray(detector_efficiencies, dtype=float)
+
+    # remove tiny negative values from numerical noise and normalise
+    P = np.clip(P, 0, None)
+    return P / P.sum(axis=-1, keepdims=True)
+
+
+def correlation(rho, theta_a, theta_b):
+    """
+    returns the correlation function P_HH - P_HV - P_VH + P_VV for batches of angles
+    """
+    return outcome_distribution(rho, theta_a, theta_b) @ CORRELATION_SIGNS
+
+
+def outcome_distributions(rhos, theta_a, theta_b):
+    """
+    outcome_distribution() for many states at once
+    rhos: (states, 4, 4) density matrices, theta_a/theta_b: batches of angles
+    Returns the unweighted probabilities of HH, HV, VH, VV, shape (states, ..., 4)
+    """
+    theta_a, theta_b = np.broadcast_arrays(np.asarray(theta_a, dtype=float), np.asarray(theta_b, dtype=float))
+    U = two_hwp_operator(theta_a, theta_b)
+    return np.einsum('...km,smn,...kn->s...k', U, np.asarray(rhos, dtype=complex), U.conj()).real
+
+
+def outcome_probabilities_batch(rhos, theta_a, theta_b, detector_efficiencies=None):
+    """
+    outcome_probabilities() for many states at once, shape (states, ..., 4)
+    """
+    P = outcome_distributions(rhos, theta_a, theta_b)
+    if detector_efficiencies is not None:
+        P = P * np.asarray(detector_efficiencies, dtype=float)
+
+    P = np.clip(P, 0, None)
+    return P / P.sum(axis=-1, keepdims=True)
+
+
+def correlations(rhos, theta_a, theta_b):
+    """
+    correlation() for many states at once, shape (states, ...)
+    """
+    return outcome_distributions(rhos, theta_a, theta_b) @ CORRELATION_SIGNS
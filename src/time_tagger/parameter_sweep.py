@@ -0,0 +1,143 @@
+"""
+Sweeps of the simulator parameters (depolarizing noise q, visibility and detector efficiencies) over whole grids
+(used by TT_Simulator.sweep_parameters).
+
+Every grid point is evaluated numerically (no TT_Simulator and no sympy is built for it): the optimal S and CHSH angles,
+the S that is measured at those angles with the detector efficiencies, a correlation curve and the outcome
+probabilities of the four CHSH settings. Points are spread over worker processes and memoized on disk (in the per-user
+cache directory or cache_dir, see disk_cache), so points that were evaluated before (in any earlier sweep or session) are only read back.
+The cache key contains the source code of the modules the points are calculated with, so changing the code invalidates it
+"""
+import sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from . import numeric_backend
+from . import chsh_optimizer
+from .disk_cache import DiskCache, hash_key, source_version
+
+# increase when the evaluation of a point changes, so old cache entries are not used anymore
+CACHE_VERSION = 'sweep-1'
+
+# bob's filter angles (in degrees) of the correlation curves, alice's filter is at 0
+DEFAULT_CURVE_ANGLES = np.linspace(0, 90, 91)
+
+_cache = DiskCache('parameter_sweep')
+_source_version = source_version(sys.modules[__name__], numeric_backend, chsh_optimizer)
+
+
+def clear_cache(cache_dir=None):
+    """
+    removes all memoized points (of the default cache directory, or of cache_dir)
+    """
+    _cache_in(cache_dir).clear()
+
+
+def _cache_in(cache_dir):
+    return _cache if cache_dir is None else DiskCache('parameter_sweep', directory=cache_dir)
+
+
+def evaluate_point(args):
+    """
+    evaluates a single grid point
+    args: (density matrix of the state without noise, noise_q, noise_vis, detector efficiencies, curve angles in degrees)
+    Returns a json serializable dict
+    """
+    rho, noise_q, noise_vis, detector_efficiencies, curve_angles = args
+    rho = numeric_backend.reduce_visibility(numeric_backend.depolarize(rho, noise_q), noise_vis)
+
+    # the sweep memoizes the whole point, caching the angles separately as well would only fill the disk
+    S, angles = chsh_optimizer.find_CHSH_angles(rho, use_cache=False)
+
+    # settings (a0, b0), (a0, b1), (a1, b0), (a1, b1)
+    a0, a1, b0, b1 = angles
+    P = numeric_backend.outcome_probabilities(rho, np.array([a0, a0, a1, a1]), np.array([b0, b1, b0, b1]), detector_efficiencies)
+    E = P @ numeric_backend.CORRELATION_SIGNS
+    measured_S = abs(E[0] + E[1] + E[2] - E[3])
+
+    curve = numeric_backend.correlation(rho, 0, np.asarray(curve_angles) * np.pi / 90)
+
+    return {'S': float(S),
+            'measured_S': float(measured_S),
+            'CHSH_angles_for_filters': (angles * 90 / np.pi).tolist(),
+            'correlation_curve': curve.tolist(),
+            'outcome_probabilities': P.tolist()}
+
+
+class SweepResult:
+    """
+    results of a sweep, every array has the grid shape (noise_q, noise_vis, detector_efficiencies) as its first three axes:
+    S: optimal |S| (independent of the detector efficiencies, as in TT_Simulator.S)
+    measured_S: |S| from the outcome probabilities at the CHSH angles, including the detector efficiencies
+    CHSH_angles_for_filters: (..., 4) filter angles [a0, a1, b0, b1] in degrees
+    correlation_curves: (..., len(curve_angles)) correlation with alice at 0 and bob at curve_angles (filter degrees)
+    outcome_probabilities: (..., 4, 4) outcome probabilities [HH, HV, VH, VV] of the settings (a0, b0), (a0, b1), (a1, b0), (a1, b1)
+    """
+    def __init__(self, noise_q, noise_vis, detector_efficiencies, curve_angles, points):
+        self.noise_q = noise_q
+        self.noise_vis = noise_vis
+        self.detector_efficiencies = detector_efficiencies
+        self.curve_angles = curve_angles
+
+        shape = (len(noise_q), len(noise_vis), len(detector_efficiencies))
+        for name in ['S', 'measured_S', 'CHSH_angles_for_filters', 'correlation_curves', 'outcome_probabilities']:
+            key = 'correlation_curve' if name == 'correlation_curves' else name
+            values = np.array([point[key] for point in points])
+            setattr(self, name, values.reshape(shape + values.shape[1:]))
+
+    @property
+    def shape(self):
+        return self.S.shape
+
+    def point(self, i_q, i_vis, i_efficiencies=0):
+        """
+        all results of one grid point as a dict
+        """
+        return {'noise_q': self.noise_q[i_q],
+                'noise_vis': self.noise_vis[i_vis],
+                'detector_efficiencies': self.detector_efficiencies[i_efficiencies],
+                'S': self.S[i_q, i_vis, i_efficiencies],
+                'measured_S': self.measured_S[i_q, i_vis, i_efficiencies],
+                'CHSH_angles_for_filters': self.CHSH_angles_for_filters[i_q, i_vis, i_efficiencies],
+                'correlation_curve': self.correlation_curves[i_q, i_vis, i_efficiencies],
+                'outcome_probabilities': self.outcome_probabilities[i_q, i_vis, i_efficiencies]}
+
+
+def sweep(initial_state, noise_q=(0,), noise_vis=(1,), detector_efficiencies=([1, 1, 1, 1],), curve_angles=DEFAULT_CURVE_ANGLES, n_workers=None, use_cache=True, cache_dir=None, debug=False):
+    """
+    evaluates all combinations of the parameter grids
+    initial_state: state vector (e.g. from states.two_particle_states) or 4 x 4 density matrix
+    noise_q, noise_vis: grids of the depolarizing noise and the visibility
+    detector_efficiencies: grid of efficiency lists [HH, HV, VH, VV] (same format as TT_Simulator)
+    n_workers: evaluate the points that are not cached in this many processes (in this process if None or 1)
+    use_cache: read and write the cache (False evaluates every point again and does not store it, see also clear_cache)
+    cache_dir: directory of the cache (disk_cache.default_directory() if None, disk_cache.MEMORY_ONLY to not persist the points)
+    Returns a SweepResult
+    """
+    rho = numeric_backend.density_from_state(initial_state)
+    noise_q = [float(q) for q in noise_q]
+    noise_vis = [float(vis) for vis in noise_vis]
+    detector_efficiencies = [[float(e) for e in efficiencies] for efficiencies in detector_efficiencies]
+    curve_angles = np.asarray(curve_angles, dtype=float)
+
+    jobs = [(rho, q, vis, efficiencies, curve_angles) for q, vis, efficiencies in product(noise_q, noise_vis, detector_efficiencies)]
+    keys = [hash_key(CACHE_VERSION, _source_version, rho, np.array([q, vis]), np.array(efficiencies), curve_angles) for _, q, vis, efficiencies, _ in jobs]
+
+    cache = _cache_in(cache_dir)
+    points = [cache.get(key) if use_cache else None for key in keys]
+    missing = [k for k, point in enumerate(points) if point is None]
+    if debug:
+        print(f"{len(jobs)} points, {len(jobs) - len(missing)} cached, evaluating {len(missing)}")
+
+    if n_workers is not None and n_workers > 1 and len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(evaluate_point, [jobs[k] for k in missing], chunksize=max(1, len(missing) // (4 * n_workers))))
+    else:
+        results = [evaluate_point(jobs[k]) for k in missing]
+
+    for k, result in zip(missing, results):
+        points[k] = result
+        if use_cache:
+            cache.set(keys[k], result)
+
+    return SweepResult(noise_q, noise_vis, detector_efficiencies, curve_angles, points)
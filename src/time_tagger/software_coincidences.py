@@ -0,0 +1,124 @@
+"""
+Coincidence counting in software from raw (timestamp, channel) tags, e.g. from a recording or a TimeTagStream.
+Unlike the Coincidences virtual channels of the tagger, many coincidence windows and delay offsets are
+evaluated on the same tags in one pass, so a window sweep does not need a new measurement.
+
+For every tag of the first channel of a group the nearest tag of the second channel (shifted by the offset)
+is found with searchsorted. A coincidence is counted if that nearest tag is at most window away, so each
+tag of the first channel takes part in at most one coincidence per group.
+The tags are processed in chunks, only the last few ns of a chunk are carried over to the next one
+"""
+import numpy as np
+
+
+class CoincidenceCounter:
+
+    def __init__(self, groups, windows_SI, offsets_SI=(0,)):
+        """
+        groups: list of (channel_a, channel_b) pairs, e.g. [TT, TR, RT, RR]
+        windows_SI: coincidence windows (in s)
+        offsets_SI: delays (in s) added to the tags of channel_b of every group before counting
+        """
+        self.groups = [tuple(group) for group in groups]
+        self.windows = np.round(np.atleast_1d(np.asarray(windows_SI, dtype=float)) * 1e12).astype(np.int64)
+        self.offsets = np.round(np.atleast_1d(np.asarray(offsets_SI, dtype=float)) * 1e12).astype(np.int64)
+
+        # tags closer than this to the end of a chunk could still have a partner in the next chunk
+        self.margin = int(self.windows.max() + np.abs(self.offsets).max())
+
+        self.reset()
+
+    def reset(self):
+        # counts[group, offset, window]
+        self.counts = np.zeros((len(self.groups), len(self.offsets), len(self.windows)), dtype=np.int64)
+        self._timestamps = np.zeros(0, dtype=np.int64)
+        self._channels = np.zeros(0, dtype=np.int32)
+
+        # tags of channel_a up to this time have been counted already (None: nothing counted yet)
+        self._counted_until = None
+
+    def add(self, timestamps, channels):
+        """
+        adds the next chunk of tags (timestamps in ps, sorted in time and later than all previous chunks)
+        """
+        timestamps = np.concatenate((self._timestamps, np.asarray(timestamps, dtype=np.int64)))
+        channels = np.concatenate((self._channels, np.asarray(channels, dtype=np.int32)))
+        if timestamps.size == 0:
+            return
+
+        # all partners of tags up to the horizon are in this chunk already
+        horizon = int(timestamps[-1]) - self.margin
+        if self._counted_until is None or horizon > self._counted_until:
+            self._count(timestamps, channels, self._counted_until, horizon)
+            self._counted_until = horizon
+
+        keep = timestamps > self._counted_until - self.margin
+        self._timestamps = timestamps[keep]
+        self._channels = channels[keep]
+
+    def finish(self):
+        """
+        counts the tags still held back from the last chunk and returns the counts (group, offset, window)
+        """
+        if self._timestamps.size > 0:
+            self._count(self._timestamps, self._channels, self._counted_until, None)
+            self._counted_until = int(self._timestamps[-1])
+        self._timestamps = self._timestamps[:0]
+        self._channels = self._channels[:0]
+        return self.counts
+
+    def _count(self, timestamps, channels, start, stop):
+        """
+        counts the coincidences of all tags of channel_a in (start, stop], None means unbounded
+        """
+        for g, (channel_a, channel_b) in enumerate(self.groups):
+            t_a = timestamps[channels == channel_a]
+            if start is not None:
+                t_a = t_a[t_a > start]
+            if stop is not None:
+                t_a = t_a[t_a <= stop]
+            t_b = timestamps[channels == channel_b]
+            if t_a.size == 0 or t_b.size == 0:
+                continue
+
+            distances = nearest_distances(t_a, t_b, self.offsets)
+
+            # number of distances below each window = coincidences for every (offset, window)
+            distances.sort(axis=0)
+            for o in range(len(self.offsets)):
+                self.counts[g, o] += np.searchsorted(distances[:, o], self.windows, side='right')
+
+
+def nearest_distances(t_a, t_b, offsets):
+    """
+    distance of every tag in t_a to the nearest tag in t_b + offset, for every offset. Shape (len(t_a), len(offsets))
+    t_a and t_b have to be sorted
+    """
+    targets = t_a[:, None] - offsets[None, :]
+    right = np.searchsorted(t_b, targets)
+
+    # candidates are the tags right before and right after the target
+    after = np.abs(t_b[np.minimum(right, len(t_b) - 1)] - targets)
+    before = np.abs(targets - t_b[np.maximum(right - 1, 0)])
+    return np.minimum(after, before)
+
+
+def count_coincidences(timestamps, channels, groups, windows_SI, offsets_SI=(0,), chunk_size=2**22):
+    """
+    counts the coincidences of all groups for all windows and offsets, returns counts with shape (group, offset, window)
+    timestamps, channels: arrays of the tags (may be np.memmap, only chunk_size tags are loaded at a time)
+    """
+    counter = CoincidenceCounter(groups, windows_SI, offsets_SI)
+    for start in range(0, len(timestamps), chunk_size):
+        counter.add(timestamps[start:start + chunk_size], channels[start:start + chunk_size])
+    return counter.finish()
+
+
+def count_coincidences_chunks(chunks, groups, windows_SI, offsets_SI=(0,)):
+    """
+    same as count_coincidences for an iterable of (timestamps, channels) chunks
+    """
+    counter = CoincidenceCounter(groups, windows_SI, offsets_SI)
+    for timestamps, channels in chunks:
+        counter.add(timestamps, channels)
+    return counter.finish()
@@ -1,7 +1,11 @@
 """ This file serves as a database of 2 particle quantum states to be used in simulating the experiment """
 
+import os
+import numpy as np
 import sympy as sp
 from sympy.physics.quantum import TensorProduct 
+from . import numeric_backend
+from . import tomography
 
 H = sp.Matrix([1, 0])
 V = sp.Matrix([0, 1])
@@ -11,4 +15,49 @@ two_particle_states = {
 'phi_minus' : (TensorProduct(H, H) - TensorProduct(V, V)) / sp.sqrt(2),
 'psi_plus' :(TensorProduct(H, V) + TensorProduct(V, H)) / sp.sqrt(2),
 'psi_minus' : (TensorProduct(H, V) - TensorProduct(V, H)) / sp.sqrt(2),
-}
\ No newline at end of file
+}
+
+# numeric state library, all functions return 4 x 4 numpy density matrices (basis HH, HV, VH, VV)
+# that can be used directly as initial state of a TT_Simulator or stacked for the batched functions in numeric_backend
+
+def bell_state(name='phi_plus'):
+    """
+    density matrix of one of the two_particle_states
+    """
+    return numeric_backend.density_from_vector(two_particle_states[name])
+
+
+def werner_state(p, name='psi_minus'):
+    """
+    Werner state p * |bell><bell| + (1 - p) * I/4 (p can also be an array, then the result has shape (len(p), 4, 4))
+    p: weight of the bell state, CHSH is violated for p > 1/sqrt(2)
+    """
+    p = np.asarray(p, dtype=float)[..., None, None]
+    return p * bell_state(name) + (1 - p) * np.eye(4) / 4
+
+
+def density_matrix(rho, tolerance=1e-9):
+    """
+    checks an arbitrary 4 x 4 density matrix (hermitian, positive semidefinite) and normalises its trace
+    """
+    rho = np.array(rho, dtype=complex)
+    if rho.shape != (4, 4):
+        raise ValueError(f"Error: A two photon density matrix has shape (4, 4), not {rho.shape}")
+    if np.abs(rho - rho.conj().T).max() > tolerance:
+        raise ValueError("Error: The density matrix is not hermitian")
+    if np.linalg.eigvalsh(rho).min() < -tolerance * abs(np.trace(rho)):
+        raise ValueError("Error: The density matrix is not positive semidefinite")
+    return rho / np.trace(rho).real
+
+
+def from_tomography(source):
+    """
+    density matrix from a state tomography
+    source: path of a tomography saved with tomography.save(), or the (rho, results) returned by
+            TimeTaggerController.measureStateTomography
+    """
+    if isinstance(source, (str, os.PathLike)):
+        rho = tomography.load(source)[0]
+    else:
+        rho = source[0]
+    return density_matrix(rho)
@@ -0,0 +1,158 @@
+"""
+Long-lived acquisition of the coincidence time tag stream.
+A single TimeTagStream is opened at session start and drained continuously by a background
+thread into a fixed size ring buffer of (timestamp, channel) pairs, so per-beat measurements
+only have to look into the buffer instead of creating (and tearing down) a stream every time
+"""
+import threading
+import numpy as np
+
+
+class StreamAcquisitionEngine:
+
+    def __init__(self, stream, buffer_size=2**16, poll_interval=0.001, tagger=None):
+        """
+        stream: an already created (and running) TimeTagStream, the engine takes ownership of it
+        buffer_size: number of (timestamp, channel) pairs kept in the ring buffer
+        poll_interval: time in s between two reads of the stream
+        tagger: the tagger of the stream, sync() synchronizes it (tagger.sync()) so all tags up to now reached the stream
+        """
+        self.stream = stream
+        self.tagger = tagger
+        self.buffer_size = int(buffer_size)
+        self.poll_interval = poll_interval
+
+        # preallocated ring buffer, entry i lives at index i % buffer_size
+        self.timestamps = np.zeros(self.buffer_size, dtype=np.int64)
+        self.channels = np.zeros(self.buffer_size, dtype=np.int32)
+
+        # total number of events ever written. Writes happen under the lock and it is only
+        # increased after the data has been copied, so readers never see half written entries
+        self.n_written = 0
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # sync() requests a drain from the background thread and waits until a drain that started after the
+        # request is completed (drains are counted)
+        self._drain_condition = threading.Condition()
+        self._drains_requested = 0
+        self._drains_completed = 0
+
+    def start(self):
+        if self.is_running():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._drain_condition:
+            self._drain_condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.stream.stop()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _drain(self):
+        while not self._stop_event.is_set():
+            # drain every poll_interval, or right away when sync() asks for it
+            with self._drain_condition:
+                self._drain_condition.wait_for(lambda: self._drains_requested > self._drains_completed or self._stop_event.is_set(),
+                                               timeout=self.poll_interval)
+                request = self._drains_requested
+
+            try:
+                self._read_stream()
+            except Exception as e:
+                print(f"Error during stream acquisition: {e}")
+
+            with self._drain_condition:
+                self._drains_completed = request
+                self._drain_condition.notify_all()
+
+    def _read_stream(self):
+        with self._lock:
+            data = self.stream.getData()
+            if data.size > 0:
+                self._write(data.getTimestamps(), data.getChannels())
+
+    def sync(self, timeout=1):
+        """
+        makes sure everything the tagger has seen so far is in the ring buffer: the tagger is synchronized and the
+        background thread drains the stream right away, while the caller waits (so a busy-waiting main thread cannot
+        starve it, and the caller never reads the stream itself, every getData() allocates new arrays).
+        Without the background thread (not started or stopped) the stream is read directly
+        timeout: maximal time in s to wait for the background thread
+        """
+        if self.tagger is not None:
+            self.tagger.sync()
+
+        if not self.is_running():
+            self._read_stream()
+            return
+
+        with self._drain_condition:
+            self._drains_requested += 1
+            request = self._drains_requested
+            self._drain_condition.notify_all()
+            self._drain_condition.wait_for(lambda: self._drains_completed >= request or self._stop_event.is_set(), timeout)
+
+    def _write(self, timestamps, channels):
+        n = len(timestamps)
+
+        # if more events arrived than fit into the buffer, only keep the newest ones
+        if n > self.buffer_size:
+            timestamps = timestamps[-self.buffer_size:]
+            channels = channels[-self.buffer_size:]
+
+        start = (self.n_written + n - len(timestamps)) % self.buffer_size
+        first = min(len(timestamps), self.buffer_size - start)
+
+        self.timestamps[start:start + first] = timestamps[:first]
+        self.channels[start:start + first] = channels[:first]
+
+        # wrap around to the beginning of the buffer
+        rest = len(timestamps) - first
+        if rest > 0:
+            self.timestamps[:rest] = timestamps[first:]
+            self.channels[:rest] = channels[first:]
+
+        self.n_written += n
+
+    # READOUT FUNCTIONS (do not allocate, so they can be used in the per-beat hot path)
+
+    def mark(self) -> int:
+        """
+        returns the current write position, events arriving after this call have a larger position
+        """
+        return self.n_written
+
+    def count_since(self, mark) -> int:
+        """
+        number of events that arrived since mark
+        """
+        return self.n_written - mark
+
+    def latest_channel(self, since=0) -> int:
+        """
+        returns the channel of the most recent event, or -1 if no event arrived since the given mark
+        """
+        n = self.n_written
+        if n <= since:
+            return -1
+        return int(self.channels[(n - 1) % self.buffer_size])
+
+    def latest_timestamp(self, since=0) -> int:
+        """
+        returns the timestamp (ps) of the most recent event, or -1 if no event arrived since the given mark
+        """
+        n = self.n_written
+        if n <= since:
+            return -1
+        return int(self.timestamps[(n - 1) % self.buffer_size])
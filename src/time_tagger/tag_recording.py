@@ -0,0 +1,221 @@
+"""
+Recording of raw time tags to disk and replaying them through the TimeTagger API.
+
+File format (little endian):
+    header: MAGIC, uint32 length of the metadata, metadata (json: channels, input delays, ...)
+    chunks: timestamp differences (uint16, uint32 or uint64, whichever is the smallest that fits), channels (int16)
+    index:  one INDEX_DTYPE record per chunk (file offset, number of tags, first and last timestamp, bytes per difference)
+    footer: uint64 offset of the index, uint64 number of chunks, MAGIC
+
+The first timestamp of every chunk is stored in the index, so every chunk can be decoded on its own
+and the tags of any time interval are found without reading the rest of the file.
+Playback memory-maps the file, so recordings larger than RAM can be replayed.
+
+usage:
+    TTC.recordTags('run.tags', duration_SI=60)
+    replay = ReplayTimeTagger(TagRecording('run.tags'))
+    TTC = TimeTaggerController(tagger=replay)
+"""
+import json
+import numpy as np
+from .virtual_tagger import VirtualTimeTagger
+
+MAGIC = b'BRQTAGS1'
+
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('n_tags', '<u8'), ('first', '<i8'), ('last', '<i8'), ('delta_size', '<u8')])
+
+_DELTA_DTYPES = {2: np.dtype('<u2'), 4: np.dtype('<u4'), 8: np.dtype('<u8')}
+_CHANNEL_DTYPE = np.dtype('<i2')
+
+
+class TagRecorder:
+
+    def __init__(self, path, channels, chunk_size=2**16, metadata=None):
+        """
+        path: file to write to (is overwritten)
+        channels: channels that are recorded (stored in the metadata)
+        chunk_size: number of tags per chunk
+        metadata: additional json serializable information to store, e.g. input delays
+        """
+        self.path = path
+        self.chunk_size = int(chunk_size)
+        self.n_tags = 0
+
+        self._file = open(path, 'wb')
+        self._index = []
+        self._pending_ts = []
+        self._pending_ch = []
+        self._n_pending = 0
+        self._last_timestamp = None
+
+        metadata = dict(metadata or {})
+        metadata['channels'] = [int(ch) for ch in channels]
+        metadata_bytes = json.dumps(metadata).encode()
+        self._file.write(MAGIC)
+        self._file.write(np.uint32(len(metadata_bytes)).tobytes())
+        self._file.write(metadata_bytes)
+
+    def write(self, timestamps, channels):
+        """
+        adds tags (timestamps in ps, sorted in time and not earlier than the previous ones)
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if timestamps.size == 0:
+            return
+        if self._last_timestamp is not None and timestamps[0] < self._last_timestamp:
+            raise ValueError("Error: Tags have to be written in chronological order")
+        self._last_timestamp = timestamps[-1]
+
+        self._pending_ts.append(timestamps)
+        self._pending_ch.append(np.asarray(channels, dtype=_CHANNEL_DTYPE))
+        self._n_pending += timestamps.size
+        if self._n_pending >= self.chunk_size:
+            self._flush(final=False)
+
+    def _flush(self, final):
+        if self._n_pending == 0:
+            return
+        ts = np.concatenate(self._pending_ts)
+        ch = np.concatenate(self._pending_ch)
+
+        # only full chunks, the rest waits for more tags (unless closing)
+        n_full = ts.size if final else ts.size // self.chunk_size * self.chunk_size
+        for start in range(0, n_full, self.chunk_size):
+            self._write_chunk(ts[start:start + self.chunk_size], ch[start:start + self.chunk_size])
+
+        self._pending_ts = [ts[n_full:]]
+        self._pending_ch = [ch[n_full:]]
+        self._n_pending = ts.size - n_full
+
+    def _write_chunk(self, ts, ch):
+        deltas = np.diff(ts, prepend=ts[0]).astype(np.uint64)
+        max_delta = int(deltas.max())
+        delta_size = next(size for size, dtype in _DELTA_DTYPES.items() if max_delta <= np.iinfo(dtype).max)
+
+        self._index.append((self._file.tell(), ts.size, ts[0], ts[-1], delta_size))
+        self._file.write(deltas.astype(_DELTA_DTYPES[delta_size]).tobytes())
+        self._file.write(ch.astype(_CHANNEL_DTYPE).tobytes())
+        self.n_tags += ts.size
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._flush(final=True)
+
+        index_offset = self._file.tell()
+        self._file.write(np.array(self._index, dtype=INDEX_DTYPE).tobytes())
+        self._file.write(np.array([index_offset, len(self._index)], dtype='<u8').tobytes())
+        self._file.write(MAGIC)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TagRecording:
+    """
+    read access to a file written by TagRecorder (memory-mapped)
+    """
+    def __init__(self, path):
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode='r')
+
+        footer = self._data[-(16 + len(MAGIC)):]
+        if self._data[:len(MAGIC)].tobytes() != MAGIC or footer[16:].tobytes() != MAGIC:
+            raise ValueError(f"Error: {path} is not a (complete) tag recording")
+        index_offset, n_chunks = np.frombuffer(footer[:16].tobytes(), dtype='<u8')
+        self.index = np.frombuffer(self._data, dtype=INDEX_DTYPE, count=int(n_chunks), offset=int(index_offset))
+
+        metadata_length = int(np.frombuffer(self._data, dtype='<u4', count=1, offset=len(MAGIC))[0])
+        metadata_start = len(MAGIC) + 4
+        self.metadata = json.loads(self._data[metadata_start:metadata_start + metadata_length].tobytes())
+        self.channels = self.metadata['channels']
+
+    @property
+    def n_tags(self):
+        return int(self.index['n_tags'].sum())
+
+    @property
+    def start_time(self):
+        """
+        timestamp of the first tag in ps (None if empty)
+        """
+        return int(self.index['first'][0]) if len(self.index) else None
+
+    @property
+    def stop_time(self):
+        """
+        timestamp of the last tag in ps (None if empty)
+        """
+        return int(self.index['last'][-1]) if len(self.index) else None
+
+    @property
+    def duration_SI(self):
+        return (self.stop_time - self.start_time) * 1e-12 if len(self.index) else 0
+
+    def read_chunk(self, i):
+        """
+        returns (timestamps, channels) of chunk i
+        """
+        offset, n_tags, first, _, delta_size = self.index[i]
+        offset, n_tags, delta_size = int(offset), int(n_tags), int(delta_size)
+        deltas = np.frombuffer(self._data, dtype=_DELTA_DTYPES[delta_size], count=n_tags, offset=offset)
+        channels = np.frombuffer(self._data, dtype=_CHANNEL_DTYPE, count=n_tags, offset=offset + n_tags * delta_size)
+
+        timestamps = np.cumsum(deltas, dtype=np.int64)
+        timestamps += first
+        return timestamps, channels.astype(np.int32)
+
+    def chunks(self):
+        """
+        iterates over all chunks as (timestamps, channels), e.g. for software_coincidences.count_coincidences_chunks
+        """
+        for i in range(len(self.index)):
+            yield self.read_chunk(i)
+
+    def read(self, t0, t1):
+        """
+        returns (timestamps, channels) of all tags with t0 <= timestamp < t1 (ps)
+        """
+        first = np.searchsorted(self.index['last'], t0, side='left')
+        last = np.searchsorted(self.index['first'], t1, side='left')
+
+        timestamps = [np.zeros(0, dtype=np.int64)]
+        channels = [np.zeros(0, dtype=np.int32)]
+        for i in range(first, last):
+            ts, ch = self.read_chunk(i)
+            mask = (ts >= t0) & (ts < t1)
+            timestamps.append(ts[mask])
+            channels.append(ch[mask])
+        return np.concatenate(timestamps), np.concatenate(channels)
+
+
+class ReplayTimeTagger(VirtualTimeTagger):
+    """
+    replays a TagRecording through the same interface as the VirtualTimeTagger (Counter, Coincidences, TimeTagStream, ...)
+    The start of the recording is at time 0 of the tagger, after its end no more tags arrive.
+    Input delays set on the replay tagger are applied on top of the recorded tags
+    realtime: if True the tags arrive at the speed they were recorded, otherwise as fast as the measurements wait for them
+    """
+    def __init__(self, recording: TagRecording, realtime=True, max_chunk_duration_SI=0.05):
+        self.recording = recording
+        n_channels = len(recording.channels)
+        super().__init__(channels=recording.channels, detector_efficiencies=[1] * n_channels, physical_delays=[0] * n_channels,
+                         jitter_SI=0, dark_count_rate=0, dead_time_SI=0,
+                         realtime=realtime, max_chunk_duration_SI=max_chunk_duration_SI)
+        self._offset = recording.start_time if recording.start_time is not None else 0
+
+    def set_filter_angles(self, alice_angle, bob_angle):
+        # the filter angles are part of the recording
+        pass
+
+    def _generate(self, t0, t1):
+        ts, ch = self.recording.read(t0 + self._offset, t1 + self._offset)
+        ts = ts - self._offset
+        for c in self.channels:
+            if self.input_delays[c] != 0:
+                ts[ch == c] += self.input_delays[c]
+        return ts, ch
@@ -1,24 +1,50 @@
-import TimeTagger
 import numpy as np
 import asyncio
-import plotly.graph_objs as go
 import time
 from ipywidgets import Button, Output
 from time import sleep
 from src.kinetic_mount_controller import KineticMountControl
+from src.kinetic_mount_controller.setting_planner import SettingPlanner
+from src.kinetic_mount_controller.beat_clock import BeatClock, sleep_until
 from src.time_tagger import TT_Simulator
+from src.time_tagger.stream_engine import StreamAcquisitionEngine
+from src.time_tagger.coincidence_manager import CoincidenceChannelManager
+from src.time_tagger.beat_timing import BeatTimingRecorder
+from src.time_tagger import delay_calibration
+from src.time_tagger import software_coincidences
+from src.time_tagger import tag_recording
+from src.time_tagger import live_traces
+from src.time_tagger import tomography
+from src.time_tagger.states import two_particle_states
+from src.time_tagger.chsh_measurement import SettingScheduler, CHSHResult, integrate_adaptively
 from threading import Timer
 
+try:
+    import TimeTagger
+except ImportError:
+    # without the Swabian software installed only the virtual tagger (src.time_tagger.virtual_tagger) can be used
+    TimeTagger = None
+
 class TimeTaggerController:
 
-    def __init__(self, KineticMountController:KineticMountControl = None):
+    def __init__(self, KineticMountController:KineticMountControl = None, tagger=None):
+        """
+        tagger=None: connects to the real time tagger. Alternatively an already created tagger can be passed, 
+        e.g. a VirtualTimeTagger to run everything without hardware
+        """
 
         # if specified connect to kinetic mount controller
         self.KMC = KineticMountController
 
         # connect to tagger device, get input channels and set trigger levels
-        self.tagger = TimeTagger.createTimeTagger()
-        input_channels = self.tagger.getChannelList(TimeTagger.ChannelEdge.Rising)
+        # self.TT is the module with the measurement classes (Counter, Coincidences, ...) that belong to the tagger
+        if tagger is None:
+            self.TT = TimeTagger
+            self.tagger = TimeTagger.createTimeTagger()
+        else:
+            self.TT = tagger.api
+            self.tagger = tagger
+        input_channels = self.tagger.getChannelList(self.TT.ChannelEdge.Rising)
         for ch in input_channels:
             self.tagger.setTriggerLevel(ch, 0.5)
 
@@ -34,6 +60,18 @@ class TimeTaggerController:
         self.coincidence_channel_names = None
         self.coincidence_window_SI = 0.5e-9
 
+        # keeps the coincidence virtual channels of the last few windows alive (see createCoincidenceChannels)
+        self.coincidence_manager = CoincidenceChannelManager(self.TT, self.tagger)
+
+        # long-lived stream over the coincidence channels (see start_stream_acquisition)
+        self.stream_engine = None
+
+        # phase timings of every metronome beat (see get_single_measurement_metronome)
+        self.beat_timing = BeatTimingRecorder()
+
+        # orders the basis settings of the bell measurements for minimal rotation (orders are cached between runs)
+        self.setting_planner = SettingPlanner()
+
     def set_alice_transmission_channel(self, channel):
         self.assigned_channels['Alice_T'] = channel
     def set_alice_reflection_channel(self, channel):
@@ -46,13 +84,15 @@ class TimeTaggerController:
     def setKineticMountController(self, KMC:KineticMountControl):
         self.KMC = KMC
 
-    def displayCountTraces(self, channels=None, channel_names=None, binwidth_SI=0.1, n_values=1000, trace_width=2, plot_title=None):
+    def displayCountTraces(self, channels=None, channel_names=None, binwidth_SI=0.1, n_values=1000, trace_width=2, plot_title=None, n_pixels=800, on_close=None):
         """
         Written to work in an Ipython/Jupyter type environment only
+        n_pixels: approximate width of the plot in pixels, each trace is reduced to its min/max per pixel before sending
+        on_close: called once the figure is closed (e.g. to release the channels it shows)
         """
         # find channels if not specified
         if channels is None:
-           channels = self.tagger.getChannelList(TimeTagger.ChannelEdge.Rising) 
+           channels = self.tagger.getChannelList(self.TT.ChannelEdge.Rising) 
 
         # crate counters for each trace
         traces = self._createCounters(channels=channels, binwidth_SI=binwidth_SI, n_values=n_values)
@@ -68,14 +108,13 @@ class TimeTaggerController:
             
             trace_labels.append(label)
 
-        # Init figure
-        fig = go.FigureWidget()
-            
-        # add scatter for each virtual channel
-        for i, (trace, label) in enumerate(zip(traces, trace_labels)):
-            fig.add_scatter(x=trace.getIndex(), y=trace.getData()[0], name=f"{label}", line=dict(width=trace_width))
-
-        fig.update_layout(
+        # Init figure (traces are decimated to n_pixels and drawn with WebGL, see live_traces)
+        trace_figure = live_traces.CountTraceFigure(
+            traces, trace_labels, binwidth_SI,
+            n_pixels=n_pixels,
+            trace_width=trace_width,
+            # do not update faster than binwidth
+            refresh_period=max(binwidth_SI, 0.05),
             xaxis_title='Time',
             yaxis_title='Counts / s',
             title=plot_title,
@@ -83,106 +122,137 @@ class TimeTaggerController:
             xaxis_title_font_size=18,
             yaxis_title_font_size=18,
             font=dict(size=16) # ticklabels
-
         )
-        # this is just here so that if a cell gets rerun while a trace is already running 
-        # the already running trace will get cancelled first
-        try:
-            task_trace.cancel()
-        except:
-            pass
-        loop = asyncio.get_event_loop()
-        task_trace = loop.create_task(self.update_traces(fig, traces, binwidth_SI))
+
+        # all figures are updated from one shared loop
+        live_traces.refresh_loop.add(trace_figure)
 
         # create container to contain figure and button
         output_container = Output()
         with output_container:
             stop_button = Button(description="stop and close")
-            display(fig, stop_button)
+            display(trace_figure.fig, stop_button)
 
         # button callback action on click
-        stop_button.on_click(lambda a: self._stop_and_close_figure(task_trace, fig, output_container))
+        stop_button.on_click(lambda a: self._stop_and_close_figure(trace_figure, output_container, on_close))
 
         # display figure
         display(output_container)
 
-    async def update_traces(self, fig, traces, binwidth_SI):
-        currentMax = 0
-        refreshPeriod = binwidth_SI if binwidth_SI > 0.05 else 0.05
-        while True:
-            try:
-                # Batch updates for all traces
-                with fig.batch_update():
-                    for i, trace in enumerate(traces):
-                        y_data = trace.getData()[0] / binwidth_SI
-
-                        ymax = np.max(y_data)
-                        if ymax > currentMax:
-                            currentMax = 1 * ymax
-                            fig.update_layout(yaxis=dict(range=[0, ymax]))
-
-                        fig.data[i].y = y_data
-
-                # do not update faster than binwidth
-                await asyncio.sleep(refreshPeriod) 
-
-            except asyncio.CancelledError: # gracefully handle cancellation
-                break
-                
-    def _stop_and_close_figure(self, task, fig, output_container):
-        # stop the update task
-        task.cancel()
+    def _stop_and_close_figure(self, trace_figure, output_container, on_close=None):
+        # stop updating the figure
+        live_traces.refresh_loop.remove(trace_figure)
         # wait for stuff to close then close figure
         sleep(0.1)
-        fig.close()
+        trace_figure.close()
         # close output container
         output_container.clear_output()
 
+        if on_close is not None:
+            on_close()
+
         # delete coincidence channels if they exist
         #if hasattr(self, 'coincidences_vchannels'):
         #    delattr(self, 'coincidences_vchannels')
         #    self.coincidences_vchannels = None
 
-    def _getDelays(self, referenceChannel, adjustmentChannels, integration_time):
+    def _print_delays(self, C, C_uncertainty=None):
+        if C_uncertainty is None:
+            C_uncertainty = [0] * len(C)
+        for name, c, dc in zip(['Alice_T', 'Alice_R', 'Bob_T', 'Bob_R'], C, C_uncertainty):
+            print(f"{name:<8}: {c:>5} ps (+- {dc:.1f} ps) \t/ {c * 0.3:>7.1f} mm")
 
-        # Create SynchronizedMeasurements to operate on the same time tags.
-        sm = TimeTagger.SynchronizedMeasurements(self.tagger)
+    def calibrateDelays(self, target_uncertainty_ps=2, slice_time=0.5, max_integration_time=10, min_coincidence_rate=50, max_delay_ps=5000, coarse_binwidth_ps=50, set=True, debug=True):
+        """
+        Measures the delays of all four channels from a single synchronized acquisition and (if set) compensates them
+        Returns the delays (list in ps, relative to Alice_T, same as performDelayAdjustment) and their uncertainties
 
-        #Create Correlation measurements
-        corr_list = list()
-        for ch in adjustmentChannels:
-            corr_list.append(
-                TimeTagger.Correlation(sm.getTagger(), referenceChannel, ch, binwidth=1, n_bins=5000)
-            )
+        The cross-correlations of all Alice/Bob channel pairs are accumulated in slices of slice_time seconds.
+        After every slice each peak is located, first coarsely on a histogram with coarse_binwidth_ps bins, then with a
+        gaussian + background fit around the previous estimate. The acquisition stops as soon as all delay uncertainties
+        are below target_uncertainty_ps (or max_integration_time is reached).
+
+        Raises a RuntimeError if less than min_coincidence_rate coincidences per second arrive in any of the peaks
+        """
+        channels = [self.assigned_channels[name] for name in delay_calibration.CHANNEL_NAMES]
+        if None in channels:
+            raise RuntimeError("Error: All four channels need to be assigned before calibrating the delays")
+
+        # all correlations are measured on the same time tags
+        sm = self.TT.SynchronizedMeasurements(self.tagger)
+        correlations = {}
+        for a, b in delay_calibration.CHANNEL_PAIRS:
+            correlations[(a, b)] = self.TT.Correlation(sm.getTagger(), self.assigned_channels[a], self.assigned_channels[b], binwidth=1, n_bins=2 * max_delay_ps)
 
         # Adjust mirrors so that all 4 channels have coincidences
-        self.KMC.rotate_simulataneously(22.5, 0)
-        sleep(1)
+        if self.KMC is not None:
+            self.KMC.rotate_simulataneously(22.5, 0)
+            sleep(1)
 
-        # Start measurements and accumulate data for integration time seconds
-        sm.startFor(int(integration_time*1e12), clear=True)
-        sm.waitUntilFinished()
+        peaks = {pair: None for pair in correlations}
+        C = None
+        elapsed_time = 0
+        while True:
+            # accumulate another slice (only clear on the first one)
+            sm.startFor(int(slice_time * 1e12), clear=(elapsed_time == 0))
+            sm.waitUntilFinished()
+            elapsed_time += slice_time
+
+            for pair, corr in correlations.items():
+                index = corr.getIndex()
+                counts = corr.getData()
+
+                # coarse to fine: search the whole histogram until a peak was fitted, then only around it
+                if peaks[pair] is None or peaks[pair]['position'] is None:
+                    center = delay_calibration.locate_peak(index, counts, coarse_binwidth_ps)
+                    half_width = 4 * coarse_binwidth_ps
+                else:
+                    center = peaks[pair]['position']
+                    half_width = max(6 * peaks[pair]['width'], 10)
+                peaks[pair] = delay_calibration.fit_correlation_peak(index, counts, center, half_width)
+
+            # fail fast if the source or the alignment does not give enough coincidences
+            min_coincidences = min(peak['coincidences'] for peak in peaks.values())
+            if min_coincidences < min_coincidence_rate * elapsed_time:
+                if self.KMC is not None:
+                    self.KMC.home()
+                raise RuntimeError(f"Error: Not enough coincidences for the delay calibration ({min_coincidences:.0f} in {elapsed_time:.1f} s)")
+
+            if all(peak['position'] is not None for peak in peaks.values()):
+                C, C_uncertainty = delay_calibration.solve_delays(peaks)
+                if debug:
+                    print(f"{elapsed_time:.1f} s: max uncertainty {C_uncertainty.max():.2f} ps")
+                if C_uncertainty.max() < target_uncertainty_ps:
+                    break
+
+            if elapsed_time >= max_integration_time:
+                if C is None:
+                    raise RuntimeError("Error: Could not fit the coincidence peaks for the delay calibration")
+                print(f"Target uncertainty of {target_uncertainty_ps} ps not reached after {elapsed_time:.1f} s")
+                break
 
-        # Determine delays
-        delays = list()
-        for corr in corr_list:
-            hist_t = corr.getIndex()
-            hist_c = corr.getData()
-            #Identify the delay as the center of the histogram through a weighted average
-            dt = np.sum(hist_t * hist_c) / np.sum(hist_c)
-            delays.append(int(dt))
+        C = [int(round(c)) for c in C]
+
+        #Compensate the delays to align the signals
+        if set:
+            if debug:
+                print("Delays Before Correction")
+                self._print_delays(C, C_uncertainty)
 
-        return delays
+            for ch, dt in zip(channels, C):
+                currentDelay = self.tagger.getInputDelay(ch)
+                newDelay = int(currentDelay - dt)
+                self.tagger.setInputDelay(ch, newDelay)
 
-    def _print_delays(self, C):
-        for name, c in zip(['Alice_T', 'Alice_R', 'Bob_T', 'Bob_R'], C):
-            print(f"{name:<8}: {c:>5} ps \t/ {c * 0.3:>7.1f} mm")
+        if self.KMC is not None:
+            self.KMC.home()
+
+        return C, C_uncertainty
 
     def performDelayAdjustment(self, integration_time=2, set=True, manual_delays=None):
-        # TODO Detect when not enough correlations and cancel delay adjustment
         """
         Returns delay in ps
-        integration_time is to be given in s 
+        integration_time is to be given in s (maximum time, the calibration stops earlier once the delays are known to 2 ps)
 
         Allows for multiple calls and makes an update to the adjustment instead of starting over
 
@@ -201,37 +271,7 @@ class TimeTaggerController:
                 self.tagger.setInputDelay(ch, delay)
             return None
 
-        Tdelays = self._getDelays(self.assigned_channels['Alice_T'], bob_channels, integration_time=integration_time)
-        Rdelays = self._getDelays(self.assigned_channels['Alice_R'], bob_channels, integration_time=integration_time)
-
-        # print(Tdelays)
-        # print(Rdelays)
-
-        C_AT = 0 # reference
-        C_BT = -Tdelays[0] # -D_TT
-        C_BR = -Tdelays[1] # -D_Tr
-        C_AR =  Rdelays[0] - Tdelays[0] # D_RT - D_TT
-
-        C = [C_AT, C_AR, C_BT, C_BR]
-
-
-        #Compensate the delays to align the signals
-        if set:
-            
-            print("Delays Before Correction")
-            self._print_delays(C)
-
-            for ch, dt in zip([*alice_channels, *bob_channels], C):
-                currentDelay = self.tagger.getInputDelay(ch)
-                newDelay = int(currentDelay - dt)
-                self.tagger.setInputDelay(ch, newDelay)
-
-            # measure delays again to see new delays 
-            C_new = self.performDelayAdjustment(integration_time=integration_time / 3, set=False)
-            print("\nDelays After Correction")
-            self._print_delays(C_new)
-
-        self.KMC.home()
+        C, _ = self.calibrateDelays(max_integration_time=integration_time, set=set)
 
         return C
 
@@ -249,33 +289,113 @@ class TimeTaggerController:
             
             self.coincidence_channel_names = ['|T,T>', '|T,R>', '|R,T>', '|R,R>']
 
-            # 30ns coincidence window if want to match qutools (coincidence window is in ps)
-            # NOTE vchannels need to be a an instance variable (with self.) because otherwise they get auto deleted after some time and no longer exist
-            # This means we need to delete them manually when we stop looking at coincidences otherwise they keep existing in the background
-            self.coincidences_vchannels = TimeTagger.Coincidences(self.tagger, groups, coincidenceWindow=coincidence_window_SI * 1e12)
+            # 30ns coincidence window if want to match qutools
+            # NOTE vchannels need to be kept referenced because otherwise they get auto deleted after some time and no longer exist.
+            # The manager keeps them alive, reuses them for the same groups and window, and frees the least recently used
+            # ones that nobody uses anymore. The controller is a user of its current channels
+            vchannels = self.coincidence_manager.get(groups, coincidence_window_SI)
+            if vchannels is self.coincidences_vchannels:
+                self.coincidence_manager.release(vchannels)
+                return
+
+            if self.coincidences_vchannels is not None:
+                self.coincidence_manager.release(self.coincidences_vchannels)
+            self.coincidences_vchannels = vchannels
+            self.coincidence_window_SI = coincidence_window_SI
 
             # make translation dict from channel number to 0:TT, 1:TR, 2:RT, 3:RR
             self.coincidence_channel_dictionary = {}
             for i, vch in enumerate(self.coincidences_vchannels.getChannels()):
                 self.coincidence_channel_dictionary[vch] = i
 
+            # a running stream still points at the old virtual channels, so reopen it on the new ones
+            if self.stream_engine is not None:
+                self.start_stream_acquisition(buffer_size=self.stream_engine.buffer_size)
+
         # in case channels are not yet assigned 
         except KeyError as e:
             missing_key = e.args[0]
             raise RuntimeError(f"Error: Channel '{missing_key}' has not been assigned yet") from e
 
+    def measureSoftwareCoincidences(self, duration_SI, coincidence_windows_SI, offsets_SI=(0,), buffer_size=2**20, poll_interval=0.05):
+        """
+        Streams the raw tags of the four assigned channels for duration_SI seconds and counts the coincidences
+        in software (see software_coincidences) for every window and offset (added to Bob's tags) at once
+        Returns counts with shape (coincidence channel [TT, TR, RT, RR], offset, window)
+        """
+        channels = [self.assigned_channels[name] for name in ['Alice_T', 'Alice_R', 'Bob_T', 'Bob_R']]
+        if None in channels:
+            raise RuntimeError("Error: All four channels need to be assigned before counting coincidences")
+        groups = [(self.assigned_channels['Alice_T'], self.assigned_channels['Bob_T']), 
+                  (self.assigned_channels['Alice_T'], self.assigned_channels['Bob_R']),
+                  (self.assigned_channels['Alice_R'], self.assigned_channels['Bob_T']),
+                  (self.assigned_channels['Alice_R'], self.assigned_channels['Bob_R']),
+        ]
+        counter = software_coincidences.CoincidenceCounter(groups, coincidence_windows_SI, offsets_SI)
+
+        # count each chunk as soon as it arrives, so long measurements do not have to be kept in memory
+        stream = self.TT.TimeTagStream(tagger=self.tagger, n_max_events=buffer_size, channels=channels)
+        start_time = time.perf_counter()
+        while time.perf_counter() - start_time < duration_SI:
+            sleep(poll_interval)
+            data = stream.getData()
+            if data.size > 0:
+                counter.add(data.getTimestamps(), data.getChannels())
+        stream.stop()
+
+        data = stream.getData()
+        if data.size > 0:
+            counter.add(data.getTimestamps(), data.getChannels())
+        return counter.finish()
+
+    def recordTags(self, path, duration_SI, channels=None, buffer_size=2**20, poll_interval=0.05, chunk_size=2**16):
+        """
+        Records the raw tags of channels (all input channels if None) for duration_SI seconds to path (see tag_recording)
+        Returns the TagRecording, which can be analysed or replayed with a ReplayTimeTagger
+        """
+        if channels is None:
+            channels = self.tagger.getChannelList(self.TT.ChannelEdge.Rising)
+
+        metadata = {
+            'assigned_channels': self.assigned_channels,
+            'input_delays': {str(ch): self.tagger.getInputDelay(ch) for ch in channels},
+        }
+
+        stream = self.TT.TimeTagStream(tagger=self.tagger, n_max_events=buffer_size, channels=channels)
+        with tag_recording.TagRecorder(path, channels, chunk_size=chunk_size, metadata=metadata) as recorder:
+            start_time = time.perf_counter()
+            while time.perf_counter() - start_time < duration_SI:
+                sleep(poll_interval)
+                data = stream.getData()
+                if data.hasOverflows:
+                    print("Warning: Stream buffer overflow, some tags were not recorded")
+                if data.size > 0:
+                    recorder.write(data.getTimestamps(), data.getChannels())
+            stream.stop()
+
+            data = stream.getData()
+            if data.size > 0:
+                recorder.write(data.getTimestamps(), data.getChannels())
+
+        return tag_recording.TagRecording(path)
+
     def displayCoincidenceTraces(self, coincidence_window_SI = 0.5e-9, **kwargs):#, binwidth_SI=0.1, n_values=1000,):
 
         # make sure coincidence channels are created and exist
         self.createCoincidenceChannels(coincidence_window_SI)
 
+        # the traces keep using these channels until the figure is closed, even if other channels are created meanwhile
+        vchannels = self.coincidences_vchannels
+        self.coincidence_manager.hold(vchannels)
+
         # display traces of coincidences
-        self.displayCountTraces(channels=self.coincidences_vchannels.getChannels(), channel_names=self.coincidence_channel_names, **kwargs) #binwidth_SI=binwidth_SI, n_values=n_values)
+        self.displayCountTraces(channels=vchannels.getChannels(), channel_names=self.coincidence_channel_names,
+                                on_close=lambda: self.coincidence_manager.release(vchannels), **kwargs) #binwidth_SI=binwidth_SI, n_values=n_values)
 
     def _createCounters(self, channels, binwidth_SI, n_values):
         counters = []
         for ch in channels:
-            counter = TimeTagger.Counter(tagger=self.tagger, channels=[ch], binwidth=binwidth_SI * 1e12, n_values=n_values)
+            counter = self.TT.Counter(tagger=self.tagger, channels=[ch], binwidth=binwidth_SI * 1e12, n_values=n_values)
             counters.append(counter)
         
         return counters
@@ -285,6 +405,10 @@ class TimeTaggerController:
         starts the counters and collects a single datapoint from each, returning as integer np.array
         note binwidth must be the same as the co unter binwidth
         """
+        self._integrateCounters(counters, binwidth_SI)
+        return self._readCounters(counters)
+
+    def _integrateCounters(self, counters, binwidth_SI):
         # start all counters and stop again after integration time is over
         for counter in counters:
             counter.startFor(binwidth_SI * 1e12)
@@ -293,7 +417,58 @@ class TimeTaggerController:
         for counter in counters:
             counter.waitUntilFinished()
 
+    def _readCounters(self, counters):
         return np.array([counter.getData(rolling=False)[0][-1] for counter in counters], dtype=int)
+
+    def _measureSettings(self, settings, counters, integration_time_SI, TTSimulator : TT_Simulator=None, target_uncertainty=None, max_integration_time_SI=None, rng=None):
+        """
+        measures the coincidence counts [NTT, NTR, NRT, NRR] for a list of (alice_angle, bob_angle) settings.
+        Rotation, integration and readout are pipelined (see chsh_measurement.SettingScheduler)
+        The settings are measured in the order planned by self.setting_planner
+        target_uncertainty: if given, every setting is integrated in slices of integration_time_SI (the counter binwidth)
+                            until the standard error of its correlation reaches target_uncertainty or max_integration_time_SI is over
+        rng: numpy.random.Generator (or a seed) the simulated measurements draw from (TTSimulator.rng if None)
+        returns list of SettingResult in the order of settings
+        """
+        # one generator for the whole run, so a seed does not give the same counts in every slice
+        if rng is not None:
+            rng = np.random.default_rng(rng)
+
+        # one slice (real or simulated)
+        # [NTT, NTR, NRT, NRR]
+        if TTSimulator is None:
+            measure_slice = lambda a_angle, b_angle: self._makeSingleCounterMeasurement(counters, integration_time_SI)
+        else:
+            # make a simulated measurement instead (5000 pairs per second of integration)
+            n_pairs = int(round(5000 * integration_time_SI)) if target_uncertainty is not None else 5000
+            measure_slice = lambda a_angle, b_angle: TTSimulator.measure_n_entangled_pairs_filter_angles(n_pairs, theta_a=a_angle, theta_b=b_angle, rng=rng)
+
+        if target_uncertainty is None:
+            if TTSimulator is None:
+                integrate = lambda a_angle, b_angle: self._integrateCounters(counters, integration_time_SI)
+                read_out = lambda a_angle, b_angle: self._readCounters(counters)
+            else:
+                integrate = lambda a_angle, b_angle: None
+                read_out = measure_slice
+        else:
+            # the scheduler never integrates the next setting before the last one has been read out, so one slot is enough
+            max_slices = int(np.ceil(max_integration_time_SI / integration_time_SI))
+            accumulated = {}
+            def integrate(a_angle, b_angle):
+                accumulated['counts'] = integrate_adaptively(lambda: measure_slice(a_angle, b_angle), target_uncertainty, max_slices)
+            read_out = lambda a_angle, b_angle: accumulated['counts']
+
+        # measure in the order with the least rotation, but return the results in the requested order
+        order = self.setting_planner.order(settings)
+        # rotate in the scheduler's event loop if the mounts support it (no thread per rotation)
+        rotate = getattr(self.KMC, 'rotate_simultaneously_async', self.KMC.rotate_simulataneously)
+        scheduler = SettingScheduler(rotate=rotate, integrate=integrate, read_out=read_out)
+        measured = scheduler.run([settings[k] for k in order])
+
+        results = [None] * len(settings)
+        for k, result in zip(order, measured):
+            results[k] = result
+        return results
     
     def _render_bar(self, val, width=45, show_mid=False, ascii=False):
         """
@@ -324,7 +499,16 @@ class TimeTaggerController:
 
         return bar
     
-    def measureS(self, CHSH_angles, coincidence_window_SI = 0.1e-9, integration_time_per_basis_setting_SI=1, TTSimulator : TT_Simulator=None, debug=True):
+    def measureS(self, CHSH_angles, coincidence_window_SI = 0.1e-9, integration_time_per_basis_setting_SI=1, TTSimulator : TT_Simulator=None, debug=True,
+                 target_S_uncertainty=None, max_integration_time_per_basis_setting_SI=10, slice_time_SI=0.1, rng=None):
+        """
+        measures the correlations of the 4 CHSH settings and calculates S, returns a CHSHResult
+        target_S_uncertainty: if given, the integration time is adaptive. The counters are read out in slices of slice_time_SI
+                              and every setting is integrated until the standard error of S reaches target_S_uncertainty
+                              (each correlation gets target_S_uncertainty / 2) or max_integration_time_per_basis_setting_SI is over.
+                              integration_time_per_basis_setting_SI is ignored in that case
+        rng: numpy.random.Generator (or a seed) for the simulated measurements of TTSimulator (TTSimulator.rng if None)
+        """
 
         # home all kinetic mounts
         self.KMC.home() 
@@ -332,6 +516,13 @@ class TimeTaggerController:
         # make sure coincidence channels are created and exist
         self.createCoincidenceChannels(coincidence_window_SI)
 
+        # in adaptive mode the counters only integrate one slice at a time
+        # the errors of the 4 correlations add up in quadrature, so each one may be half as large as the error on S
+        target_uncertainty = None
+        if target_S_uncertainty is not None:
+            integration_time_per_basis_setting_SI = slice_time_SI
+            target_uncertainty = target_S_uncertainty / 2
+
         # create a counter for each virtual coincidence channel
         counters = self._createCounters(channels=self.coincidences_vchannels.getChannels(), binwidth_SI=integration_time_per_basis_setting_SI, n_values=1)
 
@@ -363,39 +554,41 @@ class TimeTaggerController:
 
         alice_angles = CHSH_angles[0:2]
         bob_angles = CHSH_angles[2:4]
-        corrs = np.zeros((2,2))
-        for i, a_angle in enumerate(alice_angles):
-            for j, b_angle in enumerate(bob_angles):
-                
-                # rotates filters waits for them to finish rotating
-                self.KMC.rotate_simulataneously(a_angle, b_angle)
-
-                # make a measurement (real or simulated) 
-                # [NTT, NTR, NRT, NRR]
-                if TTSimulator is None:
-                    N = self._makeSingleCounterMeasurement(counters, integration_time_per_basis_setting_SI) 
-                else:
-                    N = TTSimulator.measure_n_entangled_pairs_filter_angles(5000, theta_a=a_angle, theta_b=b_angle)
+        settings = [(a_angle, b_angle) for a_angle in alice_angles for b_angle in bob_angles]
 
-                # calculate correlations 
-                corrs[i, j] = (N[0] - N[1] - N[2] + N[3]) / N.sum()
-                if debug:
-                    print(f"\ncorr[{'a' if i == 0 else 'A'},{'b' if j==0 else 'B'}] = {corrs[i, j]:.5}")
-                    for x in range(4):
-                        fraction = N[x] / N.sum()
-                        bar = self._render_bar(fraction)
-                        print(f"\tN[{self.coincidence_channel_names[x]}]={N[x]:>6}\t({fraction:<4.3f}) {bar}")
+        # rotate, measure (real or simulated) and read out every setting
+        # [NTT, NTR, NRT, NRR]
+        start_time = time.perf_counter()
+        results = self._measureSettings(settings, counters, integration_time_per_basis_setting_SI, TTSimulator,
+                                        target_uncertainty=target_uncertainty, max_integration_time_SI=max_integration_time_per_basis_setting_SI, rng=rng)
+
+        # calculate correlations 
+        corrs = np.array([result.correlation for result in results]).reshape(2, 2)
+        corr_uncertainties = np.array([result.uncertainty for result in results]).reshape(2, 2)
+        if debug:
+            for k, result in enumerate(results):
+                i, j = divmod(k, 2)
+                N = result.counts
+                print(f"\ncorr[{'a' if i == 0 else 'A'},{'b' if j==0 else 'B'}] = {corrs[i, j]:.5} +- {corr_uncertainties[i, j]:.2} ({result.integration_time:.2f} s)")
+                for x in range(4):
+                    fraction = N[x] / N.sum()
+                    bar = self._render_bar(fraction)
+                    print(f"\tN[{self.coincidence_channel_names[x]}]={N[x]:>6}\t({fraction:<4.3f}) {bar}")
         
         # Calculate S
         S = np.abs(corrs[0,0] + corrs[0,1] + corrs[1,0] - corrs[1,1])
-        print(f"\nS = abs(corrs[0,0] + corrs[0,1] + corrs[1,0] - corrs[1,1]) = {S}")
+        S_uncertainty = np.sqrt(np.sum(corr_uncertainties**2))
+        print(f"\nS = abs(corrs[0,0] + corrs[0,1] + corrs[1,0] - corrs[1,1]) = {S} +- {S_uncertainty:.4f}")
 
         # rehome all mounts
         self.KMC.home()
 
-    def measure_S_with_two_ports(self, CHSH_angles, coincidence_window_SI = 0.5e-9, integration_time_per_basis_setting_SI=1, TTSimulator : TT_Simulator=None, debug=True):
+        return CHSHResult(S, corrs, results, total_time=time.perf_counter() - start_time, S_uncertainty=S_uncertainty)
+
+    def measure_S_with_two_ports(self, CHSH_angles, coincidence_window_SI = 0.5e-9, integration_time_per_basis_setting_SI=1, TTSimulator : TT_Simulator=None, debug=True, rng=None):
         """
         Does a bell measurement with 2 ports only simulates linear polarising filters using the Polarising beam splitter cubes together with the Half Wave Plates
+        rng: numpy.random.Generator (or a seed) for the simulated measurements of TTSimulator (TTSimulator.rng if None)
         """
 
         # home all kinetic mounts
@@ -412,27 +605,26 @@ class TimeTaggerController:
 
         alice_angles = CHSH_angles[0:2]
         bob_angles = CHSH_angles[2:4]
+
+        # since we now dont have access to all 4 SPCMs we need to rotate the light 90deg to check the other polarisation
+        settings = []
+        for a_angle in alice_angles:
+            for b_angle in bob_angles:
+                for a_angle_perp in [0, 45]:
+                    for b_angle_perp in [0, 45]:
+                        settings.append((a_angle + a_angle_perp, b_angle + b_angle_perp))
+
+        # rotate, measure (real or simulated) and read out every setting
+        # [NTT, NTR, NRT, NRR]
+        start_time = time.perf_counter()
+        results = self._measureSettings(settings, counters, integration_time_per_basis_setting_SI, TTSimulator, rng=rng)
+
         corrs = np.zeros((4,2,2))
         print(f"SPCM Pairs: {pair_names[:]}")
-        for i, a_angle in enumerate(alice_angles):
-            for j, b_angle in enumerate(bob_angles):
-            
-                # since we now dont have access to all 4 SPCMs we need to rotate the light 90deg to check the other polarisation
-                N = np.zeros((4,4), dtype=int)
-                for ii, a_angle_perp in enumerate([0, 45]):
-                    for jj, b_angle_perp in enumerate([0, 45]):
-                        
-                        new_a_angle = a_angle + a_angle_perp
-                        new_b_angle = b_angle + b_angle_perp
-                        # rotates filters waits for them to finish rotating
-                        self.KMC.rotate_simulataneously(new_a_angle, new_b_angle)
-
-                        # make a measurement (real or simulated) 
-                        # [NTT, NTR, NRT, NRR]
-                        if TTSimulator is None:
-                            N[:,2*ii + jj] = self._makeSingleCounterMeasurement(counters, integration_time_per_basis_setting_SI)
-                        else:
-                            N[:, 2*ii + jj] = TTSimulator.measure_n_entangled_pairs_filter_angles(5000, theta_a=new_a_angle, theta_b=new_b_angle)
+        for i in range(2):
+            for j in range(2):
+                # columns are the 4 perpendicular combinations of this setting
+                N = np.array([result.counts for result in results[4*(2*i + j):4*(2*i + j + 1)]]).T
 
                 # calculate correlations 
                 corrs[:, i, j] = (N[:, 0] - N[:, 1] - N[:, 2] + N[:, 3]) / N.sum(axis=1)
@@ -452,7 +644,49 @@ class TimeTaggerController:
         # rehome all mounts
         self.KMC.home()
 
+        return CHSHResult(S, corrs, results, total_time=time.perf_counter() - start_time)
+
     
+    def measureStateTomography(self, hwp_angles=tomography.DEFAULT_HWP_ANGLES, coincidence_window_SI=0.5e-9, integration_time_per_setting_SI=1, TTSimulator : TT_Simulator=None, save_path=None, debug=True, rng=None):
+        """
+        Measures the coincidences at all (alice, bob) combinations of the hwp_angles (filter angles in degrees)
+        and reconstructs the two photon density matrix (maximum likelihood, see tomography)
+        Returns the 4 x 4 density matrix (basis HH, HV, VH, VV), which can be used directly as initial state of a TT_Simulator,
+        and the list of SettingResult
+        save_path: also save the density matrix, settings and counts there (tomography.save, load again with states.from_tomography)
+        rng: numpy.random.Generator (or a seed) for the simulated measurements of TTSimulator (TTSimulator.rng if None)
+        """
+        # home all kinetic mounts
+        self.KMC.home()
+
+        # make sure coincidence channels are created and exist
+        self.createCoincidenceChannels(coincidence_window_SI)
+
+        # create a counter for each virtual coincidence channel
+        counters = self._createCounters(channels=self.coincidences_vchannels.getChannels(), binwidth_SI=integration_time_per_setting_SI, n_values=1)
+
+        # rotate, measure (real or simulated) and read out every setting
+        # [NTT, NTR, NRT, NRR]
+        settings = tomography.tomography_settings(hwp_angles, hwp_angles)
+        results = self._measureSettings(settings, counters, integration_time_per_setting_SI, TTSimulator, rng=rng)
+
+        start_time = time.perf_counter()
+        counts = [result.counts for result in results]
+        rho = tomography.reconstruct_density_matrix(settings, counts)
+        if debug:
+            print(f"Reconstructed density matrix ({(time.perf_counter() - start_time) * 1e3:.1f} ms):")
+            print(np.array2string(rho.real, precision=3, suppress_small=True))
+            for name in ['phi_plus', 'phi_minus', 'psi_plus', 'psi_minus']:
+                print(f"Fidelity with {name}: {tomography.fidelity(rho, two_particle_states[name]):.4f}")
+
+        if save_path is not None:
+            tomography.save(save_path, rho, settings, counts)
+
+        # rehome all mounts
+        self.KMC.home()
+
+        return rho, results
+
     @staticmethod
     def hybrid_wait(target_duration, start_time):
         """
@@ -471,6 +705,50 @@ class TimeTaggerController:
                 time.sleep(remaining_time - 0.02)
 
 
+    def start_stream_acquisition(self, buffer_size=2**16, coincidence_window_SI=0.5e-9):
+        """
+        Opens a single TimeTagStream over the coincidence virtual channels and keeps draining it 
+        into a ring buffer in the background. Per-beat measurements then read from this buffer
+        instead of creating a new stream each time (which costs setup time and drops early photons)
+        """
+        if self.coincidences_vchannels is None:
+            self.createCoincidenceChannels(coincidence_window_SI=coincidence_window_SI)
+
+        # only ever keep one stream alive
+        if self.stream_engine is not None:
+            self.stream_engine.stop()
+
+        stream = self.TT.TimeTagStream(
+            tagger=self.tagger,
+            n_max_events=buffer_size,
+            channels=self.coincidences_vchannels.getChannels()
+        )
+        self.stream_engine = StreamAcquisitionEngine(stream, buffer_size=buffer_size, tagger=self.tagger)
+        self.stream_engine.start()
+
+    def stop_stream_acquisition(self):
+        if self.stream_engine is not None:
+            self.stream_engine.stop()
+            self.stream_engine = None
+
+    def _collect_latest_coincidence(self, integration_time, deadline, spin_tail=0.002):
+        """
+        Integrates on the running stream for integration_time and returns the channel of the last coincidence
+        that arrived in that time (or -1 if there was none). Returns at the absolute time deadline (time.perf_counter)
+        """
+        start_time = time.perf_counter()
+        self.stream_engine.sync()
+        mark = self.stream_engine.mark()
+
+        sleep_until(start_time + integration_time, spin_tail)
+        self.stream_engine.sync()
+        channel = self.stream_engine.latest_channel(since=mark)
+
+        # Wait until the deadline is reached
+        sleep_until(deadline, spin_tail)
+
+        return channel
+
     def collect_stream_data(self, integration_time, max_time, min_event_count=10):
         """
         Collect stream data from the TimeTagger, stopping when the minimum event count
@@ -488,7 +766,7 @@ class TimeTaggerController:
         events_by_channel = []
 
         # Create the stream once and reuse it
-        stream = TimeTagger.TimeTagStream(
+        stream = self.TT.TimeTagStream(
             tagger=self.tagger,
             n_max_events=1000,
             channels=self.coincidences_vchannels.getChannels()
@@ -538,7 +816,7 @@ class TimeTaggerController:
         events_by_channel = []
 
         # Create the stream
-        stream = TimeTagger.TimeTagStream(
+        stream = self.TT.TimeTagStream(
             tagger=self.tagger,
             n_max_events=1000,
             channels=self.coincidences_vchannels.getChannels()
@@ -572,20 +850,29 @@ class TimeTaggerController:
         returns 0, 1, 2, 3 for (TT, TR, RT, RR)
         """
 
-        if self.coincidences_vchannels is None:
-            self.createCoincidenceChannels(coincidence_window_SI=coincidence_window_SI)
+        if self.stream_engine is None:
+            self.start_stream_acquisition(coincidence_window_SI=coincidence_window_SI)
         
         # Rotate filters
         self.KMC.rotate_simulataneously(theta_a, theta_b)
-        # Get an Event
-        eventsByChannel = self.collect_stream_data(integration_time, max_time=max_time, min_event_count=min_event_count)
-        
+
+        # Only look at events that arrive once the filters are in place
+        start_time = time.perf_counter()
+        self.stream_engine.sync()
+        mark = self.stream_engine.mark()
+        while True:
+            self.hybrid_wait(integration_time, time.perf_counter())
+            self.stream_engine.sync()
+            if self.stream_engine.count_since(mark) >= min_event_count or time.perf_counter() - start_time >= max_time:
+                break
+
         # Pick out the final event from the set (to prevent startup issues with first event)
-        if len(eventsByChannel) == 0:
+        channel = self.stream_engine.latest_channel(since=mark)
+        if channel == -1:
             print("No Photons")
             pickedCoincidence = -1
         else:
-            pickedCoincidence = self.coincidence_channel_dictionary[eventsByChannel[-1]]
+            pickedCoincidence = self.coincidence_channel_dictionary[channel]
 
         return pickedCoincidence
 
@@ -612,15 +899,31 @@ class TimeTaggerController:
 
         return new_theta_a, new_theta_b
 
-    def get_single_measurement_metronome(self, angle_pairs, theta_a, theta_b, prev_theta_a, prev_theta_b, metronome_interval=0.52, integration_time=0.065, max_integration_time=0.07, max_rotation_duration=0.35, coincidence_window_SI=0.5e-9, debug=False) -> int:
+    def get_single_measurement_metronome(self, angle_pairs, theta_a, theta_b, prev_theta_a, prev_theta_b, metronome_interval=0.52, integration_time=0.065, max_integration_time=0.07, max_rotation_duration=0.35, coincidence_window_SI=0.5e-9, debug=False, beat_clock: BeatClock=None) -> int:
         """
         Returns result, prev_theta_a, prev_theta_b
         result takes the form: 0, 1, 2, 3 for (TT, TR, RT, RR)
         If new angles match previous angles, integrates first, then does a fake rotation to create a sound
         If there is an angle difference it integrates after the rotation
+        The phase timings of every beat are kept in self.beat_timing (percentiles, missed beats, to_csv)
+
+        All phases are scheduled at fixed offsets from the start of the beat. With a beat_clock (BeatClock(metronome_interval))
+        the beats lie on one absolute timeline and the call returns at the start of the next beat, so no error accumulates
+        between beats (beat_clock.lateness holds the lateness of every beat). Without one, the beat starts when called.
         """
+        if beat_clock is not None:
+            if not beat_clock.is_running():
+                beat_clock.start()
+            start_time = beat_clock.beat_time()
+            spin_tail = beat_clock.spin_tail
+        else:
+            start_time = time.perf_counter()
+            spin_tail = 0.002
 
-        start_time = time.perf_counter()
+        # deadlines of the phases
+        pre_rotation_end = start_time + max_integration_time
+        rotation_end = pre_rotation_end + max_rotation_duration
+        post_rotation_end = rotation_end + max_integration_time
 
         # Timing dictionary
         timings = {}
@@ -628,27 +931,27 @@ class TimeTaggerController:
         # bool to hold if a rotation happened or not
         angles_changed = (theta_a != prev_theta_a) or (theta_b != prev_theta_b)
 
-        # Check and create coincidence channels
-        if self.coincidences_vchannels is None:
-            self.createCoincidenceChannels(coincidence_window_SI=coincidence_window_SI)
+        # Check and create coincidence channels and the stream running over them
+        if self.stream_engine is None:
+            self.start_stream_acquisition(coincidence_window_SI=coincidence_window_SI)
         
         # if angles_changed (in other words, if a click happened) then just wait
         # else do the measurement now
         t1 = time.perf_counter()
         if angles_changed:
-            self.hybrid_wait(target_duration=max_integration_time, start_time=time.perf_counter())
+            sleep_until(pre_rotation_end, spin_tail)
         else:
             # switch angles to opposite ones for pseudo rotation later
             theta_a, theta_b = self.toggle_angles(theta_a, theta_b, angle_pairs)
 
             # do a measurement
-            eventsByChannel = self.collect_stream_data_single_attempt(integration_time, max_integration_time)
+            channel = self._collect_latest_coincidence(integration_time, pre_rotation_end, spin_tail)
         timings['pre_rotation_time'] = time.perf_counter() - t1
         
         # Perform rotation
-        # Do not wait for completion, instead just go to max time
+        # Do not wait for completion, instead just go to the end of the rotation phase
         t2 = time.perf_counter()
-        self.KMC.rotate_simulataneously_metronome(theta_a, theta_b, prev_theta_a, prev_theta_b, wait_for_completion=False, target_duration=max_rotation_duration)
+        self.KMC.rotate_simulataneously_metronome(theta_a, theta_b, prev_theta_a, prev_theta_b, wait_for_completion=False, target_duration=max_rotation_duration, deadline=rotation_end, spin_tail=spin_tail)
         timings['rotate_simultaneously'] = time.perf_counter() - t2
 
 
@@ -657,15 +960,15 @@ class TimeTaggerController:
         t3 = time.perf_counter()
         if angles_changed:
             # do a measurement
-            eventsByChannel = self.collect_stream_data_single_attempt(integration_time, max_integration_time)
+            channel = self._collect_latest_coincidence(integration_time, post_rotation_end, spin_tail)
         else:
-            self.hybrid_wait(target_duration=max_integration_time, start_time=time.perf_counter())
+            sleep_until(post_rotation_end, spin_tail)
 
         # Pick out the final event
-        if eventsByChannel[0] == -1:
+        if channel == -1:
             pickedCoincidence = -1
         else:
-            pickedCoincidence = self.coincidence_channel_dictionary[eventsByChannel[-1]]
+            pickedCoincidence = self.coincidence_channel_dictionary[channel]
 
         # update prev angles
         prev_theta_a = theta_a
@@ -673,12 +976,17 @@ class TimeTaggerController:
     
         timings['post_rotation_time'] = time.perf_counter() - t3
 
-        # buffer the remianing time to reach the desired metronome_interval 
+        # buffer the remianing time to reach the desired metronome_interval (the start of the next beat)
         t4 = time.perf_counter()
-        self.hybrid_wait(target_duration=metronome_interval, start_time=start_time)
+        if beat_clock is not None:
+            beat_clock.next_beat()
+        else:
+            sleep_until(start_time + metronome_interval, spin_tail)
         timings['end_buffer'] = time.perf_counter() - t4
 
         timings['total'] = time.perf_counter() - start_time
+        self.beat_timing.record(timings['pre_rotation_time'], timings['rotate_simultaneously'], timings['post_rotation_time'],
+                                timings['end_buffer'], timings['total'], metronome_interval)
         if debug: print("Timing Summary:", [f"{k}: {v * 1e3:.1f}ms" for k, v in timings.items()])
 
         return pickedCoincidence, prev_theta_a, prev_theta_b
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Two photon state tomography with the half wave plates and PBS cubes of the setup
+(used by TimeTaggerController.measureStateTomography).
+
+Every (alice, bob) HWP setting gives the four coincidence outcomes [TT, TR, RT, RR], i.e. a complete
+projective measurement in a linear polarization basis on each side. The density matrix is reconstructed
+with the iterative maximum likelihood method rho -> R rho R / Tr(R rho R), evaluated with einsum over
+all settings and outcomes at once.
+
+NOTE: without a quarter wave plate only linear polarizations are measured. Parts of the state that need
+circular polarization measurements (the imaginary parts of rho) are not observed, the reconstruction is
+the real density matrix that explains the counts best. sigma_y x sigma_y is real, but also only fixed
+indirectly (through the positivity of rho)
+"""
+import numpy as np
+from . import numeric_backend
+
+# filter angles (in degrees) per side, 0/22.5 measure the H/V and the diagonal basis, 45/67.5 the same with T and R swapped
+# (so unequal detector efficiencies average out)
+DEFAULT_HWP_ANGLES = (0, 22.5, 45, 67.5)
+
+
+def tomography_settings(alice_angles=DEFAULT_HWP_ANGLES, bob_angles=DEFAULT_HWP_ANGLES):
+    """
+    all (alice, bob) combinations of the filter angles (in degrees)
+    """
+    return [(a, b) for a in alice_angles for b in bob_angles]
+
+
+def measurement_projectors(settings):
+    """
+    projectors of the four outcomes [TT, TR, RT, RR] of every (alice, bob) filter setting (in degrees)
+    Returns an array of shape (settings, 4, 4, 4): E[s, k] = U_s^dagger |k><k| U_s
+    """
+    settings = np.asarray(settings, dtype=float)
+    U = numeric_backend.two_hwp_operator(settings[:, 0] * np.pi / 90, settings[:, 1] * np.pi / 90)
+    return np.einsum('ski,skj->skij', U.conj(), U)
+
+
+def reconstruct_density_matrix(settings, counts, max_iterations=5000, tolerance=1e-12, rho0=None):
+    """
+    maximum likelihood density matrix for the counts [TT, TR, RT, RR] (shape (settings, 4)) measured at the filter settings
+    rho0: starting point of the iteration (maximally mixed state if None)
+    Returns the 4 x 4 density matrix
+    """
+    E = measurement_projectors(settings).reshape(-1, 4, 4)
+    frequencies = np.asarray(counts, dtype=float).reshape(-1)
+    frequencies = frequencies / frequencies.sum()
+
+    rho = np.eye(4, dtype=complex) / 4 if rho0 is None else np.array(rho0, dtype=complex)
+    for _ in range(max_iterations):
+        probabilities = np.einsum('nij,ji->n', E, rho).real
+
+        # outcomes that were never seen do not contribute (and would divide 0 by 0 if they are impossible for rho)
+        weights = np.divide(frequencies, probabilities, out=np.zeros_like(frequencies), where=probabilities > 0)
+        R = np.einsum('n,nij->ij', weights, E)
+
+        new_rho = R @ rho @ R
+        new_rho = new_rho / np.trace(new_rho).real
+        new_rho = (new_rho + new_rho.conj().T) / 2
+
+        change = np.abs(new_rho - rho).max()
+        rho = new_rho
+        if change < tolerance:
+            break
+
+    return rho
+
+
+def log_likelihood(rho, settings, counts):
+    """
+    multinomial log likelihood (up to a constant) of the counts for the density matrix rho
+    """
+    E = measurement_projectors(settings).reshape(-1, 4, 4)
+    probabilities = np.einsum('nij,ji->n', E, rho).real
+    counts = np.asarray(counts, dtype=float).reshape(-1)
+    mask = counts > 0
+    return float(np.sum(counts[mask] * np.log(np.maximum(probabilities[mask], 1e-300))))
+
+
+def log_likelihoods(rhos, settings, counts, detector_efficiencies=None):
+    """
+    log_likelihood() of many candidate density matrices (shape (states, 4, 4)) at once, e.g. to compare source models
+    with a measured dataset. The detector efficiencies are applied as in the simulator (None: ideal detectors)
+    Returns an array with one log likelihood per state
+    """
+    settings = np.asarray(settings, dtype=float)
+    P = numeric_backend.outcome_probabilities_batch(rhos, settings[:, 0] * np.pi / 90, settings[:, 1] * np.pi / 90, detector_efficiencies)
+    P = P.reshape(len(P), -1)
+    counts = np.asarray(counts, dtype=float).reshape(-1)
+    mask = counts > 0
+    return np.log(np.maximum(P[:, mask], 1e-300)) @ counts[mask]
+
+
+def compare_models(models, settings, counts, detector_efficiencies=None):
+    """
+    ranks candidate source models by how well they explain the counts
+    models: dict of name -> state vector or density matrix (e.g. from states.werner_state)
+    Returns a list of (name, log likelihood, log likelihood difference to the best model), best model first
+    """
+    names = list(models)
+    rhos = np.array([numeric_backend.density_from_state(models[name]) for name in names])
+    values = log_likelihoods(rhos, settings, counts, detector_efficiencies)
+    ranking = sorted(zip(names, values), key=lambda item: item[1], reverse=True)
+    return [(name, float(value), float(value - ranking[0][1])) for name, value in ranking]
+
+
+def save(path, rho, settings, counts):
+    """
+    saves a reconstructed density matrix together with the settings (filter degrees) and counts it was reconstructed from (.npz)
+    """
+    np.savez(path, rho=rho, settings=np.asarray(settings, dtype=float), counts=np.asarray(counts))
+
+
+def load(path):
+    """
+    loads a tomography saved with save(), returns (rho, settings, counts)
+    """
+    with np.load(path) as data:
+        return data['rho'], data['settings'], data['counts']
+
+
+def fidelity(rho, sigma):
+    """
+    fidelity (Tr sqrt(sqrt(rho) sigma sqrt(rho)))^2 between two density matrices (or a density matrix and a state vector)
+    """
+    rho = numeric_backend.density_from_state(rho)
+    sigma = numeric_backend.density_from_state(sigma)
+
+    eigenvalues, eigenvectors = np.linalg.eigh(rho)
+    sqrt_rho = eigenvectors @ np.diag(np.sqrt(np.clip(eigenvalues, 0, None))) @ eigenvectors.conj().T
+    inner = np.linalg.eigvalsh(sqrt_rho @ sigma @ sqrt_rho)
+    return float(np.sum(np.sqrt(np.clip(inner, 0, None)))**2)
@@ -0,0 +1,676 @@
+"""
+Software stand-in for the Swabian time tagger, so the TimeTaggerController can be exercised without the
+hardware (CI machines, rehearsal laptops).
+
+Time tags for the four Alice/Bob channels are generated from entangled pairs whose outcome statistics come
+from a TT_Simulator at the current filter angles. Pair rate, per channel delays, timing jitter, dark counts,
+detector efficiencies and dead time can be configured. Everything is generated in chunks with vectorized NumPy.
+
+Only the part of the TimeTagger API that the controller uses is implemented:
+createTimeTagger, ChannelEdge, Counter, Coincidences, Correlation, TimeTagStream, SynchronizedMeasurements,
+and the trigger level / input delay functions of the tagger itself.
+
+The outcome statistics only follow the rotation mounts if angle_source is wired to them (e.g. to the positions the
+KineticMountControl last reported, see the usage below). Otherwise they stay at the angles of the last
+set_filter_angles() call (filter_angles at creation), whatever the mounts do. The default simulator does not
+persist its CHSH angles (no disk cache), pass a TT_Simulator to change that.
+
+usage:
+    tagger = virtual_tagger.createTimeTagger(pair_rate=50e3, physical_delays=[0, 350, -120, 800])
+    TTC = TimeTaggerController(tagger=tagger)
+
+    # statistics following the rotators (last known positions, no serial traffic)
+    tagger = virtual_tagger.createTimeTagger(angle_source=lambda: (KMC.alice.pos_to_angle(KMC.alice.last_position),
+                                                                   KMC.bob.pos_to_angle(KMC.bob.last_position)))
+"""
+import sys
+import time
+import threading
+import weakref
+import numpy as np
+from . import states
+from .experiment_simulator import TT_Simulator
+
+# virtual channels get numbers above the physical ones (like on the real device)
+FIRST_VIRTUAL_CHANNEL = 100
+
+_EMPTY_TIMESTAMPS = np.zeros(0, dtype=np.int64)
+_EMPTY_CHANNELS = np.zeros(0, dtype=np.int32)
+
+
+class ChannelEdge:
+    Rising = 'Rising'
+    Falling = 'Falling'
+    All = 'All'
+
+
+def createTimeTagger(**kwargs):
+    """
+    same as TimeTagger.createTimeTagger(), but returns a VirtualTimeTagger (see there for the arguments).
+    Without angle_source the outcome statistics are those of filter_angles / the last set_filter_angles() call,
+    they do not follow the rotation mounts
+    """
+    return VirtualTimeTagger(**kwargs)
+
+
+def _merge(ts_a, ch_a, ts_b, ch_b):
+    ts = np.concatenate((ts_a, ts_b))
+    ch = np.concatenate((ch_a, ch_b))
+    order = np.argsort(ts, kind='stable')
+    return ts[order], ch[order]
+
+
+class VirtualTimeTagger:
+
+    def __init__(self, simulator: TT_Simulator = None, channels=(1, 2, 3, 4), pair_rate=50e3, detector_efficiencies=(1, 1, 1, 1),
+                 physical_delays=(0, 0, 0, 0), jitter_SI=30e-12, dark_count_rate=100, dead_time_SI=22e-9,
+                 filter_angles=(0, 0), angle_source=None, realtime=True, max_chunk_duration_SI=0.05, seed=None):
+        """
+        simulator: TT_Simulator that provides the outcome probabilities (phi_plus without noise and without disk cache if None)
+        channels: physical channel numbers of (Alice_T, Alice_R, Bob_T, Bob_R)
+        pair_rate: rate of emitted pairs in Hz
+        detector_efficiencies: probability that a photon arriving at each channel is detected
+        physical_delays: delays in ps of each channel (cable lengths etc.), which the delay adjustment should compensate
+        jitter_SI: rms timing jitter of each detection in s
+        dark_count_rate: dark counts per second of each channel
+        dead_time_SI: detector dead time in s
+        filter_angles: (alice, bob) filter angles in degrees, can be changed with set_filter_angles()
+        angle_source: optional function returning the current (alice, bob) filter angles in degrees, e.g. read from the rotators.
+                      If None the angles only change with set_filter_angles()
+        realtime: if True time passes like the wall clock, otherwise it only advances when a measurement is waited for
+                  (or advance() is called), so measurements finish as fast as the tags can be generated
+        seed: seed for the random number generator to make runs reproducible
+        """
+        self.simulator = simulator if simulator is not None else TT_Simulator(states.two_particle_states['phi_plus'], debug=False, cache_CHSH_angles=False)
+        self.channels = [int(ch) for ch in channels]
+        self.pair_rate = pair_rate
+        self.detector_efficiencies = dict(zip(self.channels, detector_efficiencies))
+        self.physical_delays = dict(zip(self.channels, physical_delays))
+        self.jitter_SI = jitter_SI
+        self.dark_count_rate = dark_count_rate
+        self.dead_time_SI = dead_time_SI
+        self.filter_angles = tuple(filter_angles)
+        self.angle_source = angle_source
+        self.realtime = realtime
+        self.max_chunk_duration = int(max_chunk_duration_SI * 1e12)
+        self.rng = np.random.default_rng(seed)
+
+        self.input_delays = {ch: 0 for ch in self.channels}
+        self.trigger_levels = {ch: 0.5 for ch in self.channels}
+
+        # everything registered on the tagger gets fed with the generated tags. Weak references, so that
+        # (like on the real device) measurements and virtual channels disappear once nobody holds them anymore
+        self._measurements = weakref.WeakSet()
+        self._virtual_channels = weakref.WeakSet()
+        self._next_virtual_channel = FIRST_VIRTUAL_CHANNEL
+
+        # clock and generation state (all times in ps)
+        self._lock = threading.RLock()
+        self._t0 = time.perf_counter()
+        self._virtual_now = 0
+        self._generated_until = 0
+        self._emitted_until = 0
+        self._pending_ts = _EMPTY_TIMESTAMPS
+        self._pending_ch = _EMPTY_CHANNELS
+        self._last_detection = {ch: np.iinfo(np.int64).min // 2 for ch in self.channels}
+
+    @property
+    def api(self):
+        """
+        the module holding the measurement classes for this tagger, so it can be used in place of the TimeTagger module
+        """
+        return sys.modules[__name__]
+
+    # TAGGER FUNCTIONS (same names as on the real device)
+
+    def getChannelList(self, edge=ChannelEdge.Rising):
+        return list(self.channels)
+
+    def setTriggerLevel(self, channel, voltage):
+        self.trigger_levels[channel] = voltage
+
+    def getTriggerLevel(self, channel):
+        return self.trigger_levels[channel]
+
+    def setInputDelay(self, channel, delay):
+        self.input_delays[channel] = int(delay)
+
+    def getInputDelay(self, channel):
+        return self.input_delays[channel]
+
+    # SIMULATION CONTROL
+
+    def set_filter_angles(self, alice_angle, bob_angle):
+        """
+        sets the filter angles (in degrees) used for all tags generated from now on
+        """
+        self._update()
+        self.filter_angles = (alice_angle, bob_angle)
+
+    def advance(self, duration_SI):
+        """
+        lets duration_SI seconds of virtual time pass (only for realtime=False)
+        """
+        assert not self.realtime, "time can only be advanced manually on a tagger with realtime=False"
+        self._virtual_now += int(duration_SI * 1e12)
+        self._update()
+
+    def sync(self, timeout=-1):
+        """
+        like TimeTagger.sync(): all tags up to now have been passed on to the measurements when it returns
+        """
+        self._update()
+        return True
+
+    def now(self):
+        """
+        current time of the tagger in ps
+        """
+        if self.realtime:
+            return int((time.perf_counter() - self._t0) * 1e12)
+        return self._virtual_now
+
+    # INTERNALS
+
+    def _allocate_virtual_channel(self):
+        channel = self._next_virtual_channel
+        self._next_virtual_channel += 1
+        return channel
+
+    def _register_measurement(self, measurement):
+        self._measurements.add(measurement)
+
+    def _register_virtual_channel(self, virtual_channel):
+        self._virtual_channels.add(virtual_channel)
+
+    def _unregister_virtual_channel(self, virtual_channel):
+        self._virtual_channels.discard(virtual_channel)
+
+    def _holdback(self):
+        """
+        delays and jitter move tags around, so tags are only passed on once no later generated tag can end up before them
+        """
+        max_delay = max(abs(self.physical_delays[ch] + self.input_delays[ch]) for ch in self.channels)
+        return int(max_delay + 8 * self.jitter_SI * 1e12) + 1
+
+    def _wait_until(self, t):
+        """
+        blocks until all tags before time t (ps) have been passed on to the measurements
+        """
+        if not self.realtime:
+            self._virtual_now = max(self._virtual_now, t + self._holdback())
+
+        while True:
+            self._update()
+            if self._emitted_until >= t:
+                return
+            time.sleep(max(t + self._holdback() - self.now(), 0) * 1e-12)
+
+    def _update(self):
+        """
+        generates the tags up to the current time and passes them on
+        """
+        with self._lock:
+            now = self.now()
+            while self._generated_until < now:
+                t1 = min(now, self._generated_until + self.max_chunk_duration)
+                self._process_chunk(self._generated_until, t1)
+                self._generated_until = t1
+
+    def _outcome_probabilities(self):
+        alice_angle, bob_angle = self.angle_source() if self.angle_source is not None else self.filter_angles
+        return self.simulator._outcome_probability_matrix(alice_angle * np.pi / 90, bob_angle * np.pi / 90)[0]
+
+    def _lookup(self, values, ch):
+        """
+        maps an array of physical channels to the per channel values in the dict values
+        """
+        table = np.zeros(max(self.channels) + 1, dtype=float)
+        for c in self.channels:
+            table[c] = values[c]
+        return table[ch]
+
+    def _generate(self, t0, t1):
+        """
+        generates the (unsorted) detections of all physical channels for pairs emitted in [t0, t1)
+        """
+        duration_SI = (t1 - t0) * 1e-12
+        alice_T, alice_R, bob_T, bob_R = self.channels
+
+        # entangled pairs, outcomes 0:HH, 1:HV, 2:VH, 3:VV where H is transmitted through the PBS
+        n_pairs = self.rng.poisson(self.pair_rate * duration_SI)
+        pair_times = self.rng.integers(t0, t1, n_pairs, dtype=np.int64)
+        outcomes = self.rng.choice(4, size=n_pairs, p=self._outcome_probabilities())
+        alice = np.where(outcomes < 2, alice_T, alice_R)
+        bob = np.where(outcomes % 2 == 0, bob_T, bob_R)
+
+        ts = np.concatenate((pair_times, pair_times))
+        ch = np.concatenate((alice, bob)).astype(np.int32)
+
+        # lost photons (turns some pairs into singles)
+        detected = self.rng.random(ts.size) < self._lookup(self.detector_efficiencies, ch)
+        ts, ch = ts[detected], ch[detected]
+
+        # dark counts
+        n_dark = self.rng.poisson(self.dark_count_rate * duration_SI, size=len(self.channels))
+        ts = np.concatenate((ts, self.rng.integers(t0, t1, n_dark.sum(), dtype=np.int64)))
+        ch = np.concatenate((ch, np.repeat(np.array(self.channels, dtype=np.int32), n_dark)))
+
+        # timing jitter, physical delays and the delays set on the tagger
+        ts = ts + np.rint(self.rng.normal(0, self.jitter_SI * 1e12, ts.size)).astype(np.int64)
+        ts = ts + self._lookup(self.physical_delays, ch).astype(np.int64) + self._lookup(self.input_delays, ch).astype(np.int64)
+
+        return ts, ch
+
+    def _apply_dead_time(self, ts, ch):
+        """
+        removes detections that fall into the dead time of the previous detection on the same channel
+        """
+        dead_time = int(self.dead_time_SI * 1e12)
+        if dead_time <= 0 or ts.size == 0:
+            return ts, ch
+
+        keep = np.ones(ts.size, dtype=bool)
+        for c in self.channels:
+            idx = np.flatnonzero(ch == c)
+            if idx.size == 0:
+                continue
+
+            # include the last detection of the previous chunk
+            t = np.concatenate(([self._last_detection[c]], ts[idx]))
+            alive = np.ones(t.size, dtype=bool)
+            while True:
+                kept = np.flatnonzero(alive)
+                too_close = np.diff(t[kept]) < dead_time
+                # a detection is certainly dead if the one before it is certainly alive, i.e. the first in a run of close detections
+                first = too_close & ~np.concatenate(([False], too_close[:-1]))
+                if not first.any():
+                    break
+                alive[kept[1:][first]] = False
+
+            keep[idx] = alive[1:]
+            self._last_detection[c] = t[alive][-1]
+
+        return ts[keep], ch[keep]
+
+    def _process_chunk(self, t0, t1):
+        ts, ch = self._generate(t0, t1)
+        ts, ch = _merge(self._pending_ts, self._pending_ch, ts, ch)
+
+        # hold back the tags that could still be overtaken by tags of the next chunk
+        boundary = max(t1 - self._holdback(), self._emitted_until)
+        n = np.searchsorted(ts, boundary)
+        self._pending_ts, self._pending_ch = ts[n:], ch[n:]
+        ts, ch = self._apply_dead_time(ts[:n], ch[:n])
+
+        # virtual channels first, their tags are merged into the stream the measurements see
+        for virtual_channel in list(self._virtual_channels):
+            v_ts, v_ch = virtual_channel._process(ts, ch, boundary)
+            if v_ts.size > 0:
+                ts, ch = _merge(ts, ch, v_ts, v_ch)
+
+        for measurement in list(self._measurements):
+            measurement._process(ts, ch, boundary)
+
+        self._emitted_until = boundary
+
+
+class _SynchronizedTagger:
+    """
+    what SynchronizedMeasurements.getTagger() returns. Measurements created on it belong to the SynchronizedMeasurements
+    """
+    def __init__(self, tagger, synchronized_measurements):
+        self.tagger = tagger
+        self.synchronized_measurements = synchronized_measurements
+
+
+class _Measurement:
+    """
+    base class of all measurements, handles the capture window (start, stop) and the registration on the tagger
+    """
+    def __init__(self, tagger):
+        group = None
+        if isinstance(tagger, _SynchronizedTagger):
+            tagger, group = tagger.tagger, tagger.synchronized_measurements
+
+        self.tagger = tagger
+        self._start = tagger._emitted_until
+        self._stop = None
+        self._running = False
+        self.clear()
+        tagger._register_measurement(self)
+
+        # measurements start right away, unless they are controlled by a SynchronizedMeasurements
+        if group is None:
+            self.start()
+        else:
+            group._add(self)
+
+    def _start_window(self, start, duration=None, clear=True):
+        with self.tagger._lock:
+            if clear:
+                self.clear()
+            self._start = start
+            self._stop = None if duration is None else start + int(duration)
+            self._running = True
+            self._on_start()
+
+    def start(self):
+        self.tagger._update()
+        self._start_window(self.tagger._emitted_until, clear=False)
+
+    def startFor(self, capture_duration, clear=True):
+        self.tagger._update()
+        self._start_window(self.tagger._emitted_until, capture_duration, clear=clear)
+
+    def stop(self):
+        self.tagger._update()
+        with self.tagger._lock:
+            if self._running:
+                self._stop = self.tagger._emitted_until if self._stop is None else min(self._stop, self.tagger._emitted_until)
+                self._running = False
+
+    def isRunning(self):
+        self.tagger._update()
+        return self._running
+
+    def waitUntilFinished(self, timeout=-1):
+        if self._stop is None:
+            return not self._running
+        self.tagger._wait_until(self._stop)
+        return True
+
+    def _process(self, ts, ch, until):
+        # not started yet (part of a SynchronizedMeasurements)
+        if not self._running and self._stop is None:
+            return
+
+        if self._stop is not None:
+            until = min(until, self._stop)
+            if until >= self._stop:
+                self._running = False
+
+        lo = np.searchsorted(ts, self._start)
+        hi = len(ts) if self._stop is None else np.searchsorted(ts, self._stop)
+        if until > self._start:
+            self._process_window(ts[lo:hi], ch[lo:hi], until)
+
+    # implemented by the individual measurements
+    def clear(self):
+        pass
+
+    def _on_start(self):
+        pass
+
+    def _process_window(self, ts, ch, until):
+        pass
+
+
+class Counter(_Measurement):
+
+    def __init__(self, tagger, channels, binwidth=10**9, n_values=1):
+        self.channels = list(channels)
+        self.binwidth = int(binwidth)
+        self.n_values = int(n_values)
+
+        # ring buffer of the last n_values completed bins plus the currently filling one
+        self._ring = np.zeros((len(self.channels), self.n_values + 1), dtype=np.int64)
+        self._current_bin = 0
+        super().__init__(tagger)
+
+    def clear(self):
+        self._ring[:] = 0
+        self._current_bin = 0
+
+    def _on_start(self):
+        self._ring[:] = 0
+        self._current_bin = 0
+
+    def _process_window(self, ts, ch, until):
+        size = self.n_values + 1
+        new_current = (until - self._start) // self.binwidth
+
+        # zero the bins that were started since the last call
+        if new_current - self._current_bin >= size:
+            self._ring[:] = 0
+        else:
+            for b in range(self._current_bin + 1, new_current + 1):
+                self._ring[:, b % size] = 0
+        self._current_bin = new_current
+
+        bins = (ts - self._start) // self.binwidth
+        recent = bins > new_current - size
+        for i, c in enumerate(self.channels):
+            mask = recent & (ch == c)
+            np.add.at(self._ring[i], bins[mask] % size, 1)
+
+    def getIndex(self):
+        return np.arange(self.n_values, dtype=np.int64) * self.binwidth
+
+    def getData(self, rolling=True):
+        """
+        counts of the last n_values completed bins of each channel (oldest first), shape (channels, n_values)
+        """
+        self.tagger._update()
+        with self.tagger._lock:
+            bins = np.arange(self._current_bin - self.n_values, self._current_bin)
+            data = np.zeros((len(self.channels), self.n_values), dtype=np.int32)
+            valid = bins >= 0
+            data[:, valid] = self._ring[:, bins[valid] % (self.n_values + 1)]
+        return data
+
+
+class Coincidences:
+
+    def __init__(self, tagger, coincidenceGroups, coincidenceWindow=1000):
+        self.tagger = tagger
+        self.groups = [tuple(group) for group in coincidenceGroups]
+        assert all(len(group) == 2 for group in self.groups), "the virtual tagger only supports two-fold coincidences"
+        self.coincidence_window = int(coincidenceWindow)
+        self._channels = [tagger._allocate_virtual_channel() for _ in self.groups]
+
+        # tags near the end of the previous chunk, so coincidences across chunk borders are found
+        self._tail_ts = _EMPTY_TIMESTAMPS
+        self._tail_ch = _EMPTY_CHANNELS
+        self._processed_until = tagger._emitted_until
+        tagger._register_virtual_channel(self)
+
+    def getChannels(self):
+        return list(self._channels)
+
+    def stop(self):
+        """
+        stops generating coincidence tags (the virtual channel numbers are not reused)
+        """
+        with self.tagger._lock:
+            self.tagger._unregister_virtual_channel(self)
+
+    def _process(self, ts, ch, until):
+        all_ts = np.concatenate((self._tail_ts, ts))
+        all_ch = np.concatenate((self._tail_ch, ch))
+
+        out_ts = []
+        out_ch = []
+        for virtual_channel, (channel_a, channel_b) in zip(self._channels, self.groups):
+            ta = all_ts[all_ch == channel_a]
+            tb = all_ts[all_ch == channel_b]
+            if ta.size == 0 or tb.size == 0:
+                continue
+
+            # nearest tag of channel b for every tag of channel a
+            i = np.searchsorted(tb, ta)
+            left = tb[np.clip(i - 1, 0, tb.size - 1)]
+            right = tb[np.clip(i, 0, tb.size - 1)]
+            nearest = np.where(np.abs(ta - left) <= np.abs(right - ta), left, right)
+
+            # the coincidence gets the timestamp of the later tag, only report the ones that are new
+            hit = np.abs(nearest - ta) <= self.coincidence_window
+            t_coincidence = np.maximum(ta, nearest)[hit]
+            t_coincidence = t_coincidence[t_coincidence >= self._processed_until]
+
+            out_ts.append(t_coincidence)
+            out_ch.append(np.full(t_coincidence.size, virtual_channel, dtype=np.int32))
+
+        keep = all_ts >= until - self.coincidence_window
+        self._tail_ts, self._tail_ch = all_ts[keep], all_ch[keep]
+        self._processed_until = until
+
+        if not out_ts:
+            return _EMPTY_TIMESTAMPS, _EMPTY_CHANNELS
+        out_ts = np.concatenate(out_ts)
+        out_ch = np.concatenate(out_ch)
+        order = np.argsort(out_ts, kind='stable')
+        return out_ts[order], out_ch[order]
+
+
+class Correlation(_Measurement):
+
+    def __init__(self, tagger, channel_1, channel_2, binwidth=1000, n_bins=1000):
+        self.channel_1 = channel_1
+        self.channel_2 = channel_2
+        self.binwidth = int(binwidth)
+        self.n_bins = int(n_bins)
+        self._half_range = self.n_bins * self.binwidth // 2
+        self._histogram = np.zeros(self.n_bins, dtype=np.int64)
+        self._on_start()
+        super().__init__(tagger)
+
+    def clear(self):
+        self._histogram[:] = 0
+
+    def _on_start(self):
+        self._tail_1 = _EMPTY_TIMESTAMPS
+        self._tail_2 = _EMPTY_TIMESTAMPS
+        self._processed_until = getattr(self, '_start', 0)
+
+    def _process_window(self, ts, ch, until):
+        t1 = np.concatenate((self._tail_1, ts[ch == self.channel_1]))
+        t2 = np.concatenate((self._tail_2, ts[ch == self.channel_2]))
+
+        # all pairs (t1, t2) with t2 - t1 inside the histogram range
+        lo = np.searchsorted(t2, t1 - self._half_range)
+        hi = np.searchsorted(t2, t1 + self._half_range)
+        n_partners = hi - lo
+        first = np.repeat(np.arange(t1.size), n_partners)
+        second = lo[first] + np.arange(n_partners.sum()) - np.repeat(np.cumsum(n_partners) - n_partners, n_partners)
+
+        # only count pairs that were not complete in the previous chunk already
+        new = np.maximum(t1[first], t2[second]) >= self._processed_until
+        # time difference t_1 - t_2, which is how performDelayAdjustment reads the histograms of the real device
+        bins = (t1[first][new] - t2[second][new] + self._half_range) // self.binwidth
+        bins = bins[(bins >= 0) & (bins < self.n_bins)]
+        self._histogram += np.bincount(bins, minlength=self.n_bins)
+
+        self._tail_1 = t1[t1 >= until - self._half_range]
+        self._tail_2 = t2[t2 >= until - self._half_range]
+        self._processed_until = until
+
+    def getIndex(self):
+        return (np.arange(self.n_bins, dtype=np.int64) - self.n_bins // 2) * self.binwidth
+
+    def getData(self):
+        self.tagger._update()
+        with self.tagger._lock:
+            return self._histogram.copy()
+
+
+class TimeTagStreamBuffer:
+    """
+    what TimeTagStream.getData() returns
+    """
+    def __init__(self, timestamps, channels, has_overflows=False):
+        self._timestamps = timestamps
+        self._channels = channels
+        self.size = timestamps.size
+        self.hasOverflows = has_overflows
+
+    def getTimestamps(self):
+        return self._timestamps
+
+    def getChannels(self):
+        return self._channels
+
+
+class TimeTagStream(_Measurement):
+
+    def __init__(self, tagger, n_max_events, channels):
+        self.n_max_events = int(n_max_events)
+        self.channels = np.array(list(channels), dtype=np.int32)
+        super().__init__(tagger)
+
+    def clear(self):
+        self._ts = []
+        self._ch = []
+        self._n = 0
+        self._overflow = False
+
+    def _process_window(self, ts, ch, until):
+        mask = np.isin(ch, self.channels)
+        ts, ch = ts[mask], ch[mask]
+
+        # like the real device, events that do not fit into the buffer any more are dropped
+        free = self.n_max_events - self._n
+        if ts.size > free:
+            ts, ch = ts[:free], ch[:free]
+            self._overflow = True
+
+        if ts.size > 0:
+            self._ts.append(ts)
+            self._ch.append(ch)
+            self._n += ts.size
+
+    def getData(self):
+        """
+        returns all tags since the last call (and removes them from the buffer)
+        """
+        self.tagger._update()
+        with self.tagger._lock:
+            ts = np.concatenate(self._ts) if self._ts else _EMPTY_TIMESTAMPS
+            ch = np.concatenate(self._ch) if self._ch else _EMPTY_CHANNELS
+            overflow = self._overflow
+            self.clear()
+        return TimeTagStreamBuffer(ts, ch, overflow)
+
+
+class SynchronizedMeasurements:
+
+    def __init__(self, tagger):
+        self.tagger = tagger
+        self._measurements = []
+        self._proxy = _SynchronizedTagger(tagger, self)
+
+    def _add(self, measurement):
+        self._measurements.append(measurement)
+
+    def getTagger(self):
+        return self._proxy
+
+    def start(self):
+        self.tagger._update()
+        with self.tagger._lock:
+            for measurement in self._measurements:
+                measurement._start_window(self.tagger._emitted_until, clear=False)
+
+    def startFor(self, capture_duration, clear=True):
+        # all measurements get exactly the same capture window
+        self.tagger._update()
+        with self.tagger._lock:
+            for measurement in self._measurements:
+                measurement._start_window(self.tagger._emitted_until, capture_duration, clear=clear)
+
+    def stop(self):
+        for measurement in self._measurements:
+            measurement.stop()
+
+    def clear(self):
+        with self.tagger._lock:
+            for measurement in self._measurements:
+                measurement.clear()
+
+    def isRunning(self):
+        return any(measurement.isRunning() for measurement in self._measurements)
+
+    def waitUntilFinished(self, timeout=-1):
+        for measurement in self._measurements:
+            measurement.waitUntilFinished(timeout)
+        return True
@@ -0,0 +1,24 @@
+import pytest
+import serial
+from fake_elliptec import FakeSerial
+from src.time_tagger import disk_cache
+
+
+@pytest.fixture(autouse=True, scope='session')
+def cache_directory(tmp_path_factory):
+    """
+    the result caches of the tests are persisted in a temporary directory instead of the user's cache directory
+    """
+    disk_cache.set_default_directory(str(tmp_path_factory.mktemp('cache')))
+    yield
+    disk_cache.set_default_directory(None)
+
+
+@pytest.fixture
+def fake_ports(monkeypatch):
+    """
+    replaces serial.Serial, the returned dict maps port names to the FakeBus on them
+    """
+    monkeypatch.setattr(serial, 'Serial', FakeSerial)
+    monkeypatch.setattr(FakeSerial, 'buses', {})
+    return FakeSerial.buses
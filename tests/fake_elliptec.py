@@ -0,0 +1,98 @@
+"""
+Fake serial port with Elliptec devices on it, for testing the elliptec package and the KineticMountControl
+without hardware. Replies to in, gp, gs, ma, ho and ca; replies that overlap on the bus are garbled.
+"""
+import threading
+import serial
+
+
+class FakeBus:
+    """
+    the devices on one port
+    addresses: addresses (0-F strings) of the devices
+    reply_delay: time in s until a device replies
+    move_time: time in s a move takes
+    """
+    def __init__(self, addresses=("0",), reply_delay=0.005, move_time=0.02):
+        self.positions = {address: 0 for address in addresses}
+        self.reply_delay = reply_delay
+        self.move_time = move_time
+        self.writes = []
+        self.output = b""
+        self.condition = threading.Condition()
+        # replies that are not on the bus yet, a new reply while one is pending collides with it
+        self._pending = []
+        self.garble_next = set()
+
+    def handle(self, command):
+        self.writes.append(command)
+        address, code, message = command[:1].decode(), command[1:3].decode(), command[3:].decode()
+        if address not in self.positions:
+            return
+
+        if code == "in":
+            self._reply(f"{address}IN0E1140012320231701016800023000", self.reply_delay, address)
+        elif code == "gp":
+            self._reply(f"{address}PO{self.positions[address] & 0xFFFFFFFF:08X}", self.reply_delay, address)
+        elif code == "gs":
+            self._reply(f"{address}GS00", self.reply_delay, address)
+        elif code in ("ma", "ho"):
+            position = int(message, 16) if code == "ma" else 0
+            if position >= 2**31:
+                position -= 2**32
+            self.positions[address] = position
+            self._reply(f"{address}PO{position & 0xFFFFFFFF:08X}", self.move_time, address)
+        elif code == "ca":
+            self.positions[message] = self.positions.pop(address)
+            self._reply(f"{message}GS00", self.reply_delay, address)
+
+    def _reply(self, text, delay, address):
+        reply = {"data": text.encode() + b"\r\n", "garbled": address in self.garble_next}
+        self.garble_next.discard(address)
+        with self.condition:
+            if self._pending:
+                reply["garbled"] = True
+                for other in self._pending:
+                    other["garbled"] = True
+            self._pending.append(reply)
+        threading.Timer(delay, self._send, args=(reply,)).start()
+
+    def _send(self, reply):
+        with self.condition:
+            self._pending.remove(reply)
+            # a garbled reply keeps its length but loses its address
+            self.output += b"\x00" + reply["data"][1:] if reply["garbled"] else reply["data"]
+            self.condition.notify_all()
+
+
+class FakeSerial:
+    """
+    stand-in for serial.Serial on the FakeBus of the port
+    """
+    buses = {}
+
+    def __init__(self, port, timeout=2, **kwargs):
+        if port not in FakeSerial.buses:
+            raise serial.SerialException(f"could not open port {port}")
+        self.port = port
+        self.timeout = timeout
+        self.is_open = True
+        self.bus = FakeSerial.buses[port]
+
+    @property
+    def in_waiting(self):
+        return len(self.bus.output)
+
+    def write(self, data):
+        self.bus.handle(data)
+        return len(data)
+
+    def read(self, size=1):
+        with self.bus.condition:
+            if not self.bus.output:
+                self.bus.condition.wait(self.timeout)
+            data, self.bus.output = self.bus.output[:size], self.bus.output[size:]
+            return data
+
+    def close(self):
+        self.is_open = False
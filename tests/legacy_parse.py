@@ -0,0 +1,72 @@
+"""
+The original string based parser of elliptec replies, kept as the reference parse() is tested
+(and benchmarked, see benchmarks/elliptec_parse.py) against.
+"""
+from src.elliptec.tools import is_null_or_empty, is_metric, s32
+
+
+def parse_legacy(msg, debug=True):
+    """Parses the message from the controller (the string based implementation parse() replaced)."""
+    if is_null_or_empty(msg):
+        if debug:
+            print("Parse: Status/Response may be incomplete!")
+            print("Parse: Message:", msg)
+        return None
+    msg = msg.decode().strip()
+    code = msg[1:3]
+    try:
+        _ = int(msg[0], 16)
+    except ValueError as exc:
+        raise ValueError(f"Invalid Address: {msg[0]}.") from exc
+    addr = msg[0]
+
+    if code.upper() == "IN":
+        info = {
+            "Address": addr,
+            "Motor Type": int(msg[3:5], 16),
+            "Serial No.": msg[5:13],
+            "Year": msg[13:17],
+            "Firmware": msg[17:19],
+            "Thread": is_metric(msg[19]),
+            "Hardware": msg[20],
+            "Range": (int(msg[21:25], 16)),
+            "Pulse/Rev": (int(msg[25:], 16)),
+        }
+        return info
+
+    elif code.upper() in ["PO", "BO", "HO", "GJ"]:
+        pos = msg[3:]
+        return (addr, code, (s32(int(pos, 16))))
+
+    elif code.upper() == "GS":
+        errcode = msg[3:]
+        return (addr, code, str(int(errcode, 16)))
+
+    elif code.upper() in ["I1", "I2"]:
+        # Info about motor
+
+        # Period=14740000/frequency for backward and forward motor movements
+        # And 1 Amp of current is equal to 1866 points (1 point is 0.54 mA circa)
+
+        info = {
+            "Address": addr,
+            "Loop": msg[3],  # The state of the loop setting (1 = ON, 0 = OFF)
+            "Motor": msg[4],  # The state of the motor (1 = ON, 0 = OFF)
+            "Current": int(msg[5:9], 16) / 1866,  # 1866 points is 1 amp
+            "Ramp up": int(msg[9:13], 16),  # PWM increase every ms
+            "Ramp down": int(msg[13:17], 16),  # PWM decrease every ms
+            "Forward period": int(msg[17:21], 16),  # Forward period value
+            "Backward period": int(msg[21:25], 16),  # Backward period value
+            "Forward frequency": 14740000 / int(msg[17:21], 16),  # Calculated forward frequency
+            "Backward frequency": 14740000 / int(msg[21:25], 16),  # Calculated forward frequency
+        }
+        return info
+
+    else:
+        return (addr, code, msg[3:])
+
+
+# one reply of every code the mounts send
+MESSAGES = [b"1PO00004600\r\n", b"2PO0000FFFF\r\n", b"1BOFFFFB9FA\r\n", b"0HO00000000\r\n", b"0GJ00002300\r\n",
+            b"0GS00\r\n", b"0GS0C\r\n", b"0IN0E1140012320231701016800023000\r\n",
+            b"0I1110085000F000F00AB00AB\r\n", b"0I2010085000F000F00AB00AB\r\n", b"0XYABC\r\n"]
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+from src.time_tagger import chsh_optimizer, states
+
+
+def test_cached_angles_are_reused_until_the_source_changes(monkeypatch):
+    S_grid = chsh_optimizer.S_grid
+    calls = []
+    monkeypatch.setattr(chsh_optimizer, 'S_grid', lambda *args: calls.append(args) or S_grid(*args))
+
+    rho = states.werner_state(0.9)
+    S, angles = chsh_optimizer.find_CHSH_angles(rho)
+    assert S == pytest.approx(0.9 * 2 * np.sqrt(2), abs=1e-6)
+    assert len(calls) == 1
+
+    assert chsh_optimizer.find_CHSH_angles(rho)[0] == S
+    assert len(calls) == 1
+
+    # different code (source version): the cache entry is not used anymore
+    monkeypatch.setattr(chsh_optimizer, '_source_version', 'edited')
+    assert chsh_optimizer.find_CHSH_angles(rho)[0] == pytest.approx(S)
+    assert len(calls) == 2
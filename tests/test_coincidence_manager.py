@@ -0,0 +1,41 @@
+import pytest
+from src.time_tagger import virtual_tagger
+from src.time_tagger.coincidence_manager import CoincidenceChannelManager
+
+
+@pytest.fixture
+def manager():
+    tagger = virtual_tagger.createTimeTagger(realtime=False)
+    return CoincidenceChannelManager(virtual_tagger, tagger, max_active=1)
+
+
+def test_reuse(manager):
+    vchannels = manager.get([[1, 3]], 1e-9)
+    assert manager.get([(1, 3)], 1e-9) is vchannels
+    assert manager.users(vchannels) == 2
+
+
+def test_channels_in_use_are_not_freed(manager):
+    tagger = manager.tagger
+    first = manager.get([[1, 3]], 1e-9)
+    second = manager.get([[1, 4]], 1e-9)
+    # both are in use, so the eviction is deferred
+    assert len(manager) == 2
+
+    manager.release(first)
+    assert len(manager) == 1
+    assert first not in tagger._virtual_channels and second in tagger._virtual_channels
+    with pytest.raises(RuntimeError):
+        manager.release(first)
+
+
+def test_clear(manager):
+    vchannels = manager.get([[1, 3]], 1e-9)
+    manager.hold(vchannels)
+    with pytest.raises(RuntimeError):
+        manager.clear()
+
+    manager.release(vchannels)
+    manager.release(vchannels)
+    manager.clear()
+    assert len(manager) == 0
@@ -0,0 +1,78 @@
+import time
+import numpy as np
+import pytest
+from src.time_tagger import states, virtual_tagger
+from src.time_tagger.experiment_simulator import TT_Simulator
+from src.time_tagger.time_tagger_controller import TimeTaggerController
+
+
+class FakeKMC:
+    """
+    moves the filters of the virtual tagger instantly
+    """
+    def __init__(self, tagger):
+        self.tagger = tagger
+        self.moves = []
+
+    def rotate_simulataneously(self, alice_angle, bob_angle, **kwargs):
+        self.moves.append((alice_angle, bob_angle))
+        self.tagger.set_filter_angles(alice_angle, bob_angle)
+
+    async def rotate_simultaneously_async(self, alice_angle, bob_angle):
+        self.rotate_simulataneously(alice_angle, bob_angle)
+
+    def home(self):
+        self.rotate_simulataneously(0, 0)
+
+
+@pytest.fixture(scope='module')
+def simulator():
+    return TT_Simulator(states.two_particle_states['phi_plus'], debug=False, cache_CHSH_angles=False)
+
+
+def controller(simulator, physical_delays=(0, 0, 0, 0), kmc=True):
+    tagger = virtual_tagger.createTimeTagger(simulator=simulator, pair_rate=100e3, physical_delays=physical_delays, realtime=False, seed=4)
+    TTC = TimeTaggerController(FakeKMC(tagger) if kmc else None, tagger=tagger)
+    TTC.set_alice_transmission_channel(1)
+    TTC.set_alice_reflection_channel(2)
+    TTC.set_bob_transmission_channel(3)
+    TTC.set_bob_reflection_channel(4)
+    return TTC
+
+
+def test_measureS(simulator):
+    TTC = controller(simulator)
+    start = time.perf_counter()
+    result = TTC.measureS(simulator.CHSH_angles_for_filters, coincidence_window_SI=1e-9, integration_time_per_basis_setting_SI=0.05, debug=False)
+    assert time.perf_counter() - start < 1
+
+    assert result.S == pytest.approx(simulator.S, abs=5 * result.S_uncertainty)
+    assert len(result.settings) == 4
+    assert TTC.KMC.moves[-1] == (0, 0)
+
+
+def test_measure_S_with_two_ports(simulator):
+    TTC = controller(simulator)
+    result = TTC.measure_S_with_two_ports(simulator.CHSH_angles_for_filters, coincidence_window_SI=1e-9, integration_time_per_basis_setting_SI=0.02, debug=False)
+
+    assert len(result.settings) == 16
+    assert np.allclose(result.S, simulator.S, atol=0.15)
+
+
+def test_calibrateDelays(simulator):
+    physical_delays = [0, 350, -120, 800]
+    # without KMC (it would wait a second for the mounts), the filters are set on the tagger instead
+    TTC = controller(simulator, physical_delays=physical_delays, kmc=False)
+    TTC.tagger.set_filter_angles(22.5, 0)
+
+    delays, uncertainties = TTC.calibrateDelays(target_uncertainty_ps=5, slice_time=0.05, set=False, debug=False)
+    assert np.allclose(delays, physical_delays, atol=np.maximum(4 * np.asarray(uncertainties), 10))
+
+
+def test_simulated_measureS_is_reproducible(simulator):
+    results = [controller(simulator).measureS(simulator.CHSH_angles_for_filters, integration_time_per_basis_setting_SI=0.01,
+                                             TTSimulator=simulator, debug=False, rng=seed) for seed in [11, 11, 12]]
+    counts = [[setting.counts.tolist() for setting in result.settings] for result in results]
+    assert counts[0] == counts[1] != counts[2]
+    # a seed gives different counts for the different settings, not the same draw every time
+    assert len({tuple(c) for c in counts[0]}) == 4
@@ -0,0 +1,46 @@
+import os
+import pytest
+from src.time_tagger import disk_cache
+from src.time_tagger.disk_cache import DiskCache
+
+
+@pytest.fixture(autouse=True)
+def no_default_directory(monkeypatch):
+    # undo the temporary cache directory of conftest, these tests check where the caches go without it
+    monkeypatch.setattr(disk_cache, '_default_directory', None)
+
+
+def test_persisted_by_default(monkeypatch, tmp_path):
+    monkeypatch.delenv(disk_cache.ENVIRONMENT_VARIABLE, raising=False)
+    monkeypatch.setattr(disk_cache, 'DEFAULT_DIRECTORY', str(tmp_path / 'user_cache'))
+    DiskCache('results').set('key', {'angles': (1, 2)})
+
+    assert (tmp_path / 'user_cache' / 'results' / 'key.json').exists()
+    # a new cache (e.g. in the next session) reads it back
+    assert DiskCache('results').get('key') == {'angles': [1, 2]}
+
+
+def test_directory_from_environment(monkeypatch, tmp_path):
+    monkeypatch.setenv(disk_cache.ENVIRONMENT_VARIABLE, str(tmp_path / 'env'))
+    cache = DiskCache('results')
+    cache.set('key', 1)
+    assert (tmp_path / 'env' / 'results' / 'key.json').exists()
+
+    disk_cache.set_default_directory(str(tmp_path / 'default'))
+    assert 'key' not in cache
+    cache.set('key', 2)
+    assert DiskCache('results', directory=str(tmp_path / 'default')).get('key') == 2
+
+
+def test_opt_out(monkeypatch, tmp_path):
+    monkeypatch.setenv(disk_cache.ENVIRONMENT_VARIABLE, disk_cache.MEMORY_ONLY)
+    monkeypatch.setattr(disk_cache, 'DEFAULT_DIRECTORY', str(tmp_path))
+    cache = DiskCache('results')
+
+    assert cache.directory is None
+    cache.set('key', {'angles': (1, 2)})
+    assert 'key' in cache and cache.get('key') == {'angles': [1, 2]}
+    assert os.listdir(tmp_path) == []
+
+    cache.clear()
+    assert cache.get('key', 'missing') == 'missing'
@@ -0,0 +1,27 @@
+import pytest
+from src.elliptec.tools import parse
+from legacy_parse import parse_legacy, MESSAGES
+
+# every reply code, in the case variants the devices may use, and values with the sign bit set
+REPLIES = MESSAGES + [b"1po00004600\r\n", b"1Po80000000\r\n", b"AbOFFFFFFFF\r\n", b"fGS0C\r\n", b"3gs01\r\n",
+                      b"0hO7FFFFFFF\r\n", b"0gj00000001\r\n", b"0in0E1140012320231701016800023000\r\n",
+                      b"0i1110085000F000F00AB00AB\r\n", b"2ABsomething \r\n"]
+# replies with stray whitespace in front of the address, which the legacy parser stripped
+REPLIES += [b"\n1PO00004600\r\n", b" \r\n0GS0C\r\n", b"\t 0IN0E1140012320231701016800023000\r\n", b"\r\n0XYABC\r\n"]
+
+
+@pytest.mark.parametrize('message', REPLIES)
+def test_parse_matches_legacy(message):
+    assert parse(message, debug=False) == parse_legacy(message, debug=False)
+
+
+@pytest.mark.parametrize('message', [b"", b"0PO0000", b"0PO00004600\n", b"\r\n"])
+def test_incomplete_messages(message):
+    assert parse(message, debug=False) is None
+
+
+def test_invalid_address():
+    with pytest.raises(ValueError):
+        parse(b"XPO00004600\r\n", debug=False)
+    with pytest.raises(ValueError):
+        parse_legacy(b"XPO00004600\r\n", debug=False)
@@ -0,0 +1,57 @@
+import time
+import src.elliptec as elliptec
+from fake_elliptec import FakeBus
+
+
+def probe(fake_ports, bus, **kwargs):
+    fake_ports['COM1'] = bus
+    controller = elliptec.Controller('COM1', debug=False)
+    try:
+        return [info['Address'] for info in elliptec.probe_addresses(controller, 0, 3, **kwargs)]
+    finally:
+        controller.close_connection()
+
+
+def probed_addresses(bus):
+    return [command[:1].decode() for command in bus.writes]
+
+
+def test_first_only_picks_the_lowest_address(fake_ports):
+    bus = FakeBus(addresses=('2', '1'))
+    assert probe(fake_ports, bus) == ['1']
+    assert probed_addresses(bus) == ['0', '1']
+
+
+def test_all_addresses_without_collisions(fake_ports):
+    # replies that overlap on the bus are garbled, so this only works if the probes are sent one at a time
+    bus = FakeBus(addresses=('3', '1', '2'))
+    assert probe(fake_ports, bus, first_only=False) == ['1', '2', '3']
+    assert probed_addresses(bus) == ['0', '1', '2', '3']
+
+
+def test_garbled_reply_is_retried(fake_ports):
+    bus = FakeBus(addresses=('1',))
+    bus.garble_next.add('1')
+    assert probe(fake_ports, bus) == ['1']
+    assert probed_addresses(bus) == ['0', '1', '1']
+
+
+def test_empty_port(fake_ports):
+    bus = FakeBus(addresses=())
+    start = time.perf_counter()
+    assert probe(fake_ports, bus, probe_timeout=0.02) == []
+    # every address is asked once, with the short probe timeout
+    assert probed_addresses(bus) == ['0', '1', '2', '3']
+    assert time.perf_counter() - start < 1
+
+
+def test_discover_devices(fake_ports):
+    fake_ports['COM1'] = FakeBus(addresses=('0',))
+    fake_ports['COM2'] = FakeBus(addresses=())
+    fake_ports['COM3'] = FakeBus(addresses=('2',))
+
+    inventory = elliptec.discover_devices(['COM1', 'COM2', 'COM3'], probe_timeout=0.02, debug=False)
+    assert [(device['port'], device['info']['Address']) for device in inventory] == [('COM1', '0'), ('COM3', '2')]
+    assert all(device['controller'].s.is_open for device in inventory)
+    for device in inventory:
+        device['controller'].close_connection()
@@ -0,0 +1,32 @@
+import numpy as np
+from src.time_tagger import states
+from src.time_tagger.experiment_simulator import TT_Simulator
+
+
+def simulator(**kwargs):
+    return TT_Simulator(states.two_particle_states['phi_plus'], debug=False, cache_CHSH_angles=False, **kwargs)
+
+
+def draws(sim):
+    return (sim.measure_n_entangled_pairs_filter_angles(1000, 0, 22.5).tolist(),
+            sim.measure_n_entangled_pairs_batch(100, [0, 0.3], [0.1, 0.7]).tolist(),
+            [sim._measure_entangled_pair(0, 0.4) for _ in range(20)])
+
+
+def test_seed_makes_runs_reproducible():
+    assert draws(simulator(seed=7)) == draws(simulator(seed=7))
+    assert draws(simulator(seed=7)) != draws(simulator(seed=8))
+
+
+def test_global_seed_is_honored():
+    np.random.seed(3)
+    first = draws(simulator())
+    np.random.seed(3)
+    assert draws(simulator()) == first
+
+
+def test_consecutive_calls_continue_the_generator():
+    sim = simulator(seed=1)
+    assert sim.measure_n_entangled_pairs(1000, 0, 0.5).tolist() != sim.measure_n_entangled_pairs(1000, 0, 0.5).tolist()
+    # an explicit rng is used instead of the simulator's generator
+    assert (sim.measure_n_entangled_pairs(1000, 0, 0.5, rng=5) == sim.measure_n_entangled_pairs(1000, 0, 0.5, rng=5)).all()
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from src.time_tagger import states
+from src.time_tagger.experiment_simulator import TT_Simulator
+
+ANGLES = np.linspace(-np.pi, np.pi, 7)
+
+
+def simulators(state_name, noise_q, noise_vis, detector_efficiencies):
+    return [TT_Simulator(states.two_particle_states[state_name], initial_state_noise_q=noise_q, initial_state_noise_vis=noise_vis,
+                         detector_efficiencies=detector_efficiencies, backend=backend, debug=False, cache_CHSH_angles=False)
+            for backend in ['numeric', 'sympy']]
+
+
+@pytest.mark.parametrize('state_name, noise_q, noise_vis, detector_efficiencies', [
+    ('phi_plus', 0, 1, [1, 1, 1, 1]),
+    ('psi_minus', 0.1, 0.9, [0.9, 0.7, 1, 0.8]),
+])
+def test_numeric_backend_matches_sympy(state_name, noise_q, noise_vis, detector_efficiencies):
+    numeric, symbolic = simulators(state_name, noise_q, noise_vis, detector_efficiencies)
+
+    theta_a, theta_b = [grid.ravel() for grid in np.meshgrid(ANGLES, ANGLES)]
+    assert np.allclose(numeric._compute_outcome_probability_matrix(theta_a, theta_b),
+                       symbolic._compute_outcome_probability_matrix(theta_a, theta_b), atol=1e-9)
+
+    for a, b in zip(theta_a, theta_b):
+        assert numeric.correlation_function_lambdified(a, b) == pytest.approx(float(symbolic.correlation_function_lambdified(a, b)), abs=1e-9)
+
+    assert numeric.S == pytest.approx(symbolic.S, abs=1e-6)
+    angles = numeric.CHSH_angles_for_filters
+    assert numeric.S_for_fixed_angles(*angles) == pytest.approx(symbolic.S_for_fixed_angles(*angles), abs=1e-9)
@@ -0,0 +1,17 @@
+import os
+from src.time_tagger import parameter_sweep, states
+from src.time_tagger.experiment_simulator import TT_Simulator
+
+
+def test_points_are_persisted_in_cache_dir(tmp_path, capsys):
+    state = states.two_particle_states['phi_plus']
+    first = TT_Simulator.sweep_parameters(state, noise_q=(0, 0.1), cache_dir=str(tmp_path), debug=True)
+    assert len(os.listdir(tmp_path / 'parameter_sweep')) == 2
+
+    # a later sweep (e.g. in the next session) only reads them back
+    second = parameter_sweep.sweep(state, noise_q=(0, 0.1), cache_dir=str(tmp_path), debug=True)
+    assert capsys.readouterr().out.splitlines()[-1] == "2 points, 2 cached, evaluating 0"
+    assert second.measured_S.tolist() == first.measured_S.tolist()
+
+    parameter_sweep.clear_cache(cache_dir=str(tmp_path))
+    assert os.listdir(tmp_path / 'parameter_sweep') == []
@@ -0,0 +1,37 @@
+import itertools
+import numpy as np
+import pytest
+from src.kinetic_mount_controller.setting_planner import plan_setting_order, path_cost, SettingPlanner
+
+
+def brute_force_cost(settings, start, end):
+    return min(path_cost(settings, order, start, end) for order in itertools.permutations(range(len(settings))))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_plan_setting_order_is_optimal(seed):
+    rng = np.random.default_rng(seed)
+    n = rng.integers(2, 8)
+    settings = [tuple(setting) for setting in rng.choice(np.arange(0, 180, 7.5), size=(n, 2))]
+    start, end = (0, 0), tuple(rng.choice(np.arange(0, 90, 22.5), size=2))
+
+    order = plan_setting_order(settings, start, end)
+    assert sorted(order) == list(range(n))
+    assert path_cost(settings, order, start, end) == pytest.approx(brute_force_cost(settings, start, end))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_heuristic_visits_every_setting(seed):
+    rng = np.random.default_rng(seed)
+    settings = [tuple(setting) for setting in rng.uniform(0, 180, size=(7, 2))]
+
+    # exact_limit=0 forces nearest neighbour + 2-opt, which is never better than the optimum
+    order = plan_setting_order(settings, exact_limit=0)
+    assert sorted(order) == list(range(7))
+    assert path_cost(settings, order) >= brute_force_cost(settings, (0, 0), (0, 0)) - 1e-9
+
+
+def test_chsh_settings():
+    settings = [(0, 11.25), (0, 33.75), (22.5, 11.25), (22.5, 33.75)]
+    order = SettingPlanner().order(settings)
+    assert path_cost(settings, order) == pytest.approx(brute_force_cost(settings, (0, 0), (0, 0)))
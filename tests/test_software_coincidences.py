@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from src.time_tagger import virtual_tagger
+from src.time_tagger.software_coincidences import count_coincidences, count_coincidences_chunks
+
+GROUPS = [(1, 3), (1, 4), (2, 3), (2, 4)]
+
+
+def record(tagger, channels, duration_SI, n_chunks):
+    stream = virtual_tagger.TimeTagStream(tagger, n_max_events=10**7, channels=channels)
+    chunks = []
+    for _ in range(n_chunks):
+        tagger.advance(duration_SI / n_chunks)
+        data = stream.getData()
+        chunks.append((data.getTimestamps(), data.getChannels()))
+    return chunks
+
+
+@pytest.mark.parametrize('window_SI', [0.5e-9, 2e-9])
+def test_software_coincidences_match_virtual_coincidences(window_SI):
+    tagger = virtual_tagger.createTimeTagger(pair_rate=200e3, dark_count_rate=2e4, physical_delays=(0, 300, -200, 500),
+                                             filter_angles=(0, 22.5), realtime=False, seed=1)
+    coincidences = virtual_tagger.Coincidences(tagger, GROUPS, coincidenceWindow=int(round(window_SI * 1e12)))
+    virtual_channels = coincidences.getChannels()
+
+    chunks = record(tagger, [1, 2, 3, 4] + virtual_channels, duration_SI=0.2, n_chunks=7)
+    timestamps = np.concatenate([ts for ts, _ in chunks])
+    channels = np.concatenate([ch for _, ch in chunks])
+
+    virtual_counts = [np.count_nonzero(channels == channel) for channel in virtual_channels]
+    raw = np.isin(channels, [1, 2, 3, 4])
+    counts = count_coincidences(timestamps[raw], channels[raw], GROUPS, window_SI, chunk_size=10007)[:, 0, 0]
+
+    assert min(virtual_counts) > 100
+    assert counts.tolist() == virtual_counts
+
+    # the same counts when the tags are passed on in the chunks they were recorded in
+    raw_chunks = [(ts[np.isin(ch, [1, 2, 3, 4])], ch[np.isin(ch, [1, 2, 3, 4])]) for ts, ch in chunks]
+    assert count_coincidences_chunks(raw_chunks, GROUPS, window_SI)[:, 0, 0].tolist() == virtual_counts
+
+
+def test_offsets_and_windows_in_one_pass():
+    tagger = virtual_tagger.createTimeTagger(pair_rate=100e3, physical_delays=(0, 0, 800, 800), realtime=False, seed=2)
+    (timestamps, channels), = record(tagger, [1, 2, 3, 4], duration_SI=0.05, n_chunks=1)
+
+    counts = count_coincidences(timestamps, channels, GROUPS, windows_SI=[0.2e-9, 1e-9], offsets_SI=[0, -800e-12])
+    total = counts.sum(axis=0)
+    # the 800 ps delay of bob is only compensated with the offset
+    assert total[1, 0] > 10 * total[0, 0]
+    assert total[1, 1] >= total[1, 0]
@@ -0,0 +1,108 @@
+import threading
+import numpy as np
+from src.time_tagger.stream_engine import StreamAcquisitionEngine
+from src.time_tagger.virtual_tagger import TimeTagStreamBuffer
+
+
+class FakeStream:
+    """
+    returns the chunks that were pushed since the last getData()
+    """
+    def __init__(self):
+        self.chunks = []
+        self.lock = threading.Lock()
+        self.stopped = False
+
+    def push(self, timestamps, channels=None):
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        channels = np.asarray(timestamps % 4 if channels is None else channels, dtype=np.int32)
+        with self.lock:
+            self.chunks.append((timestamps, channels))
+
+    def getData(self):
+        with self.lock:
+            chunks, self.chunks = self.chunks, []
+        if not chunks:
+            return TimeTagStreamBuffer(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32))
+        return TimeTagStreamBuffer(np.concatenate([ts for ts, _ in chunks]), np.concatenate([ch for _, ch in chunks]))
+
+    def stop(self):
+        self.stopped = True
+
+
+class FakeTagger:
+    def __init__(self):
+        self.n_syncs = 0
+
+    def sync(self):
+        self.n_syncs += 1
+
+
+def check_buffer(engine, timestamps):
+    """
+    the buffer holds the newest min(n_written, buffer_size) events, event i at index i % buffer_size
+    """
+    n = engine.n_written
+    assert n == len(timestamps)
+    for i in range(max(0, n - engine.buffer_size), n):
+        assert engine.timestamps[i % engine.buffer_size] == timestamps[i]
+        assert engine.channels[i % engine.buffer_size] == timestamps[i] % 4
+
+
+def test_wrap_around():
+    stream = FakeStream()
+    engine = StreamAcquisitionEngine(stream, buffer_size=8)
+    written = []
+    for size in [5, 7, 3, 8, 1]:
+        timestamps = list(range(len(written), len(written) + size))
+        stream.push(timestamps)
+        written += timestamps
+        engine.sync()
+        check_buffer(engine, written)
+
+
+def test_chunks_larger_than_the_buffer():
+    stream = FakeStream()
+    engine = StreamAcquisitionEngine(stream, buffer_size=8)
+    stream.push(range(3))
+    engine.sync()
+    # only the newest 8 of the 21 events are kept, n_written still counts all of them
+    stream.push(range(3, 24))
+    engine.sync()
+    check_buffer(engine, list(range(24)))
+    assert engine.n_written == 24
+
+
+def test_readout_after_a_wrap():
+    stream = FakeStream()
+    engine = StreamAcquisitionEngine(stream, buffer_size=8)
+    stream.push(range(6))
+    engine.sync()
+    mark = engine.mark()
+    assert engine.latest_channel(since=mark) == -1 and engine.latest_timestamp(since=mark) == -1
+
+    stream.push([100, 101, 102, 103, 106])
+    engine.sync()
+    assert engine.count_since(mark) == 5
+    assert engine.latest_timestamp(since=mark) == 106
+    assert engine.latest_channel(since=mark) == 106 % 4
+
+
+def test_sync_waits_for_a_drain_of_the_background_thread():
+    stream = FakeStream()
+    tagger = FakeTagger()
+    # the thread only polls every 10 s on its own, so the data can only arrive through the drain sync() asks for
+    engine = StreamAcquisitionEngine(stream, buffer_size=64, poll_interval=10, tagger=tagger)
+    engine.start()
+    try:
+        written = []
+        for k in range(20):
+            timestamps = list(range(len(written), len(written) + 5))
+            stream.push(timestamps)
+            written += timestamps
+            engine.sync()
+            check_buffer(engine, written)
+        assert tagger.n_syncs == 20
+    finally:
+        engine.stop()
+    assert stream.stopped and not engine.is_running()
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from src.time_tagger import virtual_tagger
+from src.time_tagger.tag_recording import TagRecorder, TagRecording, ReplayTimeTagger
+
+
+def random_tags(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # mostly short gaps, a few gaps that need 32 and 64 bit differences
+    gaps = rng.integers(1, 50_000, n)
+    gaps[rng.choice(n, 5, replace=False)] = 2**33
+    gaps[rng.choice(n, 5, replace=False)] = 2**20
+    timestamps = 10**9 + np.cumsum(gaps)
+    channels = rng.choice([1, 2, 3, 4], n).astype(np.int32)
+    return timestamps, channels
+
+
+def write(path, timestamps, channels, chunk_size=1000, pieces=7):
+    with TagRecorder(path, channels=[1, 2, 3, 4], chunk_size=chunk_size, metadata={'input_delays': [0, 1, 2, 3]}) as recorder:
+        for ts, ch in zip(np.array_split(timestamps, pieces), np.array_split(channels, pieces)):
+            recorder.write(ts, ch)
+
+
+def test_round_trip(tmp_path):
+    timestamps, channels = random_tags(10_000)
+    path = tmp_path / 'run.tags'
+    write(path, timestamps, channels)
+
+    recording = TagRecording(path)
+    assert recording.n_tags == timestamps.size
+    assert recording.metadata == {'input_delays': [0, 1, 2, 3], 'channels': [1, 2, 3, 4]}
+    assert (recording.start_time, recording.stop_time) == (timestamps[0], timestamps[-1])
+
+    ts = np.concatenate([chunk[0] for chunk in recording.chunks()])
+    ch = np.concatenate([chunk[1] for chunk in recording.chunks()])
+    assert np.array_equal(ts, timestamps) and np.array_equal(ch, channels)
+
+    t0, t1 = timestamps[1234], timestamps[5678]
+    ts, ch = recording.read(t0, t1)
+    assert np.array_equal(ts, timestamps[1234:5678]) and np.array_equal(ch, channels[1234:5678])
+
+
+def test_truncated_file_is_rejected(tmp_path):
+    timestamps, channels = random_tags(100)
+    path = tmp_path / 'run.tags'
+    write(path, timestamps, channels)
+    path.write_bytes(path.read_bytes()[:-1])
+
+    with pytest.raises(ValueError):
+        TagRecording(path)
+
+
+def test_replay_through_the_tagger_api(tmp_path):
+    # record tags of the virtual tagger and replay them
+    tagger = virtual_tagger.createTimeTagger(pair_rate=50e3, realtime=False, seed=3)
+    stream = virtual_tagger.TimeTagStream(tagger, n_max_events=10**6, channels=[1, 2, 3, 4])
+    tagger.advance(0.05)
+    data = stream.getData()
+    timestamps, channels = data.getTimestamps(), data.getChannels()
+
+    path = tmp_path / 'run.tags'
+    write(path, timestamps, channels, chunk_size=4096)
+
+    replay = ReplayTimeTagger(TagRecording(path), realtime=False)
+    replay_stream = virtual_tagger.TimeTagStream(replay, n_max_events=10**6, channels=[1, 2, 3, 4])
+    replay.advance(0.06)
+    data = replay_stream.getData()
+
+    # the recording starts at time 0 of the replay tagger
+    assert np.array_equal(data.getTimestamps(), timestamps - timestamps[0])
+    assert np.array_equal(data.getChannels(), channels)